@@ -24,12 +24,22 @@ from typing import Any, Dict, List, Optional, Sequence
 from google.adk.models.lite_llm import LiteLlm
 #from google.adk import Agent, AgentContext, AgentOutput
 from google.adk.runners import Runner
-from google.adk.sessions import DatabaseSessionService
+from common.session_store import create_session_service
+from common.async_session_service import ThreadedSessionService
+from common.session_cache import WriteBehindSessionService
+from common.blob_store import BlobOffloadingSessionService
+from common.pipeline_dag import COMPLETED_STAGES_KEY, DagPipelineAgent, Stage
+from common.structured_logging import configure_logging, fields
 from google.adk.agents.llm_agent import LlmAgent
-from google.adk.agents.sequential_agent import SequentialAgent
 from google.genai.types import Content, Part
 from google.adk.events import Event, EventActions
-from subagents import code_writer_agent, code_reviewer_agent, code_refactorer_agent
+from subagents import (
+    checked_code_writer_agent,
+    style_reviewer_agent,
+    security_reviewer_agent,
+    performance_reviewer_agent,
+    code_panel_refactorer_agent,
+)
 from google.adk import sessions
 # You might also import specific session stores or session objects
 # e.g., from google.adk.sessions import Session, FileSessionStore
@@ -37,8 +47,8 @@ os.environ['OPENAI_API_KEY'] = ''
 
 MODEL_GPT_4O = "openai/gpt-4o"
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (levels, sampling and format come from the LOG_* variables)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Session management constants
@@ -46,9 +56,17 @@ APP_NAME = "code_pipeline_app"
 USER_ID = "user_1"
 SESSION_ID = "session_001"
 
-# Initialize session service for persistent state
+# Initialize session service for persistent state. Sessions are served from
+# an in-memory write-behind cache (checkpoint updates are flushed durably,
+# other events in batches), and its I/O runs on a dedicated thread so the
+# runner's appends don't block the event loop. Large values (generated and
+# refactored code, reviews) are kept in a blob store, with only a reference
+# in session state
 db_url = "sqlite:///./code_pipeline.db"
-session_service = DatabaseSessionService(db_url=db_url)
+session_service = BlobOffloadingSessionService(ThreadedSessionService(
+    WriteBehindSessionService(create_session_service(db_url))
+))
+blob_store = session_service.blob_store
 
 # Try to get existing session or create a new one
 try:
@@ -102,206 +120,146 @@ except:
 
 
 
-# --- 2. Create a checkpoint-aware SequentialAgent ---
-# This is a custom implementation that adds checkpoint awareness to the standard SequentialAgent
+# --- 2. Create a checkpoint-aware DAG pipeline agent ---
+# Stages declare the state keys they read; stages whose inputs are ready run
+# concurrently, and each finished stage is checkpointed on its own
 
-class CheckpointAwareSequentialAgent(SequentialAgent):
-    """A sequential agent that is aware of checkpoints for failure recovery."""
-    
-    def __init__(self, name: str, sub_agents: List[LlmAgent], checkpoint_names: List[str]):
-        super().__init__(name=name, sub_agents=sub_agents)
-        # Instead of directly setting the attribute, store it in a way that's compatible with Pydantic
-        self._checkpoint_names = checkpoint_names
+class CheckpointAwareDagAgent(DagPipelineAgent):
+    """A DAG pipeline agent that answers workflow commands and resumes interrupted runs."""
+
+    def _reply(self, ctx, text, uow=None):
+        """A text response from this agent, carrying the unit of work's staged changes if any."""
+        event_fields = dict(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=Content(role="model", parts=[Part(text=text)]),
+        )
+        return (uow.event(**event_fields) if uow is not None else None) or Event(**event_fields)
+
+    def _status(self, uow):
+        current_checkpoint = uow.get('workflow_checkpoint', 'start')
+        last_query = uow.get('last_query', 'None')
+        completed = uow.get(COMPLETED_STAGES_KEY) or []
+        
+        # Prepare a detailed status report
+        status = f"Current workflow checkpoint: {current_checkpoint}\nLast query: {last_query}\n\n"
         
-    @property
-    def checkpoint_names(self) -> List[str]:
-        """Get the checkpoint names."""
-        return self._checkpoint_names
+        for stage in self.dag.stages:
+            if stage.name in completed and uow.get(stage.output_key) is not None:
+                status += f"{stage.name}: ✓ Complete\n"
+                status += f"{stage.output_key} available\n\n"
+            else:
+                status += f"{stage.name}: ❌ Not started or incomplete\n\n"
+        return status
     
-    async def process(self, context, query):
-        """Process the query with checkpoint awareness."""
+    async def _run_async_impl(self, ctx):
+        """Handle the workflow commands, then run (or resume) the pipeline with checkpoint awareness."""
+        
+        # The Runner loaded the session once for this turn; every read below is
+        # served from it and each group of changes is committed as one event
+        uow = self.unit_of_work(ctx)
+        parts = ctx.user_content.parts if ctx.user_content else None
+        query = (parts[0].text or "").strip() if parts else ""
         
         # Special command to reset workflow
         if query.lower() == "reset workflow":
-            session = session_service.get_session(
-                app_name=APP_NAME,
-                user_id=USER_ID,
-                session_id=SESSION_ID
-            )
-            event = Event(
-                app_name=APP_NAME,
-                user_id=USER_ID,
-                session_id=SESSION_ID,
-                state_update={
-                    "workflow_checkpoint": "start",
-                    "last_query": "",
-                    "generated_code": None,
-                    "review_comments": None,
-                    "refactored_code": None
-                }
-            )
-            session_service.append_event(session, event)
-            return {"response": "Workflow checkpoint reset to 'start'"}
+            uow.update({
+                "workflow_checkpoint": "start",
+                "last_query": "",
+                COMPLETED_STAGES_KEY: [],
+                **{stage.output_key: None for stage in self.dag.stages}
+            })
+            yield self._reply(ctx, "Workflow checkpoint reset to 'start'", uow)
+            return
         
         # Special command to check current checkpoint
         if query.lower() == "checkpoint status":
-            session = session_service.get_session(
-                app_name=APP_NAME,
-                user_id=USER_ID,
-                session_id=SESSION_ID
-            )
-            current_checkpoint = session.state.get('workflow_checkpoint', 'start')
-            last_query = session.state.get('last_query', 'None')
-            
-            # Prepare a detailed status report
-            status = f"Current workflow checkpoint: {current_checkpoint}\nLast query: {last_query}\n\n"
-            
-            if 'generated_code' in session.state:
-                status += "Code Writer: ✓ Complete\n"
-                status += "Generated code available\n\n"
-            else:
-                status += "Code Writer: ❌ Not started or incomplete\n\n"
-                
-            if 'review_comments' in session.state:
-                status += "Code Reviewer: ✓ Complete\n"
-                status += "Review comments available\n\n"
-            else:
-                status += "Code Reviewer: ❌ Not started or incomplete\n\n"
-                
-            if 'refactored_code' in session.state:
-                status += "Code Refactorer: ✓ Complete\n"
-                status += "Refactored code available\n\n"
-            else:
-                status += "Code Refactorer: ❌ Not started or incomplete\n\n"
-                
-            return {"response": status}
+            yield self._reply(ctx, self._status(uow))
+            return
         
         # Special command to show the final code
         if query.lower() == "show final code":
-            session = session_service.get_session(
-                app_name=APP_NAME,
-                user_id=USER_ID,
-                session_id=SESSION_ID
-            )
-            
-            if 'refactored_code' in session.state:
-                return {"response": f"Final refactored code:\n\n```python\n{session.state['refactored_code']}\n```"}
-            elif 'generated_code' in session.state:
-                return {"response": f"Original generated code (not refactored):\n\n```python\n{session.state['generated_code']}\n```"}
+            if uow.get('refactored_code') is not None:
+                code = blob_store.resolve(uow['refactored_code'])
+                yield self._reply(ctx, f"Final refactored code:\n\n```python\n{code}\n```")
+            elif uow.get('generated_code') is not None:
+                code = blob_store.resolve(uow['generated_code'])
+                yield self._reply(ctx, f"Original generated code (not refactored):\n\n```python\n{code}\n```")
             else:
-                return {"response": "No code has been generated yet."}
+                yield self._reply(ctx, "No code has been generated yet.")
+            return
         
         # Get current checkpoint from session state
-        session = session_service.get_session(
-            app_name=APP_NAME,
-            user_id=USER_ID,
-            session_id=SESSION_ID
-        )
-        current_checkpoint = session.state.get('workflow_checkpoint', 'start')
-        last_query = session.state.get('last_query', '')
+        current_checkpoint = uow.get('workflow_checkpoint', 'start')
+        last_query = uow.get('last_query', '')
         
-        # If we're in the middle of a workflow and this is a new query, use the stored query
-        if current_checkpoint != 'start' and current_checkpoint != 'complete' and query != "resume workflow":
-            print(f"New query received while workflow is in progress at checkpoint: {current_checkpoint}")
-            print(f"To resume the workflow with the last query '{last_query}', type 'resume workflow'")
-            return {"response": (
+        # If we're in the middle of a workflow and this is a new query, point at the stored one
+        if current_checkpoint != 'start' and current_checkpoint != 'complete' and query.lower() != "resume workflow":
+            logger.info(
+                "New query received while workflow is in progress",
+                extra=fields(checkpoint=current_checkpoint, last_query=last_query),
+            )
+            yield self._reply(ctx, (
                 f"A code pipeline is currently in progress at checkpoint '{current_checkpoint}' with query: '{last_query}'\n"
                 f"To resume the workflow, type 'resume workflow'\n"
                 f"To start a new workflow with your current query, type 'reset workflow' first"
-            )}
+            ))
+            return
         
-        # If user wants to resume the workflow, use the stored query
-        if query == "resume workflow" and last_query:
-            print(f"Resuming workflow with query: {last_query}")
-            query = last_query
+        if query.lower() == "resume workflow":
+            if not last_query:
+                yield self._reply(ctx, "There is no workflow to resume.")
+                return
+            # The writer reads the request from last_query in state, not from
+            # this turn; finished stages are skipped by the DAG
+            logger.info("Resuming workflow", extra=fields(query=last_query))
+        else:
+            # Store the query for potential recovery; committed before any stage
+            # runs so a failed first stage can still be resumed
+            uow.update({"last_query": query, COMPLETED_STAGES_KEY: [], "workflow_checkpoint": "in_progress"})
+            yield uow.event(invocation_id=ctx.invocation_id, branch=ctx.branch)
         
-        # Store the query for potential recovery
-        event = Event(
-            app_name=APP_NAME,
-            user_id=USER_ID,
-            session_id=SESSION_ID,
-            state_update={"last_query": query}
+        logger.info(
+            "Starting workflow",
+            extra=fields(checkpoint=current_checkpoint, completed_stages=uow.get(COMPLETED_STAGES_KEY) or []),
         )
-        session_service.append_event(session, event)
-        
-        print(f"Starting workflow from checkpoint: {current_checkpoint}")
-        
-        # Determine which agents to run based on the current checkpoint
-        start_index = 0
-        if current_checkpoint != 'start':
-            try:
-                # Find the index of the next agent to run
-                checkpoint_index = self.checkpoint_names.index(current_checkpoint)
-                start_index = checkpoint_index
-                print(f"Resuming from agent at index {start_index}: {self.sub_agents[start_index].name}")
-            except ValueError:
-                print(f"Unknown checkpoint: {current_checkpoint}, starting from the beginning")
         
-        # Copy session state to context for the agents to use
-        for key, value in session.state.items():
-            if key not in ['workflow_checkpoint', 'last_query']:
-                context[key] = value
-        
-        # Process each agent in sequence, starting from the appropriate checkpoint
-        final_response = None
         try:
-            for i in range(start_index, len(self.sub_agents)):
-                agent = self.sub_agents[i]
-                print(f"Running agent: {agent.name}")
-                
-                # Process the query with the current agent
-                result = await agent.process(context, query)
-                
-                # Update the context with the agent's output
-                if agent.output_key and agent.output_key in result:
-                    context[agent.output_key] = result[agent.output_key]
-                    
-                    # Save to session state for recovery
-                    session = session_service.get_session(
-                        app_name=APP_NAME,
-                        user_id=USER_ID,
-                        session_id=SESSION_ID
-                    )
-                    session.state[agent.output_key] = result[agent.output_key]
-                    
-                    # Update checkpoint to the next agent
-                    if i < len(self.sub_agents) - 1:
-                        next_checkpoint = self.checkpoint_names[i + 1]
-                        session.state['workflow_checkpoint'] = next_checkpoint
-                    else:
-                        session.state['workflow_checkpoint'] = 'complete'
-                    
-                    session_service.update_session(session)
-                    print(f"Updated checkpoint to: {session.state['workflow_checkpoint']}")
-                
-                # Keep track of the final response
-                if 'response' in result:
-                    final_response = result['response']
-            
-            # Workflow completed successfully
-            if final_response is None:
-                # If no agent provided a response, create a default one
-                if 'refactored_code' in context:
-                    final_response = f"Code pipeline completed successfully!\n\n```python\n{context['refactored_code']}\n```"
-                else:
-                    final_response = "Code pipeline completed successfully!"
-            
-            return {"response": final_response}
-            
+            async for event in super()._run_async_impl(ctx):
+                yield event
         except Exception as e:
-            print(f"Workflow failed: {str(e)}")
-            # The checkpoint is already saved at each step, so we just report the error
-            return {"response": (
-                f"Code pipeline failed at checkpoint '{session.state.get('workflow_checkpoint')}'.\n"
+            completed = uow.get(COMPLETED_STAGES_KEY) or []
+            logger.exception("Workflow failed", extra=fields(completed_stages=completed))
+            # Each finished stage is already checkpointed, so we just report the error
+            yield self._reply(ctx, (
+                f"Code pipeline failed with stages {completed} completed.\n"
                 f"Error: {str(e)}\n"
                 f"To resume the workflow from this point, type 'resume workflow'"
-            )}
+            ))
+            return
+        
+        # Workflow completed successfully
+        if uow.get('refactored_code') is not None:
+            code = blob_store.resolve(uow['refactored_code'])
+            yield self._reply(ctx, f"Code pipeline completed successfully!\n\n```python\n{code}\n```")
+        else:
+            yield self._reply(ctx, "Code pipeline completed successfully!")
 
-# Create the checkpoint-aware sequential agent
-code_pipeline_agent = CheckpointAwareSequentialAgent(
+# Create the checkpoint-aware DAG pipeline: the three reviewers only need the
+# generated code, so they run concurrently, and the refactorer waits for all
+code_pipeline_agent = CheckpointAwareDagAgent(
     name="code_pipeline_agent",
-    sub_agents=[code_writer_agent, code_reviewer_agent, code_refactorer_agent],
-    checkpoint_names=['start', 'reviewer_pending', 'refactorer_pending']
+    stages=[
+        Stage(agent=checked_code_writer_agent),
+        Stage(agent=style_reviewer_agent, needs=["generated_code"]),
+        Stage(agent=security_reviewer_agent, needs=["generated_code"]),
+        Stage(agent=performance_reviewer_agent, needs=["generated_code"]),
+        Stage(
+            agent=code_panel_refactorer_agent,
+            needs=["generated_code", "style_review", "security_review", "performance_review"],
+        ),
+    ],
 )
 
 # Create a runner with our session service
@@ -314,19 +272,20 @@ runner = Runner(
 async def resume_workflow(session, last_query):
     """Resume the workflow from the last checkpoint."""
     content = Content(role='user', parts=[Part(text="resume workflow")])
-    async for event in runner.run_async(
-        user_id=USER_ID,
-        session_id=SESSION_ID,
-        new_message=content
-    ):
-        if event.is_final_response() and event.content and event.content.parts:
-            print(f"\nAgent: {event.content.parts[0].text}")
-            break
+    async with session_service.turn(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID):
+        async for event in runner.run_async(
+            user_id=USER_ID,
+            session_id=SESSION_ID,
+            new_message=content
+        ):
+            if event.is_final_response() and event.content and event.content.parts:
+                print(f"\nAgent [{event.author}]: {event.content.parts[0].text}")
 
 async def main():
     """Run the workflow agent."""
     # Check if there's a pending workflow
-    session = session_service.get_session(
+    session = await session_service.get_session_async(
+        pin=False,
         app_name=APP_NAME,
         user_id=USER_ID,
         session_id=SESSION_ID
@@ -351,8 +310,7 @@ async def main():
         choice = input("> ")
         
         if choice.lower() in ['y', 'yes']:
-            # Use asyncio.run to properly execute the async function
-            asyncio.run(resume_workflow(session, last_query))
+            await resume_workflow(session, last_query)
     
     # Main interaction loop
     while True:
@@ -369,14 +327,17 @@ async def main():
         
         # Process the query
         try:
-            async for event in runner.run_async(
-                user_id=USER_ID,
-                session_id=SESSION_ID,
-                new_message=content
-            ):
-                if event.is_final_response() and event.content and event.content.parts:
-                    print(f"\nAgent: {event.content.parts[0].text}")
-                    break
+            # The session is loaded off the event loop and pinned for the runner
+            async with session_service.turn(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID):
+                async for event in runner.run_async(
+                    user_id=USER_ID,
+                    session_id=SESSION_ID,
+                    new_message=content
+                ):
+                    # Each stage, and the pipeline itself, ends with a final response;
+                    # keep reading until the run is over rather than stopping at the first
+                    if event.is_final_response() and event.content and event.content.parts:
+                        print(f"\nAgent [{event.author}]: {event.content.parts[0].text}")
         except Exception as e:
             print(f"\nError: {str(e)}")
 
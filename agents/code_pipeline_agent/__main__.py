@@ -0,0 +1,21 @@
+from common.a2a_server import create_app
+from .agent import job_queue
+from .task_manager import run, router
+
+app = create_app(agent=type("Agent", (), {"execute": run}))
+app.include_router(router)
+
+
+@app.on_event("startup")
+async def start_job_queue():
+    # Also picks up jobs left queued or running by a previous process
+    await job_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, port=8007)
@@ -0,0 +1,38 @@
+import os
+from dotenv import load_dotenv
+from common.session_store import create_session_service
+from common.async_session_service import ThreadedSessionService
+from common.blob_store import BlobOffloadingSessionService
+from subagents import checked_code_writer_agent, code_chunked_reviewer_agent, code_diff_refactorer_agent
+from .job_queue import PipelineJobQueue
+
+load_dotenv()
+
+# Ensure the directory exists
+os.makedirs("./db", exist_ok=True)
+
+APP_NAME = "code_pipeline_service"
+# Jobs running at once; each one holds a pipeline stage's LLM call in flight
+CONCURRENCY = int(os.environ.get("CODE_PIPELINE_CONCURRENCY", "4"))
+
+# Setup session service: one session per job, I/O off the event loop,
+# large stage outputs kept in the blob store
+db_path = "./db/code_pipeline_service.db"
+session_service = BlobOffloadingSessionService(
+    ThreadedSessionService(create_session_service(f"sqlite:///{db_path}"))
+)
+
+job_queue = PipelineJobQueue(
+    session_service,
+    stages=[checked_code_writer_agent, code_chunked_reviewer_agent, code_diff_refactorer_agent],
+    app_name=APP_NAME,
+    db_path=db_path,
+    concurrency=CONCURRENCY,
+)
+
+
+async def execute(request):
+    """Run one spec through the pipeline and return the job's result (blocking /run API)."""
+    job_id = await job_queue.submit(request.get("user_id", "anonymous"), request.get("spec", ""))
+    await job_queue.wait(job_id)
+    return await job_queue.result(job_id)
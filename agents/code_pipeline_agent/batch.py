@@ -0,0 +1,215 @@
+"""
+Run the code pipeline over a JSONL file of specs.
+
+Each input line is an object with a "spec" and optionally an "id" (default:
+the line number) and a "user_id"; ids must be unique within the file. Every
+item gets its own session, named after the run and the item id, so the
+per-stage checkpoints of a killed run are picked up again when the same
+command is re-run: items already in the output file are skipped, and
+unfinished items resume from their last completed stage.
+
+Results are appended to the output JSONL as they finish (in completion
+order), one line per item with its status and the stage outputs.
+
+    python -m agents.code_pipeline_agent.batch specs.jsonl -o results.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from dotenv import load_dotenv
+
+from common.async_session_service import ThreadedSessionService
+from common.blob_store import BlobOffloadingSessionService
+from common.session_store import create_session_service
+from common.structured_logging import configure_logging, fields
+from agents.code_pipeline_agent.job_queue import PipelineJobQueue
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+APP_NAME = "code_pipeline_batch"
+DEFAULT_USER_ID = "batch"
+
+
+def read_specs(path: str) -> Iterator[Tuple[str, Dict]]:
+    """Yield (item id, item) for each non-empty line of a JSONL file."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if line.strip():
+                item = json.loads(line)
+                yield str(item.get("id", line_number)), item
+
+
+def count_items(path: str, skip: Set[str]) -> int:
+    """Number of items in a JSONL file not in `skip`; ValueError if an id appears twice."""
+    seen: Set[str] = set()
+    duplicates = []
+    for item_id, _ in read_specs(path):
+        if item_id in seen:
+            duplicates.append(item_id)
+        seen.add(item_id)
+    if duplicates:
+        # Two items with one id would share a session and an output line
+        raise ValueError(f"Duplicate item ids in {path}: {', '.join(sorted(set(duplicates))[:10])}")
+    return len(seen - skip)
+
+
+def finished_items(output_path: str, retry_failed: bool) -> Set[str]:
+    """Ids already in the output file (failed ones too, unless they are to be retried)."""
+    finished: Dict[str, str] = {}
+    if os.path.exists(output_path):
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short when the previous run was killed
+                finished[str(record["id"])] = record["status"]
+    return {item_id for item_id, status in finished.items() if not (retry_failed and status == "failed")}
+
+
+class Progress:
+    """Throughput and ETA, printed at most every `interval` seconds."""
+
+    def __init__(self, total: int, interval: float = 5.0):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._last_print = 0.0
+
+    def update(self, status: str) -> None:
+        self.done += 1
+        self.failed += status != "done"
+        now = time.perf_counter()
+        if now - self._last_print >= self.interval:
+            self._last_print = now
+            self.print(now)
+
+    def print(self, now: Optional[float] = None) -> None:
+        elapsed = (now or time.perf_counter()) - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else float("inf")
+        print(
+            f"{self.done}/{self.total} items, {self.failed} failed, "
+            f"{rate * 60:.1f} items/min, ETA {eta / 60:.1f} min",
+            flush=True,
+        )
+
+
+async def run_batch(
+    input_path: str,
+    output_path: str,
+    db_path: str,
+    concurrency: int = 4,
+    run_id: Optional[str] = None,
+    retry_failed: bool = False,
+    stages: Optional[List[Any]] = None,
+) -> Progress:
+    """
+    Run every item of `input_path` not yet in `output_path`; `stages` defaults
+    to the writer → reviewer → refactorer agents.
+    """
+    skip = finished_items(output_path, retry_failed)
+    total = count_items(input_path, skip)
+    if stages is None:
+        # Imported here so the module loads without the LLM stack (tests pass their own stages)
+        from subagents import checked_code_writer_agent, code_chunked_reviewer_agent, code_diff_refactorer_agent
+        stages = [checked_code_writer_agent, code_chunked_reviewer_agent, code_diff_refactorer_agent]
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    session_service = BlobOffloadingSessionService(
+        ThreadedSessionService(create_session_service(f"sqlite:///{db_path}"))
+    )
+    job_queue = PipelineJobQueue(
+        session_service,
+        stages=stages,
+        app_name=APP_NAME,
+        db_path=db_path,
+        concurrency=concurrency,
+        max_pending=concurrency * 2,
+    )
+    run_id = run_id or os.path.splitext(os.path.basename(input_path))[0]
+    print(f"{len(skip)} items already in {output_path}, {total} to run", flush=True)
+    progress = Progress(total)
+
+    # Items are jobs of this run's queue only; resume them item by item below
+    await job_queue.start(resume=False)
+    # Bounds the items in flight, so reading the input never runs far ahead
+    in_flight = asyncio.Semaphore(concurrency * 2)
+
+    async def run_item(item_id: str, item: Dict, out) -> None:
+        try:
+            job_id = f"{run_id}:{item_id}"
+            user_id = item.get("user_id", DEFAULT_USER_ID)
+            status = await job_queue.status(job_id)
+            if status is None:
+                await job_queue.submit(user_id, item["spec"], job_id=job_id)
+            elif status["status"] != "done":
+                # Resumes from the last checkpoint the earlier run reached
+                await job_queue.enqueue(job_id, status["user_id"])
+            if status is None or status["status"] != "done":
+                await job_queue.wait(job_id)
+            result = await job_queue.result(job_id)
+        except (KeyError, ValueError) as e:
+            result = {"status": "failed", "error": f"Invalid item: {e!r}"}
+        except Exception as e:
+            # Recorded like a failed job, so --retry-failed picks it up again
+            logger.exception("Item %s failed", item_id, extra=fields(event="batch_item_error", item_id=item_id))
+            result = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+        try:
+            out.write(json.dumps({"id": item_id, **result}) + "\n")
+            out.flush()
+            progress.update(result["status"])
+        finally:
+            in_flight.release()
+
+    # Only the items in flight; a finished item leaves nothing behind
+    running: Set[asyncio.Task] = set()
+    with open(output_path, "a", encoding="utf-8") as out:
+        try:
+            for item_id, item in read_specs(input_path):
+                if item_id in skip:
+                    continue
+                await in_flight.acquire()
+                task = asyncio.create_task(run_item(item_id, item, out))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            await asyncio.gather(*running)
+        finally:
+            for task in list(running):
+                task.cancel()
+            await job_queue.stop()
+            await session_service.flush()
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the code pipeline over a JSONL file of specs.")
+    parser.add_argument("input", help="JSONL file, one {\"spec\": ..., \"id\": ...} per line")
+    parser.add_argument("-o", "--output", required=True, help="Results JSONL (appended to; re-runs skip items in it)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Items running at once")
+    parser.add_argument("--db", default="./db/code_pipeline_batch.db", help="Session database holding the checkpoints")
+    parser.add_argument("--run-id", help="Session id prefix (default: the input file name)")
+    parser.add_argument("--retry-failed", action="store_true", help="Run items that failed last time again")
+    args = parser.parse_args()
+    configure_logging()
+
+    progress = asyncio.run(run_batch(
+        args.input, args.output, args.db,
+        concurrency=args.concurrency, run_id=args.run_id, retry_failed=args.retry_failed,
+    ))
+    progress.print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Job queue that runs the writer → reviewer → refactorer pipeline for many users.
+
+Each submitted spec becomes a job: an ADK session owned by the submitting
+user, with the job id as session id. The session state carries the same
+checkpoint fields as the interactive pipeline in agent.py
+(`workflow_checkpoint`, `last_query`) plus `job_status`/`job_error`, so the
+database is the queue's durable record: on start-up, jobs that were queued or
+running are picked up again from their last checkpoint.
+
+Jobs run on a bounded pool of asyncio workers. Every stage transition is
+published to any stream subscribers of that job.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from google.adk.agents.llm_agent import LlmAgent
+from google.adk.runners import Runner
+from google.genai import types
+
+from common.session_dbs import connect
+from common.structured_logging import fields
+from common.unit_of_work import SessionUnitOfWork
+
+logger = logging.getLogger(__name__)
+
+# One checkpoint per stage: the name of the stage to run next
+CHECKPOINT_NAMES = ["start", "reviewer_pending", "refactorer_pending"]
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class PipelineJobQueue:
+    """Bounded asyncio worker pool over durable, per-user pipeline sessions."""
+
+    def __init__(
+        self,
+        session_service,
+        stages: List[LlmAgent],
+        app_name: str,
+        db_path: str,
+        concurrency: int = 4,
+        max_pending: int = 1000,
+    ):
+        """
+        Args:
+            session_service: A session service with ensure_session/get_session_async
+                (ThreadedSessionService, possibly wrapped).
+            stages: The stage agents, in order; one per checkpoint name.
+            app_name: ADK app name the job sessions are stored under.
+            db_path: SQLite file behind session_service, scanned to resume jobs.
+            concurrency: Number of jobs running at once.
+            max_pending: Queue size; submit waits when it is full.
+        """
+        self.session_service = session_service
+        self.app_name = app_name
+        self.db_path = db_path
+        self.concurrency = concurrency
+        self._stages = stages
+        self._runners = [
+            Runner(agent=stage, app_name=app_name, session_service=session_service)
+            for stage in stages
+        ]
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        # Owners of the jobs queued or running in this process
+        self._owners: Dict[str, str] = {}
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        # Completion events of jobs someone is waiting on; set and dropped when the job ends
+        self._done: Dict[str, asyncio.Event] = {}
+        self._workers: List[asyncio.Task] = []
+
+    # -------------------------------------------------------------- lifecycle
+
+    async def start(self, resume: bool = True) -> int:
+        """
+        Start the workers and, with `resume`, requeue unfinished jobs.
+
+        Returns how many jobs were requeued.
+        """
+        unfinished = await asyncio.to_thread(self._unfinished_jobs) if resume else []
+        for user_id, job_id in unfinished:
+            await self.enqueue(job_id, user_id)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        return len(unfinished)
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _unfinished_jobs(self):
+        conn = connect(self.db_path, readonly=True)
+        try:
+            return conn.execute(
+                "SELECT user_id, id FROM sessions WHERE app_name = ?"
+                " AND json_extract(state, '$.job_status') IN (?, ?)"
+                " ORDER BY create_time",
+                (self.app_name, *ACTIVE_STATUSES),
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def _owner(self, job_id: str) -> Optional[str]:
+        if job_id in self._owners:
+            return self._owners[job_id]
+        conn = connect(self.db_path, readonly=True)
+        try:
+            row = conn.execute(
+                "SELECT user_id FROM sessions WHERE app_name = ? AND id = ?",
+                (self.app_name, job_id),
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    # ------------------------------------------------------------------ API
+
+    async def submit(self, user_id: str, spec: str, job_id: Optional[str] = None) -> str:
+        """Create a job for `spec` and queue it; returns the job id (random unless given)."""
+        job_id = job_id or uuid.uuid4().hex
+        await self.session_service.ensure_session(
+            app_name=self.app_name,
+            user_id=user_id,
+            session_id=job_id,
+            state={
+                "workflow_checkpoint": "start",
+                "last_query": spec,
+                "job_status": "queued",
+            },
+            # Each stage loads the session for its own Runner call
+            pin=False,
+        )
+        await self.enqueue(job_id, user_id)
+        return job_id
+
+    async def enqueue(self, job_id: str, user_id: str) -> None:
+        """Queue an existing job; it runs from its last checkpoint."""
+        self._owners[job_id] = user_id
+        await self._queue.put(job_id)
+
+    async def retry(self, job_id: str) -> bool:
+        """Requeue a failed job from its last checkpoint."""
+        status = await self.status(job_id)
+        if status is None or status["status"] != "failed":
+            return False
+        await self._set_status(job_id, "queued")
+        await self.enqueue(job_id, status["user_id"])
+        return True
+
+    async def _load(self, job_id: str) -> Optional[SessionUnitOfWork]:
+        user_id = await asyncio.to_thread(self._owner, job_id)
+        if user_id is None:
+            return None
+        session = await self.session_service.get_session_async(
+            pin=False, app_name=self.app_name, user_id=user_id, session_id=job_id
+        )
+        return SessionUnitOfWork(self.session_service, session) if session else None
+
+    async def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        uow = await self._load(job_id)
+        if uow is None:
+            return None
+        return {
+            "job_id": job_id,
+            "user_id": uow.session.user_id,
+            "status": uow.get("job_status"),
+            "checkpoint": uow.get("workflow_checkpoint"),
+            "error": uow.get("job_error"),
+        }
+
+    async def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status plus the stage outputs produced so far (blob references resolved)."""
+        uow = await self._load(job_id)
+        if uow is None:
+            return None
+        blob_store = getattr(self.session_service, "blob_store", None)
+        outputs = {}
+        for stage in self._stages:
+            value = uow.get(stage.output_key)
+            outputs[stage.output_key] = blob_store.resolve(value) if blob_store else value
+        return {
+            "job_id": job_id,
+            "status": uow.get("job_status"),
+            "checkpoint": uow.get("workflow_checkpoint"),
+            "error": uow.get("job_error"),
+            "outputs": outputs,
+        }
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None) -> None:
+        """Wait for a job to finish; returns at once if it isn't queued or running."""
+        # Registered before the status read, so a job ending meanwhile still sets it
+        done = self._done.setdefault(job_id, asyncio.Event())
+        try:
+            current = await self.status(job_id)
+            if current is not None and current["status"] in ACTIVE_STATUSES:
+                await asyncio.wait_for(done.wait(), timeout)
+        finally:
+            # Still pending here after a timeout: the worker drops it when the job ends
+            if self._done.get(job_id) is done and (done.is_set() or job_id not in self._owners):
+                del self._done[job_id]
+
+    async def stream(self, job_id: str) -> AsyncIterator[str]:
+        """Yield one JSON line per stage transition until the job finishes."""
+        updates: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(updates)
+        try:
+            current = await self.status(job_id)
+            if current is None:
+                return
+            yield json.dumps(current) + "\n"
+            if current["status"] not in ACTIVE_STATUSES:
+                return
+            while True:
+                update = await updates.get()
+                yield json.dumps(update) + "\n"
+                if update["status"] not in ACTIVE_STATUSES:
+                    return
+        finally:
+            self._subscribers[job_id].remove(updates)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    def _publish(self, job_id: str, **update: Any) -> None:
+        for subscriber in self._subscribers.get(job_id, []):
+            subscriber.put_nowait({"job_id": job_id, **update})
+
+    # -------------------------------------------------------------- workers
+
+    async def _set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        uow = await self._load(job_id)
+        if uow is None:
+            return
+        uow.update({"job_status": status, "job_error": error})
+        uow.commit()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                # Loading or saving the job itself failed; keep the worker alive
+                logger.exception("Job %s failed", job_id, extra=fields(event="job_error", job_id=job_id))
+                try:
+                    await self._set_status(job_id, "failed", str(e))
+                except Exception:
+                    logger.exception("Could not mark job %s failed", job_id)
+                self._publish(job_id, status="failed", error=str(e))
+            finally:
+                self._queue.task_done()
+                self._owners.pop(job_id, None)
+                done = self._done.pop(job_id, None)
+                if done is not None:
+                    done.set()
+
+    async def _run_job(self, job_id: str) -> None:
+        uow = await self._load(job_id)
+        if uow is None:
+            return
+        user_id = uow.session.user_id
+        checkpoint = uow.get("workflow_checkpoint", "start")
+        start_index = CHECKPOINT_NAMES.index(checkpoint) if checkpoint in CHECKPOINT_NAMES else 0
+        spec = uow.get("last_query", "")
+        uow.update({"job_status": "running", "job_error": None})
+        uow.commit()
+        self._publish(job_id, status="running", checkpoint=checkpoint)
+
+        message = types.Content(role="user", parts=[types.Part(text=spec)])
+        try:
+            for index in range(start_index, len(self._runners)):
+                # Load the session for this stage's runner off the event loop;
+                # the Runner picks up this pin, so it sees the previous stage's output
+                await self.session_service.get_session_async(
+                    app_name=self.app_name, user_id=user_id, session_id=job_id
+                )
+                async for _ in self._runners[index].run_async(
+                    user_id=user_id, session_id=job_id, new_message=message
+                ):
+                    pass
+
+                # Reload to see the stage output the runner just stored
+                uow = await self._load(job_id)
+                next_checkpoint = (
+                    CHECKPOINT_NAMES[index + 1] if index + 1 < len(self._runners) else "complete"
+                )
+                uow.set("workflow_checkpoint", next_checkpoint)
+                if next_checkpoint == "complete":
+                    uow.set("job_status", "done")
+                uow.commit()
+                self._publish(
+                    job_id,
+                    status=uow.get("job_status"),
+                    checkpoint=next_checkpoint,
+                    stage=self._stages[index].name,
+                )
+        except Exception as e:
+            await self._set_status(job_id, "failed", str(e))
+            self._publish(job_id, status="failed", error=str(e))
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from .agent import execute, job_queue
+
+async def run(payload):
+    return await execute(payload)
+
+router = APIRouter(prefix="/jobs")
+
+
+@router.post("", status_code=202)
+async def submit_job(payload: dict):
+    if not payload.get("spec"):
+        raise HTTPException(status_code=400, detail="'spec' is required")
+    job_id = await job_queue.submit(payload.get("user_id", "anonymous"), payload["spec"])
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get("/{job_id}")
+async def job_status(job_id: str):
+    status = await job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return status
+
+
+@router.get("/{job_id}/result")
+async def job_result(job_id: str):
+    result = await job_queue.result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return result
+
+
+@router.get("/{job_id}/stream")
+async def job_stream(job_id: str):
+    if await job_queue.status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return StreamingResponse(job_queue.stream(job_id), media_type="application/x-ndjson")
+
+
+@router.post("/{job_id}/retry")
+async def retry_job(job_id: str):
+    if not await job_queue.retry(job_id):
+        raise HTTPException(status_code=409, detail="Only failed jobs can be retried")
+    return {"job_id": job_id, "status": "queued"}
@@ -1,7 +1,8 @@
 from common.a2a_server import create_app
 from .task_manager import run
 
-app = create_app(agent=type("Agent", (), {"execute": run}))
+# /jobs lets the UI submit a request and long-poll for it instead of holding /run open
+app = create_app(agent=type("Agent", (), {"execute": run}), async_jobs=True)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,12 +1,17 @@
 from google.adk.agents import Agent
 from google.adk.models.lite_llm import LiteLlm
 from google.adk.runners import Runner
-from google.adk.sessions import DatabaseSessionService
+from common.session_store import create_session_service
+from common.async_session_service import SessionWriteError, ThreadedSessionService
 from google.genai import types
 from area_agent.agent import area_agent
 from perimeter_agent.agent import perimeter_agent
+from common.structured_logging import fields
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # Ensure the directory exists
 os.makedirs("./db", exist_ok=True)
 
@@ -23,10 +28,11 @@ geometry_host_agent = Agent(
     sub_agents=[area_agent, perimeter_agent]            
 )
 
-# Use the built-in DatabaseSessionService with SQLite
+# Use the tuned (WAL, pooled, indexed) SQLite session storage
 # The db_url is just a connection string - the file will be created if it doesn't exist
 db_url = "sqlite:///./db/geometry_host_sessions.db"
-session_service = DatabaseSessionService(db_url=db_url)
+# All session I/O runs on a dedicated thread so SQLite never blocks the event loop
+session_service = ThreadedSessionService(create_session_service(db_url))
 
 runner = Runner(
     agent=geometry_host_agent,
@@ -38,17 +44,6 @@ USER_ID = "user_geometry_host"
 SESSION_ID = "session_geometry_host"
 
 async def execute(request):
-    # Ensure session exists
-    try:
-        session_service.create_session(
-            app_name="geometry_host_app",
-            user_id=USER_ID,
-            session_id=SESSION_ID
-        )
-    except Exception as e:
-        # Session might already exist, which is fine
-        print(f"Note: {e}")
-
     # Extract the original request text to preserve the user's intent
     request_text = request.get('request', '')
     parameters = request.get('parameters', '')
@@ -64,6 +59,12 @@ async def execute(request):
 
     message = types.Content(role="user", parts=[types.Part(text=prompt)])
 
-    async for event in runner.run_async(user_id=USER_ID, session_id=SESSION_ID, new_message=message):
-        if event.is_final_response():
-            return {"summary": event.content.parts[0].text} 
\ No newline at end of file
+    try:
+        # Loads the session off the event loop once earlier requests on it are done
+        async with session_service.turn(app_name="geometry_host_app", user_id=USER_ID, session_id=SESSION_ID):
+            async for event in runner.run_async(user_id=USER_ID, session_id=SESSION_ID, new_message=message):
+                if event.is_final_response():
+                    return {"summary": event.content.parts[0].text}
+    except SessionWriteError as e:
+        logger.error("Session write failed", extra=fields(event="session_write_error", session_id=SESSION_ID, error=str(e)))
+        return {"summary": f"Sorry, the request could not be saved: {e}", "error": str(e)}
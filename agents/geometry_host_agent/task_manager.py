@@ -1,11 +1,17 @@
+import logging
+
 from common.a2a_client import call_agent
+from common.direct_response import result_text
+from common.structured_logging import fields
+
+logger = logging.getLogger(__name__)
 
 AREA_URL = "http://localhost:8004/run"
 PERIMETER_URL = "http://localhost:8005/run"
 
 async def run(payload):
-    # 👀 Print what the geometry host agent is sending
-    print("🚀 Incoming geometry payload:", payload)
+    # 👀 Log what the geometry host agent is sending (sampled with LOG_SAMPLE=payload=...)
+    logger.info("Incoming geometry payload", extra=fields(event="payload", payload=payload))
 
     # Extract the request and parameters
     request = payload.get("request", "").lower()
@@ -37,31 +43,31 @@ async def run(payload):
     # Call only the appropriate agent based on the request
     if "area" in request:
         area = await call_agent(AREA_URL, area_payload)
-        print("📦 area:", area)
+        logger.debug("area result", extra=fields(event="agent_result", agent="area", result=area))
         # 🛡 Ensure it's a dict before access
         area = area if isinstance(area, dict) else {}
-        results["area"] = area.get("result", "No area calculation returned.")
+        results["area"] = result_text(area, "area", "No area calculation returned.")
         
     if "perimeter" in request:
         perimeter = await call_agent(PERIMETER_URL, perimeter_payload)
-        print("📦 perimeter:", perimeter)
+        logger.debug("perimeter result", extra=fields(event="agent_result", agent="perimeter", result=perimeter))
         # 🛡 Ensure it's a dict before access
         perimeter = perimeter if isinstance(perimeter, dict) else {}
-        results["perimeter"] = perimeter.get("result", "No perimeter calculation returned.")
+        results["perimeter"] = result_text(perimeter, "perimeter", "No perimeter calculation returned.")
     
     # If neither area nor perimeter was explicitly requested, calculate both (fallback behavior)
     if "area" not in request and "perimeter" not in request:
         area = await call_agent(AREA_URL, area_payload)
         perimeter = await call_agent(PERIMETER_URL, perimeter_payload)
         
-        print("📦 area:", area)
-        print("📦 perimeter:", perimeter)
+        logger.debug("area result", extra=fields(event="agent_result", agent="area", result=area))
+        logger.debug("perimeter result", extra=fields(event="agent_result", agent="perimeter", result=perimeter))
         
         # 🛡 Ensure all are dicts before access
         area = area if isinstance(area, dict) else {}
         perimeter = perimeter if isinstance(perimeter, dict) else {}
         
-        results["area"] = area.get("result", "No area calculation returned.")
-        results["perimeter"] = perimeter.get("result", "No perimeter calculation returned.")
+        results["area"] = result_text(area, "area", "No area calculation returned.")
+        results["perimeter"] = result_text(perimeter, "perimeter", "No perimeter calculation returned.")
 
     return results 
\ No newline at end of file
@@ -1,17 +1,34 @@
 from google.adk.agents import Agent
 from google.adk.models.lite_llm import LiteLlm
 from google.adk.runners import Runner
-from google.adk.sessions import DatabaseSessionService
+from common.session_store import create_session_service
+from common.async_session_service import SessionWriteError, ThreadedSessionService
 from google.genai import types
 import json
+import logging
 import os
 from dotenv import load_dotenv
+from common.direct_response import skip_summarization, tool_response_from_event, render_result
+from common.structured_logging import fields
+from shared.schemas import PerimeterResponse
 
 # Load environment variables
 load_dotenv()
 os.environ['OPENAI_API_KEY'] = os.environ.get('OPENAI_API_KEY')
 MODEL_GPT_4O = "openai/gpt-4o"
 
+# Return the calculate_perimeter result directly as a PerimeterResponse instead of asking
+# the model to summarize it, saving one LLM round trip per request.
+# Set PERIMETER_AGENT_DIRECT_RESPONSE=0 to get the model's prose reply back.
+DIRECT_RESPONSE = os.environ.get("PERIMETER_AGENT_DIRECT_RESPONSE", "1") == "1"
+# Sentence used as 'result' in direct mode; set it to an empty string to leave it out.
+RESULT_TEMPLATE = os.environ.get(
+    "PERIMETER_AGENT_RESULT_TEMPLATE",
+    "The perimeter of a rectangle with length {length} and width {width} is {perimeter} {unit}."
+)
+
+logger = logging.getLogger(__name__)
+
 # Ensure the directory exists
 os.makedirs("./db", exist_ok=True)
 
@@ -27,7 +44,7 @@ def calculate_perimeter(length: float, width: float) -> dict:
         dict: A dictionary containing the calculation result.
               Includes 'perimeter' (the calculated perimeter) and 'unit' (units).
     """
-    print(f"--- Tool: calculate_perimeter called with length={length}, width={width} ---")
+    logger.debug("calculate_perimeter called", extra=fields(event="tool_call", tool="calculate_perimeter", length=length, width=width))
     perimeter = 2 * (length + width)
     return {
         "perimeter": perimeter,
@@ -44,11 +61,13 @@ perimeter_agent = Agent(
                 "Only handle questions about calculating perimeter. "
                 "Provide clear, concise responses with the calculated perimeter.",
     tools=[calculate_perimeter],
+    after_tool_callback=skip_summarization if DIRECT_RESPONSE else None,
 )
 
 # Setup session service and runner
 db_url = "sqlite:///./db/perimeter_agent_sessions.db"
-session_service = DatabaseSessionService(db_url=db_url)
+# All session I/O runs on a dedicated thread so SQLite never blocks the event loop
+session_service = ThreadedSessionService(create_session_service(db_url))
 
 runner = Runner(
     agent=perimeter_agent,
@@ -60,17 +79,6 @@ USER_ID = "user_perimeter"
 SESSION_ID = "session_perimeter"
 
 async def execute(request):
-    # Ensure session exists
-    try:
-        session_service.create_session(
-            app_name="perimeter_app",
-            user_id=USER_ID,
-            session_id=SESSION_ID
-        )
-    except Exception as e:
-        # Session might already exist, which is fine
-        print(f"Note: {e}")
-
     # Extract rectangle dimensions from request
     length = request.get('length', 0)
     width = request.get('width', 0)
@@ -79,13 +87,29 @@ async def execute(request):
 
     message = types.Content(role="user", parts=[types.Part(text=prompt)])
 
-    async for event in runner.run_async(user_id=USER_ID, session_id=SESSION_ID, new_message=message):
-        if event.is_final_response():
-            response_text = event.content.parts[0].text
-            try:
-                # Try to extract perimeter calculation from response
-                # This is a simple approach - you might need more sophisticated parsing
-                return {"result": response_text, "raw_response": response_text}
-            except Exception as e:
-                print(f"❌ Error processing response: {e}")
-                return {"result": response_text, "error": str(e)} 
\ No newline at end of file
+    try:
+        # Loads the session off the event loop once earlier requests on it are done
+        async with session_service.turn(app_name="perimeter_app", user_id=USER_ID, session_id=SESSION_ID):
+            async for event in runner.run_async(user_id=USER_ID, session_id=SESSION_ID, new_message=message):
+                if event.is_final_response():
+                    tool_result = tool_response_from_event(event, "calculate_perimeter")
+                    if tool_result is not None:
+                        # Direct mode: the tool result is the answer, no summary call was made
+                        response = PerimeterResponse(
+                            perimeter=tool_result["perimeter"],
+                            unit=tool_result["unit"],
+                            result=render_result(RESULT_TEMPLATE, length=length, width=width, **tool_result),
+                        )
+                        return response.model_dump()
+
+                    response_text = event.content.parts[0].text
+                    try:
+                        # Try to extract perimeter calculation from response
+                        # This is a simple approach - you might need more sophisticated parsing
+                        return {"result": response_text, "raw_response": response_text}
+                    except Exception as e:
+                        logger.exception("Error processing response")
+                        return {"result": response_text, "error": str(e)}
+    except SessionWriteError as e:
+        logger.error("Session write failed", extra=fields(event="session_write_error", session_id=SESSION_ID, error=str(e)))
+        return {"result": f"Sorry, the calculation could not be saved: {e}", "error": str(e)}
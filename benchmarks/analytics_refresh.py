@@ -0,0 +1,97 @@
+"""
+Session analytics in SQLite against pulling the events table into Python.
+
+Grows a synthetic ADK events table (see benchmarks.export_memory) to each
+--rows size and times:
+
+• legacy: SELECT * fetched into Python and aggregated there, the way
+  session.py / data.py read the tables (only up to --legacy-max-rows)
+• build: every common.session_analytics query from an empty cache, before
+  and after `ensure_analytics_indexes`
+• incremental: the refresh after --append more events
+• unchanged: the refresh when nothing was written
+
+Usage:
+    python -m benchmarks.analytics_refresh [--rows 1000000 10000000]
+        [--append 10000] [--legacy-max-rows 1000000]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.export_memory import grow_events
+from common.session_analytics import SessionAnalytics, ensure_analytics_indexes
+
+
+def legacy_aggregate(db_path: str) -> None:
+    """Messages per user and events per session, computed in Python over every row."""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.execute("SELECT * FROM events")
+    columns = [description[0] for description in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    Counter((row["app_name"], row["user_id"]) for row in rows if row["author"] == "user")
+    Counter((row["app_name"], row["session_id"]) for row in rows)
+    conn.close()
+
+
+def timed(function, *args) -> float:
+    began = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - began
+
+
+def refresh(db_path: str, cache_path: str, rebuild: bool = False) -> None:
+    analytics = SessionAnalytics(cache_path)
+    try:
+        analytics.refresh([db_path], rebuild=rebuild)
+    finally:
+        analytics.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--append", type=int, default=10_000)
+    parser.add_argument("--legacy-max-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="analytics-bench-")
+    db_path = os.path.join(workdir, "events.db")
+    cache_path = os.path.join(workdir, "analytics.db")
+    try:
+        print(f"{'rows':>10} {'DB MB':>7} {'step':>20} {'seconds':>8}")
+        size = 0
+        for rows in sorted(args.rows):
+            grow_events(db_path, size, rows)
+            size = rows
+            db_mb = os.path.getsize(db_path) / 2**20
+
+            def report(step: str, seconds: float) -> None:
+                print(f"{rows:>10} {db_mb:>7.0f} {step:>20} {seconds:>8.2f}", flush=True)
+
+            if rows <= args.legacy_max_rows:
+                report("legacy (Python)", timed(legacy_aggregate, db_path))
+            conn = sqlite3.connect(db_path)
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE name LIKE 'ix_events_%'").fetchall():
+                conn.execute(f'DROP INDEX "{name}"')
+            conn.close()
+            report("build, no indexes", timed(refresh, db_path, cache_path, True))
+            report("create indexes", timed(ensure_analytics_indexes, db_path))
+            report("build, indexed", timed(refresh, db_path, cache_path, True))
+            grow_events(db_path, size, size + args.append)
+            size += args.append
+            report(f"+{args.append} incremental", timed(refresh, db_path, cache_path))
+            report("unchanged", timed(refresh, db_path, cache_path))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Per-invocation overhead of the before-agent skip callback.
+
+Builds the CallbackContext an agent invocation gets, over a session holding
+a large generated_code/review_comments/refactored_code, and times:
+
+• legacy: the previous skip_completed_agent (state lookup by probing,
+  printing the whole state on every call; printed to /dev/null here)
+• chain: CallbackChain(debug_state, skip_completed), for an agent whose output
+  is in state (skip) and one whose output isn't (run)
+• chain+metrics: the same with a CallbackMetrics attached
+
+Usage:
+    python -m benchmarks.callback_overhead [--iterations 20000] [--code-kb 200]
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+from collections.abc import Mapping
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from common.agent_callbacks import (
+    REQUEST_KEY_SUFFIX,
+    CallbackChain,
+    CallbackMetrics,
+    debug_state,
+    request_digest,
+    skip_completed,
+)
+
+
+class StubAgent(BaseAgent):
+    output_key: str = ""
+
+
+_dumped_attrs = False
+
+
+def legacy_skip_completed_agent(callback_context):
+    """
+    The previous implementation, in its working form (the "multi-agent copy"
+    variant, which finds the state through the invocation context; the
+    attribute probing in multi-agent/callbacks.py never found ADK's State).
+    """
+    global _dumped_attrs
+    if not _dumped_attrs:
+        attrs = sorted(a for a in dir(callback_context) if not a.startswith("__"))
+        print(f"[skip_completed_agent] CallbackContext attributes: {attrs}")
+        _dumped_attrs = True
+    state = None
+    session = getattr(getattr(callback_context, "_invocation_context", None), "session", None)
+    if session is not None:
+        candidate = getattr(session, "state", None)
+        if isinstance(candidate, Mapping):
+            print(f"State object is a mapping: {candidate}")
+            state = candidate
+    print(f"[skip_completed_agent] State: {state}")
+    output_key = {
+        "code_writer_agent": "generated_code",
+        "code_reviewer_agent": "review_comments",
+        "code_refactorer_agent": "refactored_code",
+    }.get(callback_context.agent_name)
+    if state is None or not output_key or output_key not in state:
+        return None
+    return types.Content(role="model", parts=[types.Part(text=str(state[output_key]))])
+
+
+def context_for(session, agent) -> CallbackContext:
+    invocation = InvocationContext(
+        session_service=InMemorySessionService(), invocation_id="inv", agent=agent, session=session
+    )
+    return CallbackContext(invocation)
+
+
+def time_per_call(callback, session, agent, iterations) -> float:
+    """Mean microseconds per invocation, including building the context as ADK does."""
+    began = time.perf_counter()
+    for _ in range(iterations):
+        callback(context_for(session, agent))
+    return (time.perf_counter() - began) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--code-kb", type=int, default=200)
+    args = parser.parse_args()
+
+    code = ("x = 1\n" * (args.code_kb * 1024 // 6))
+    session = InMemorySessionService().create_session(
+        app_name="bench", user_id="user",
+        state={
+            "generated_code": code,
+            "review_comments": "- fix it\n" * 200,
+            # Saved for the current request (the contexts carry no user content)
+            "review_comments" + REQUEST_KEY_SUFFIX: request_digest(None),
+        },
+    )
+    done = StubAgent(name="code_reviewer_agent", output_key="review_comments")
+    pending = StubAgent(name="code_refactorer_agent", output_key="refactored_code")
+    baseline = time_per_call(lambda ctx: None, session, done, args.iterations)
+
+    chain = CallbackChain(debug_state, skip_completed)
+    metered = CallbackChain(debug_state, skip_completed, metrics=CallbackMetrics())
+    legacy_iterations = max(1, args.iterations // 20)
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        legacy_skip = time_per_call(legacy_skip_completed_agent, session, done, legacy_iterations)
+        legacy_run = time_per_call(legacy_skip_completed_agent, session, pending, legacy_iterations)
+
+    print(f"state size: {len(code) // 1024} KB code; {args.iterations} invocations per row")
+    print(f"{'callback':<24} {'us/call':>10} {'over baseline':>14}")
+    rows = [
+        ("context only", baseline),
+        ("legacy, skip", legacy_skip),
+        ("legacy, run", legacy_run),
+        ("chain, skip", time_per_call(chain, session, done, args.iterations)),
+        ("chain, run", time_per_call(chain, session, pending, args.iterations)),
+        ("chain+metrics, skip", time_per_call(metered, session, done, args.iterations)),
+    ]
+    for label, micros in rows:
+        print(f"{label:<24} {micros:>10.2f} {micros - baseline:>14.2f}")
+    print(f"metrics: {metered.metrics.report()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Event-loop lag under session-storage load.
+
+Simulates many concurrent agent requests the way `execute()` and the ADK
+Runner drive the session service (load or create the session, then append a
+series of events) while a probe coroutine measures how late the event loop
+wakes it up. Run once with the session service called directly on the loop
+and once through ThreadedSessionService.
+
+Usage:
+    python -m benchmarks.event_loop_lag [--requests 200] [--events 8]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event, EventActions
+
+from common.async_session_service import ThreadedSessionService
+from common.session_store import create_session_service
+
+APP_NAME = "bench_app"
+PROBE_INTERVAL = 0.001
+
+
+async def probe(lags, stop):
+    """Sleep PROBE_INTERVAL in a loop and record how late each wake-up is."""
+    while not stop.is_set():
+        began = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - began - PROBE_INTERVAL)
+
+
+async def fake_request(session_service, index, events):
+    user_id = f"user_{index}"
+    session_id = f"session_{index}"
+    if isinstance(session_service, ThreadedSessionService):
+        # How the agents call their Runner: inside a turn, which pins the session
+        async with session_service.turn(app_name=APP_NAME, user_id=user_id, session_id=session_id):
+            await fake_turn(session_service, user_id, session_id, index, events)
+    else:
+        session_service.create_session(
+            app_name=APP_NAME, user_id=user_id, session_id=session_id
+        )
+        await fake_turn(session_service, user_id, session_id, index, events)
+
+
+async def fake_turn(session_service, user_id, session_id, index, events):
+    # What Runner.run_async does: a synchronous get_session, then appends
+    session = session_service.get_session(
+        app_name=APP_NAME, user_id=user_id, session_id=session_id
+    )
+    for n in range(events):
+        session_service.append_event(
+            session,
+            Event(
+                invocation_id=f"inv_{index}",
+                author="bench",
+                actions=EventActions(state_delta={"step": n}),
+            ),
+        )
+        # Stand-in for the model call between events
+        await asyncio.sleep(0.002)
+
+
+async def measure(session_service, requests, events):
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(fake_request(session_service, i, events) for i in range(requests)))
+    if isinstance(session_service, ThreadedSessionService):
+        await session_service.flush()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    return elapsed, sorted(lags)
+
+
+def report(label, elapsed, lags):
+    p99 = lags[int(len(lags) * 0.99) - 1] * 1000
+    print(
+        f"{label:<9} wall={elapsed:>6.2f}s  lag p50={statistics.median(lags) * 1000:>6.2f}ms  "
+        f"p99={p99:>7.2f}ms  max={lags[-1] * 1000:>7.2f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--events", type=int, default=8, help="events appended per request")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The first create_session of an app inserts its app_states row; do it
+        # up front so concurrent requests don't race on it.
+        direct = create_session_service(f"sqlite:///{tmp}/direct.db")
+        direct.create_session(app_name=APP_NAME, user_id="warmup")
+        threaded = ThreadedSessionService(create_session_service(f"sqlite:///{tmp}/threaded.db"))
+        threaded.create_session(app_name=APP_NAME, user_id="warmup")
+
+        print(f"{args.requests} concurrent requests x {args.events} events")
+        report("on-loop", *await measure(direct, args.requests, args.events))
+        report("threaded", *await measure(threaded, args.requests, args.events))
+        threaded.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
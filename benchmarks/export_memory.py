@@ -0,0 +1,136 @@
+"""
+Peak memory of a session DB export against events-table size.
+
+Grows a synthetic ADK events table (same schema as DatabaseSessionService)
+to each --rows size and exports it in a fresh subprocess, reporting that
+process's peak RSS and throughput:
+
+• legacy: fetchall() then csv.writerows, as the old data.py did (only up to
+  --legacy-max-rows, since its memory grows with the table)
+• csv / parquet / arrow: common.session_export, streaming in chunks
+
+Streaming memory should stay flat as the table grows.
+
+Usage:
+    python -m benchmarks.export_memory [--rows 1000000 3000000 10000000]
+        [--formats csv parquet] [--legacy-max-rows 1000000]
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.session_export import export_databases, pa
+
+EVENTS_DDL = """
+CREATE TABLE events (
+    id VARCHAR NOT NULL, app_name VARCHAR NOT NULL, user_id VARCHAR NOT NULL,
+    session_id VARCHAR NOT NULL, invocation_id VARCHAR NOT NULL, author VARCHAR NOT NULL,
+    branch VARCHAR, timestamp DATETIME NOT NULL, content TEXT, actions BLOB NOT NULL,
+    long_running_tool_ids_json TEXT, grounding_metadata TEXT, partial BOOLEAN,
+    turn_complete BOOLEAN, error_code VARCHAR, error_message VARCHAR, interrupted BOOLEAN,
+    PRIMARY KEY (id, app_name, user_id, session_id)
+)
+"""
+
+
+def grow_events(db_path: str, start: int, end: int, batch: int = 100_000) -> None:
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(EVENTS_DDL.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS"))
+    actions = os.urandom(96)
+    for first in range(start, end, batch):
+        rows = (
+            (
+                f"e{n:010d}", "bench_app", f"user_{n % 1000}", f"session_{n % 50_000}", f"inv_{n // 4}",
+                "code_writer_agent" if n % 2 else "user", None, f"2025-05-06 11:17:{n % 60:02d}.444054",
+                json.dumps({"parts": [{"text": f"message {n} " + "x" * 120}], "role": "model"}),
+                actions, None, None, None, n % 2, None, None, None,
+            )
+            for n in range(first, min(first + batch, end))
+        )
+        conn.executemany(f"INSERT INTO events VALUES ({', '.join('?' * 17)})", rows)
+        conn.commit()
+    conn.close()
+
+
+def legacy_export(db_path: str, output_dir: str) -> None:
+    """The old data.py export: every table fetched whole, then written."""
+    conn = sqlite3.connect(db_path)
+    for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall():
+        rows = conn.execute(f"SELECT * FROM {table}").fetchall()
+        columns = [column[1] for column in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+        with open(os.path.join(output_dir, f"{table}.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(rows)
+    conn.close()
+
+
+def measure(mode: str, db_path: str, output_dir: str):
+    """(seconds, peak RSS in MB) of one export in a fresh process."""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    began = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.export_memory", "--worker", mode, db_path, output_dir],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - began
+    if status != 0:
+        raise RuntimeError(f"{mode} export failed with status {status}")
+    # ru_maxrss is in KB on Linux
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def worker(mode: str, db_path: str, output_dir: str) -> None:
+    if mode == "legacy":
+        legacy_export(db_path, output_dir)
+    else:
+        export_databases([db_path], output_dir, fmt=mode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 3_000_000, 10_000_000])
+    parser.add_argument("--formats", nargs="+", default=["csv", "parquet"], choices=["csv", "parquet", "arrow"])
+    parser.add_argument("--legacy-max-rows", type=int, default=1_000_000)
+    parser.add_argument("--worker", nargs=3, metavar=("MODE", "DB", "OUTPUT_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(*args.worker)
+        return
+
+    formats = [fmt for fmt in args.formats if fmt == "csv" or pa is not None]
+    if formats != args.formats:
+        print("pyarrow isn't installed; skipping parquet/arrow")
+    workdir = tempfile.mkdtemp(prefix="export-bench-")
+    db_path = os.path.join(workdir, "events.db")
+    output_dir = os.path.join(workdir, "out")
+    try:
+        print(f"{'rows':>10} {'DB MB':>7} {'mode':>8} {'seconds':>8} {'rows/s':>10} {'peak MB':>8}")
+        size = 0
+        for rows in sorted(args.rows):
+            grow_events(db_path, size, rows)
+            size = rows
+            db_mb = os.path.getsize(db_path) / 2**20
+            modes = (["legacy"] if rows <= args.legacy_max_rows else []) + formats
+            for mode in modes:
+                seconds, peak_mb = measure(mode, db_path, output_dir)
+                print(f"{rows:>10} {db_mb:>7.0f} {mode:>8} {seconds:>8.1f} {rows / seconds:>10.0f} {peak_mb:>8.0f}", flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Refactor-stage latency against file size: full rewrite vs. edit list.
+
+Builds synthetic Python files of increasing size, with review comments
+asking for three small changes, and runs each through:
+
+• full: code_refactorer_agent, which outputs the whole refactored file
+• diff: code_diff_refactorer_agent, which outputs edits and applies them
+  (falling back to a full rewrite if they don't apply)
+
+Calls the real model, so OPENAI_API_KEY must be set. Every file gets a
+unique marker line, and the stage cache points at a throwaway file, so no
+run is answered from the cache.
+
+Usage:
+    python -m benchmarks.refactor_modes [--functions 10 50 200] [--repeats 3]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Before subagents is imported, so its stage cache uses this file
+os.environ["STAGE_CACHE_DB"] = os.path.join(tempfile.mkdtemp(), "stage_cache.db")
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from subagents import code_refactorer_agent, code_diff_refactorer_agent
+
+APP_NAME = "refactor_benchmark"
+USER_ID = "bench"
+
+REVIEW = """1. func_1 has an off-by-one error: the loop should include `limit`.
+2. func_3 is missing type hints; its arguments and return value are ints.
+3. In func_7, rename the variable `tmp` to `running_total`."""
+
+
+def synthetic_file(functions: int) -> str:
+    parts = [f"# run {uuid.uuid4().hex}\n"]
+    for n in range(functions):
+        parts.append(
+            f"def func_{n}(values, limit):\n"
+            f"    \"\"\"Sum of the values below limit, scaled by {n}.\"\"\"\n"
+            f"    tmp = 0\n"
+            f"    for i in range(limit):\n"
+            f"        if i < len(values):\n"
+            f"            tmp += values[i] * {n}\n"
+            f"    return tmp\n"
+        )
+    return "\n\n".join(parts)
+
+
+async def run_once(agent, code: str):
+    """Returns (seconds, chars the model wrote, whether the edits applied)."""
+    session_service = InMemorySessionService()
+    session_id = uuid.uuid4().hex
+    session_service.create_session(
+        app_name=APP_NAME, user_id=USER_ID, session_id=session_id,
+        state={"generated_code": code, "review_comments": REVIEW},
+    )
+    runner = Runner(agent=agent, app_name=APP_NAME, session_service=session_service)
+    message = types.Content(role="user", parts=[types.Part(text="Apply the review.")])
+    authors = set()
+    began = time.perf_counter()
+    async for event in runner.run_async(user_id=USER_ID, session_id=session_id, new_message=message):
+        authors.add(event.author)
+    elapsed = time.perf_counter() - began
+    state = session_service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id).state
+    fell_back = "code_rewrite_refactorer_agent" in authors
+    written = len(state.get("refactor_edits") or "")
+    if agent is code_refactorer_agent or fell_back:
+        written += len(state.get("refactored_code") or "")
+    return elapsed, written, agent is code_diff_refactorer_agent and not fell_back
+
+
+async def main_async(function_counts, repeats):
+    # Every file size goes through the edit path
+    code_diff_refactorer_agent.min_diff_chars = 0
+    print(f"{'functions':>9} {'file KB':>8} {'mode':>5} {'p50 s':>7} {'max s':>7} {'out chars':>10} {'applied':>8}")
+    for functions in function_counts:
+        for mode, agent in (("full", code_refactorer_agent), ("diff", code_diff_refactorer_agent)):
+            results = [await run_once(agent, synthetic_file(functions)) for _ in range(repeats)]
+            seconds = [r[0] for r in results]
+            size_kb = len(synthetic_file(functions)) / 1024
+            applied = f"{sum(r[2] for r in results)}/{repeats}" if mode == "diff" else "-"
+            print(
+                f"{functions:>9} {size_kb:>8.1f} {mode:>5} {statistics.median(seconds):>7.2f}"
+                f" {max(seconds):>7.2f} {int(statistics.mean(r[1] for r in results)):>10} {applied:>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--functions", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.functions, args.repeats))
+
+
+if __name__ == "__main__":
+    main()
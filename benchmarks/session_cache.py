@@ -0,0 +1,83 @@
+"""
+Append throughput and read latency: write-behind cache vs. direct storage.
+
+Appends a stream of chatter events (plus a checkpoint event every
+--checkpoint-every appends) to a set of sessions and reads the sessions back
+between appends, the way the code pipeline does. Compares the tuned
+DatabaseSessionService against WriteBehindSessionService wrapping it, then
+checks that both databases end up with the same number of events.
+
+Usage:
+    python -m benchmarks.session_cache [--sessions 20] [--appends 100]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event, EventActions
+
+from common.session_cache import WriteBehindSessionService
+from common.session_store import create_session_service
+
+APP_NAME = "bench_app"
+
+
+def run(session_service, sessions, appends, checkpoint_every):
+    handles = [
+        session_service.create_session(app_name=APP_NAME, user_id="user", session_id=f"s{i}")
+        for i in range(sessions)
+    ]
+    append_time = 0.0
+    read_latencies = []
+    for n in range(appends):
+        for index, session in enumerate(handles):
+            state_delta = {"chatter": n}
+            if checkpoint_every and n % checkpoint_every == 0:
+                state_delta["workflow_checkpoint"] = f"stage_{n}"
+            event = Event(
+                invocation_id=f"inv_{n}", author="bench", actions=EventActions(state_delta=state_delta)
+            )
+            began = time.perf_counter()
+            session_service.append_event(session, event)
+            append_time += time.perf_counter() - began
+
+            began = time.perf_counter()
+            handles[index] = session_service.get_session(
+                app_name=APP_NAME, user_id="user", session_id=session.id
+            )
+            read_latencies.append(time.perf_counter() - began)
+    return sessions * appends / append_time, statistics.median(read_latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--appends", type=int, default=100, help="events per session")
+    parser.add_argument("--checkpoint-every", type=int, default=25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {"direct": f"{tmp}/direct.db", "cached": f"{tmp}/cached.db"}
+        direct = create_session_service(f"sqlite:///{paths['direct']}")
+        cached = WriteBehindSessionService(create_session_service(f"sqlite:///{paths['cached']}"))
+
+        print(f"{args.sessions} sessions x {args.appends} appends, checkpoint every {args.checkpoint_every}")
+        for label, service in (("direct", direct), ("cached", cached)):
+            rate, read_ms = run(service, args.sessions, args.appends, args.checkpoint_every)
+            print(f"{label:<7} appends/s={rate:>9.1f}  get_session p50={read_ms:>7.3f}ms")
+        cached.close()
+
+        for label, path in paths.items():
+            with sqlite3.connect(path) as conn:
+                count = conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+            print(f"{label:<7} events persisted={count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Write throughput of the sharded session service against shard count.
+
+A fixed pool of writer threads appends events to many sessions (one session
+per simulated user) through ShardedSessionService with 1, 2, 4 and 8 shards.
+
+Usage:
+    python -m benchmarks.shard_throughput [--writers 32] [--events 30] [--shards 1 2 4 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event, EventActions
+
+from common.sharded_session_service import ShardedSessionService
+
+APP_NAME = "bench_app"
+
+
+def measure(service, writers, events_per_writer):
+    # One user per writer; create up front so the app_states row exists
+    sessions = [
+        service.create_session(app_name=APP_NAME, user_id=f"user_{i}", session_id=f"session_{i}")
+        for i in range(writers)
+    ]
+    errors = []
+
+    def writer(session):
+        for n in range(events_per_writer):
+            try:
+                service.append_event(
+                    session,
+                    Event(invocation_id=f"inv_{n}", author="bench", actions=EventActions(state_delta={"n": n})),
+                )
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(session,)) for session in sessions]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return (writers * events_per_writer - len(errors)) / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--events", type=int, default=30, help="events per writer")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.events} events")
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_shards in args.shards:
+            service = ShardedSessionService(f"{tmp}/n{num_shards}.{{shard}}.db", num_shards)
+            throughput, errors = measure(service, args.writers, args.events)
+            print(f"shards={num_shards:<3} appends/s={throughput:>8.1f}  errors={errors}")
+            for shard in service.shards:
+                shard.db_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Per-turn storage time of the code pipeline against session history length.
+
+Replays the storage calls of one three-stage pipeline turn on sessions that
+already hold --history events:
+
+• reload: the previous pattern, a get_session before the turn and again for
+  every stage, plus separate writes for the query, each output and each
+  checkpoint
+• uow: SessionUnitOfWork, one load per turn and one commit per stage
+
+Usage:
+    python -m benchmarks.turn_storage [--history 10 100 1000 5000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event, EventActions
+
+from common.session_store import create_session_service
+from common.unit_of_work import SessionUnitOfWork
+
+APP_NAME = "code_pipeline_app"
+USER_ID = "user_1"
+STAGES = [("generated_code", "reviewer_pending"), ("review_comments", "refactorer_pending"), ("refactored_code", "complete")]
+OUTPUT = "x = 1\n" * 200
+
+
+def _append(service, session, delta):
+    service.append_event(
+        session, Event(invocation_id=Event.new_id(), author="system", actions=EventActions(state_delta=delta))
+    )
+
+
+def reload_turn(service, session_id):
+    session = service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+    _append(service, session, {"last_query": "write a parser"})
+    for output_key, checkpoint in STAGES:
+        session = service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+        _append(service, session, {output_key: OUTPUT})
+        _append(service, session, {"workflow_checkpoint": checkpoint})
+
+
+def uow_turn(service, session_id):
+    uow = SessionUnitOfWork.load(service, APP_NAME, USER_ID, session_id)
+    uow.set("last_query", "write a parser")
+    uow.commit()
+    for output_key, checkpoint in STAGES:
+        uow.update({output_key: OUTPUT, "workflow_checkpoint": checkpoint})
+        uow.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service = create_session_service(f"sqlite:///{tmp}/turns.db")
+        print(f"{'history':>8} {'reload ms/turn':>15} {'uow ms/turn':>12}")
+        for history in args.history:
+            timings = {}
+            for label, turn in (("reload", reload_turn), ("uow", uow_turn)):
+                session_id = f"{label}_{history}"
+                session = service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+                for n in range(history):
+                    _append(service, session, {"chatter": n})
+                began = time.perf_counter()
+                for _ in range(args.turns):
+                    turn(service, session_id)
+                timings[label] = (time.perf_counter() - began) / args.turns * 1000
+            print(f"{history:>8} {timings['reload']:>15.1f} {timings['uow']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
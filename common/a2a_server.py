@@ -1,11 +1,47 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 import uvicorn
 
-def create_app(agent):
-    app = FastAPI()
+from common.async_jobs import JobStore, job_router
+from common.structured_logging import configure_logging, fields
+
+logger = logging.getLogger(__name__)
+
+
+def create_app(agent, async_jobs=False, **job_options):
+    """
+    FastAPI app serving `agent.execute` at POST /run.
+
+    With `async_jobs`, the agent is also served as jobs under /jobs (see
+    common.async_jobs); `job_options` go to its JobStore.
+    """
+    configure_logging()
+    job_store = JobStore(agent.execute, **job_options) if async_jobs else None
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        if job_store is not None:
+            # Cancel the jobs still queued or running
+            await job_store.close()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.exception_handler(Exception)
+    async def log_unhandled(request: Request, exc: Exception):
+        # Logged at ERROR, which also writes out the recent-records ring buffer
+        logger.exception("Unhandled error", extra=fields(method=request.method, path=request.url.path))
+        return JSONResponse(status_code=500, content={"error": "Internal server error"})
 
     @app.post("/run")
     async def run(payload: dict):
         return await agent.execute(payload)
 
+    if job_store is not None:
+        app.state.job_store = job_store
+        app.include_router(job_router(job_store))
+
     return app
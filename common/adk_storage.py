@@ -0,0 +1,63 @@
+"""
+The parts of DatabaseSessionService's internals that batched writes need.
+
+ADK has no API for writing several events in one transaction, so the
+write-behind cache (common.session_cache) builds the storage rows itself.
+The row classes, the split of a state delta into app/user/session parts and
+the content encoding are private to google.adk.sessions and may change
+between ADK releases (these match 0.5.0); everything that depends on them
+goes through this module, so an upgrade has one place to check.
+"""
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import _session_util
+from google.adk.sessions.database_session_service import (
+    StorageAppState,
+    StorageEvent,
+    StorageSession,
+    StorageUserState,
+    _extract_state_delta,
+)
+
+SessionKey = Tuple[str, str, str]
+
+__all__ = [
+    "StorageAppState",
+    "StorageSession",
+    "StorageUserState",
+    "split_state_delta",
+    "storage_event",
+]
+
+
+def split_state_delta(state_delta: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """(app, user, session) parts of a state delta; temp: keys are dropped."""
+    return _extract_state_delta(state_delta)
+
+
+def storage_event(key: SessionKey, event: Event) -> StorageEvent:
+    """The events row DatabaseSessionService.append_event writes for `event`."""
+    app_name, user_id, session_id = key
+    row = StorageEvent(
+        id=event.id,
+        invocation_id=event.invocation_id,
+        author=event.author,
+        branch=event.branch,
+        actions=event.actions,
+        session_id=session_id,
+        app_name=app_name,
+        user_id=user_id,
+        timestamp=datetime.fromtimestamp(event.timestamp),
+        long_running_tool_ids=event.long_running_tool_ids,
+        grounding_metadata=event.grounding_metadata,
+        partial=event.partial,
+        turn_complete=event.turn_complete,
+        error_code=event.error_code,
+        error_message=event.error_message,
+        interrupted=event.interrupted,
+    )
+    if event.content:
+        row.content = _session_util.encode_content(event.content)
+    return row
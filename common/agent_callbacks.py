@@ -0,0 +1,192 @@
+"""
+Before-agent callbacks compiled once per agent.
+
+A before-agent callback runs on every agent invocation, so it should do as
+little as possible per call. A `CallbackChain` is built from steps, and each
+step is a factory that receives the agent once. The factory returns the
+per-call function, or None when the step doesn't apply to that agent. The
+chain compiles the functions of each agent on its first invocation and
+afterwards only loops over them:
+
+    skip_completed_agent = CallbackChain(debug_state, skip_completed, metrics=callback_metrics)
+
+The state is looked up through an accessor, which is resolved the first time
+a given context type is seen. Output keys come from each agent's own
+`output_key`, so a new agent needs no registration.
+
+`skip_completed` skips an agent whose `output_key` already holds an output
+for the current user request and returns it, so a resent request resumes at
+the first unfinished agent; each output is stamped with the request it
+answers. `debug_state` logs the state's keys and value sizes, never the
+values, at DEBUG level or when ADK_DEBUG_CTX=1. `CallbackMetrics` counts
+invocations and skips per agent, and the time spent in the chain.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from operator import attrgetter
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+# Per-call function of a step: (callback_context, state) -> Content to skip the agent, or None
+AgentCallback = Callable[[Any, Any], Optional[types.Content]]
+Step = Callable[[Any], Optional[AgentCallback]]
+
+# Where a context type may keep the session state, in order of preference;
+# CallbackContext.state is delta-aware, so writes to it are recorded
+_STATE_CANDIDATES = (
+    "state",
+    "_invocation_context.session.state",
+    "session.state",
+)
+_state_accessors: Dict[type, Optional[Callable[[Any], Any]]] = {}
+
+# `<output_key>__request` holds the request_digest of the request the output answers
+REQUEST_KEY_SUFFIX = "__request"
+
+
+def _resolve_state_accessor(context_type: type, context: Any) -> Optional[Callable[[Any], Any]]:
+    for path in _STATE_CANDIDATES:
+        getter = attrgetter(path)
+        try:
+            candidate = getter(context)
+        except AttributeError:
+            continue
+        if hasattr(candidate, "__contains__") and hasattr(candidate, "__getitem__"):
+            logger.debug("State of %s read via .%s", context_type.__name__, path)
+            return getter
+    logger.warning("No session state found on %s; its callbacks will see no state", context_type.__name__)
+    return None
+
+
+def state_of(context: Any) -> Optional[Any]:
+    """The session state of a callback context; the accessor is resolved once per context type."""
+    context_type = type(context)
+    try:
+        accessor = _state_accessors[context_type]
+    except KeyError:
+        accessor = _state_accessors[context_type] = _resolve_state_accessor(context_type, context)
+    return accessor(context) if accessor is not None else None
+
+
+def request_digest(content: Optional[types.Content]) -> str:
+    """Short digest of a user request's text."""
+    text = "".join(part.text or "" for part in content.parts or []) if content is not None else ""
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def skip_completed(agent: Any) -> Optional[AgentCallback]:
+    """Skip the agent when its output_key holds an output for this user request, returning it."""
+    output_key = getattr(agent, "output_key", None)
+    if not output_key:
+        return None
+    request_key = output_key + REQUEST_KEY_SUFFIX
+
+    def skip_if_present(callback_context, state) -> Optional[types.Content]:
+        request = request_digest(callback_context.user_content)
+        saved_value = state.get(output_key)
+        if state.get(request_key) != request:
+            # A new request: whatever is saved answers an earlier one. Clearing
+            # it means a run that fails before writing its output isn't skipped
+            # with the old one when the request is resent.
+            state[request_key] = request
+            if saved_value is not None:
+                state[output_key] = None
+            return None
+        if saved_value is None:
+            return None
+        # Downstream agents need a proper Content object
+        if isinstance(saved_value, types.Content):
+            return saved_value
+        return types.Content(role="model", parts=[types.Part(text=str(saved_value))])
+
+    return skip_if_present
+
+
+def debug_state(agent: Any) -> Optional[AgentCallback]:
+    """Log the state's keys and value sizes before the agent runs (DEBUG or ADK_DEBUG_CTX=1 only)."""
+    forced = os.getenv("ADK_DEBUG_CTX") == "1"
+    log = logger.info if forced else logger.debug
+    name = agent.name
+
+    def log_state(callback_context, state) -> None:
+        # Checked per call: the chain compiles once, but the level can change later
+        if not (forced or logger.isEnabledFor(logging.DEBUG)):
+            return None
+        # ADK's State isn't iterable; its committed values and pending delta are
+        values = {**state._value, **state._delta} if hasattr(state, "_delta") else dict(state)
+        log("[%s] state: %s", name, {key: len(str(value)) for key, value in values.items()})
+        return None
+
+    return log_state
+
+
+class CallbackMetrics:
+    """Invocations, skips and callback time per agent."""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self.skips: Counter = Counter()
+        self.overhead_ns: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, agent_name: str, skipped: bool, elapsed_ns: int) -> None:
+        with self._lock:
+            self.calls[agent_name] += 1
+            self.skips[agent_name] += skipped
+            self.overhead_ns[agent_name] += elapsed_ns
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Per agent: calls, skips and mean callback overhead in microseconds."""
+        with self._lock:
+            return {
+                name: {
+                    "calls": calls,
+                    "skips": self.skips[name],
+                    "mean_us": self.overhead_ns[name] / calls / 1000,
+                }
+                for name, calls in sorted(self.calls.items())
+            }
+
+
+class CallbackChain:
+    """A before-agent callback running its steps' compiled functions in order; the first Content wins."""
+
+    def __init__(self, *steps: Step, metrics: Optional[CallbackMetrics] = None):
+        self.steps = steps
+        self.metrics = metrics
+        # id(agent) -> compiled functions; agents live as long as the process
+        self._compiled: Dict[int, Tuple[AgentCallback, ...]] = {}
+
+    def compile(self, agent: Any) -> Tuple[AgentCallback, ...]:
+        compiled = tuple(fn for fn in (step(agent) for step in self.steps) if fn is not None)
+        self._compiled[id(agent)] = compiled
+        return compiled
+
+    def __call__(self, callback_context) -> Optional[types.Content]:
+        began = time.perf_counter_ns() if self.metrics is not None else 0
+        agent = callback_context._invocation_context.agent
+        compiled = self._compiled.get(id(agent))
+        if compiled is None:
+            compiled = self.compile(agent)
+        result = None
+        state = state_of(callback_context) if compiled else None
+        if state is not None:
+            for fn in compiled:
+                result = fn(callback_context, state)
+                if result is not None:
+                    break
+        if self.metrics is not None:
+            self.metrics.record(agent.name, result is not None, time.perf_counter_ns() - began)
+        return result
+
+
+callback_metrics = CallbackMetrics()
@@ -0,0 +1,203 @@
+"""
+Asynchronous job mode for the agent servers: submit, poll, fetch the result.
+
+POST /run holds the caller's connection (and, in the Streamlit UI, a script
+thread) for the whole agent chain. `create_app(agent, async_jobs=True)`
+serves the same agent as jobs as well:
+
+    POST /jobs                       202 {"job_id", "status": "queued"}, Location: /jobs/<id>
+    GET  /jobs/<id>[?wait=20]        the job's status, with "result" or "error" once it has finished
+    GET  /jobs/<id>/result[?wait=20] 200 with what POST /run returns, once done;
+                                     202 with the status while it runs; 500 if it failed
+
+POST /jobs takes the same payload as /run. With `wait`, a GET is held until
+the job finishes or `wait` seconds (at most `max_wait`) pass, so a client
+can long-poll instead of polling in a tight loop.
+
+Jobs run as tasks in the server's event loop, at most `max_running` at a
+time; the rest wait their turn as "queued". They are kept in memory, so a
+restart forgets them (use POST /run, or the code pipeline's durable job
+queue, where that matters). Finished jobs are kept for `result_ttl` seconds
+and at most `max_jobs` jobs are held at all: beyond that the oldest
+finished ones are dropped first, and if every held job is still active,
+POST /jobs answers 503 with Retry-After. An unknown or expired id is 404.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+from common.structured_logging import fields
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobStoreFull(RuntimeError):
+    """Every job slot holds a job that hasn't finished yet."""
+
+
+class _Job:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.done = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def describe(self) -> Dict[str, Any]:
+        status = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "done":
+            status["result"] = self.result
+        elif self.status == "failed":
+            status["error"] = self.error
+        return status
+
+
+class JobStore:
+    """Bounded, expiring in-memory store of agent runs started by POST /jobs."""
+
+    def __init__(
+        self,
+        execute: Callable[[dict], Awaitable[Any]],
+        max_jobs: int = 1000,
+        max_running: int = 8,
+        result_ttl: float = 600.0,
+        max_wait: float = 60.0,
+    ):
+        """
+        Args:
+            execute: The agent's execute(payload) coroutine function.
+            max_jobs: Jobs held at once, active and finished.
+            max_running: Jobs executing at once.
+            result_ttl: Seconds a finished job's result is kept.
+            max_wait: Longest a long-poll request is held.
+        """
+        self.execute = execute
+        self.max_jobs = max_jobs
+        self.result_ttl = result_ttl
+        self.max_wait = max_wait
+        self._jobs: Dict[str, _Job] = {}
+        # job id -> expiry (monotonic), in the order the jobs finished
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        self._running = asyncio.Semaphore(max_running)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        while self._finished:
+            job_id, expires_at = next(iter(self._finished.items()))
+            if expires_at > now:
+                return
+            self._finished.popitem(last=False)
+            self._jobs.pop(job_id, None)
+
+    def submit(self, payload: dict) -> _Job:
+        """Start a job for `payload`; raises JobStoreFull when no slot can be freed."""
+        self._expire()
+        if len(self._jobs) >= self.max_jobs:
+            if not self._finished:
+                raise JobStoreFull(f"{len(self._jobs)} jobs are still running or queued")
+            job_id, _ = self._finished.popitem(last=False)
+            self._jobs.pop(job_id, None)
+        job = _Job(uuid.uuid4().hex)
+        self._jobs[job.job_id] = job
+        job.task = asyncio.create_task(self._run(job, payload))
+        return job
+
+    def get(self, job_id: str) -> Optional[_Job]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[_Job]:
+        """The job, after it finishes or `timeout` (capped at max_wait) seconds pass."""
+        job = self.get(job_id)
+        if job is not None and timeout > 0 and job.status in ACTIVE_STATUSES:
+            try:
+                await asyncio.wait_for(job.done.wait(), min(timeout, self.max_wait))
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    async def _run(self, job: _Job, payload: dict) -> None:
+        try:
+            async with self._running:
+                job.status, job.started_at = "running", time.time()
+                job.result = await self.execute(payload)
+                job.status = "done"
+        except asyncio.CancelledError:
+            job.status, job.error = "failed", "cancelled"
+            raise
+        except Exception as e:
+            # Logged at ERROR, which also writes out the recent-records ring buffer
+            logger.exception("Job failed", extra=fields(event="job_failed", job_id=job.job_id))
+            job.status, job.error = "failed", str(e) or type(e).__name__
+        finally:
+            job.finished_at = time.time()
+            self._finished[job.job_id] = time.monotonic() + self.result_ttl
+            job.done.set()
+            job.task = None
+        logger.info("Job finished", extra=fields(
+            event="job_done", job_id=job.job_id, status=job.status,
+            queued_s=round(job.started_at - job.created_at, 3),
+            run_s=round(job.finished_at - job.started_at, 3),
+        ))
+
+    async def close(self) -> None:
+        """Cancel the jobs still queued or running."""
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def job_router(store: JobStore) -> APIRouter:
+    """The /jobs routes over `store`."""
+    router = APIRouter(prefix="/jobs")
+
+    def found(job: Optional[_Job]) -> _Job:
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired job")
+        return job
+
+    @router.post("", status_code=202)
+    async def submit_job(payload: dict):
+        try:
+            job = store.submit(payload)
+        except JobStoreFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job.job_id, "status": job.status},
+            headers={"Location": f"/jobs/{job.job_id}"},
+        )
+
+    @router.get("/{job_id}")
+    async def job_status(job_id: str, wait: float = Query(0, ge=0, description="Seconds to hold the request")):
+        return found(await store.wait(job_id, wait)).describe()
+
+    @router.get("/{job_id}/result")
+    async def job_result(job_id: str, wait: float = Query(0, ge=0, description="Seconds to hold the request")):
+        job = found(await store.wait(job_id, wait))
+        if job.status == "done":
+            return job.result
+        if job.status == "failed":
+            return JSONResponse(status_code=500, content={"error": job.error, "job_id": job_id})
+        return JSONResponse(status_code=202, content=job.describe())
+
+    return router
@@ -0,0 +1,305 @@
+"""
+Session service that keeps SQLite I/O off the asyncio event loop.
+
+ADK's session services are synchronous, and `Runner.run_async` calls
+`get_session` and `append_event` directly on the event loop, as does every
+agent's `execute()` when it creates its session. One slow fsync then stalls
+every in-flight request on that worker.
+
+`ThreadedSessionService` wraps any session service and funnels all of its
+storage calls through one dedicated writer thread. Coroutines use the
+`*_async` methods, which await that thread. A session they load is pinned
+and handed to the Runner's next synchronous `get_session` for the same key
+without touching the database, so Runner calls go through `turn()`, which
+loads and pins the session first and runs the turns of one session one at
+a time. `append_event` updates the in-memory session and queues the write;
+writes run in order, so a later read sees earlier appends.
+
+A queued write that fails is not dropped silently: it and the later writes
+of the same session (which would otherwise land after a gap) are set
+aside, and the next `flush()`, or `get_session` of that session, raises
+`SessionWriteError` with them. The caller can retry them with
+`retry_failed()`.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListEventsResponse,
+    ListSessionsResponse,
+)
+
+logger = logging.getLogger(__name__)
+
+SessionKey = Tuple[str, str, str]
+
+
+class SessionWriteError(RuntimeError):
+    """Queued event writes failed; `failed` holds (session, event, error) for each."""
+
+    def __init__(self, failed: List[Tuple[Session, Event, Exception]]):
+        self.failed = failed
+        sessions = sorted({session.id for session, _, _ in failed})
+        super().__init__(
+            f"{len(failed)} event write(s) failed for session(s) {', '.join(sessions)}: {failed[0][2]}"
+        )
+
+
+class ThreadedSessionService(BaseSessionService):
+    """Runs a wrapped session service's storage calls on one dedicated thread."""
+
+    def __init__(self, backend: BaseSessionService, max_pinned: int = 1024):
+        """
+        Args:
+            backend: The session service to run on the writer thread.
+            max_pinned: Sessions kept pinned for the Runner at once; a pin
+                never picked up by a get_session is dropped, oldest first,
+                beyond this.
+        """
+        self._backend = backend
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-io")
+        self._max_pinned = max_pinned
+        # Sessions loaded ahead of time for the Runner's synchronous get_session
+        self._pinned: OrderedDict[SessionKey, List[Session]] = OrderedDict()
+        # Writes that failed, and the later writes of the same sessions, in order.
+        # The writer thread adds to it; callers take entries out in _raise_failed.
+        self._failed: Dict[SessionKey, List[Tuple[Session, Event, Exception]]] = {}
+        self._failed_lock = threading.Lock()
+        # Per session in a turn: [lock, turns holding or waiting for it]
+        self._turns: Dict[SessionKey, list] = {}
+
+    @property
+    def backend(self) -> BaseSessionService:
+        """The wrapped session service."""
+        return self._backend
+
+    # ------------------------------------------------------------------ async
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def _pin(self, session: Optional[Session]) -> Optional[Session]:
+        if session is not None:
+            key = (session.app_name, session.user_id, session.id)
+            self._pinned.setdefault(key, []).append(session)
+            self._pinned.move_to_end(key)
+            while len(self._pinned) > self._max_pinned:
+                self._pinned.popitem(last=False)
+        return session
+
+    def _unpin(self, session: Session) -> None:
+        key = (session.app_name, session.user_id, session.id)
+        pinned = self._pinned.get(key, [])
+        for index, candidate in enumerate(pinned):
+            if candidate is session:
+                del pinned[index]
+                break
+        if key in self._pinned and not pinned:
+            del self._pinned[key]
+
+    def _raise_failed(self, keys: Optional[Iterable[SessionKey]] = None) -> None:
+        """Raise SessionWriteError for the failed writes of `keys` (of every session if None)."""
+        with self._failed_lock:
+            keys = list(self._failed) if keys is None else keys
+            failed = [entry for k in keys for entry in self._failed.pop(k, [])]
+        if failed:
+            raise SessionWriteError(failed)
+
+    async def create_session_async(self, **kwargs: Any) -> Session:
+        """Create a session on the writer thread and pin it for the Runner."""
+        return self._pin(await self._run(self._backend.create_session, **kwargs))
+
+    async def get_session_async(self, pin: bool = True, **kwargs: Any) -> Optional[Session]:
+        """Load a session on the writer thread and, unless pin=False, pin it for the Runner."""
+        session = await self._run(self._backend.get_session, **kwargs)
+        self._raise_failed([(kwargs["app_name"], kwargs["user_id"], kwargs["session_id"])])
+        return self._pin(session) if pin else session
+
+    async def ensure_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        state: Optional[dict[str, Any]] = None,
+        pin: bool = True,
+    ) -> Session:
+        """
+        Get the session, creating it if missing, in a single writer-thread trip.
+
+        Unless pin=False the session is pinned for the Runner; pass False when
+        no Runner call for this session follows.
+        """
+
+        def get_or_create():
+            session = self._backend.get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id
+            )
+            if session is None:
+                session = self._backend.create_session(
+                    app_name=app_name, user_id=user_id, session_id=session_id, state=state
+                )
+            return session
+
+        session = await self._run(get_or_create)
+        self._raise_failed([(app_name, user_id, session_id)])
+        return self._pin(session) if pin else session
+
+    async def flush(self) -> None:
+        """Wait until every queued write has been processed; raise SessionWriteError for any that failed."""
+        await self._run(lambda: None)
+        self._raise_failed()
+
+    async def retry_failed(self, failed: List[Tuple[Session, Event, Exception]]) -> None:
+        """Queue the writes of a SessionWriteError again, in their order, and wait for them."""
+        for session, event, _ in failed:
+            self._executor.submit(self._write_event, session, event)
+        await self._run(lambda: None)
+        # Only these sessions' failures; others are left for their own callers
+        self._raise_failed({(session.app_name, session.user_id, session.id) for session, _, _ in failed})
+
+    @asynccontextmanager
+    async def turn(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        state: Optional[dict[str, Any]] = None,
+    ) -> AsyncIterator[Session]:
+        """
+        Hold a session for one Runner call on it.
+
+        Waits for the other turns of the same session, then loads it (creating
+        it if missing) off the event loop and pins it for the Runner. Failed
+        writes of an earlier turn are retried once first; SessionWriteError is
+        raised if they fail again.
+
+            async with session_service.turn(app_name=..., user_id=..., session_id=...):
+                async for event in runner.run_async(...):
+                    ...
+        """
+        key = (app_name, user_id, session_id)
+        entry = self._turns.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                load = partial(self.ensure_session, app_name=app_name, user_id=user_id, session_id=session_id, state=state)
+                try:
+                    session = await load()
+                except SessionWriteError as e:
+                    logger.warning("Retrying %d failed event write(s) of session %s", len(e.failed), session_id)
+                    await self.retry_failed(e.failed)
+                    session = await load()
+                try:
+                    yield session
+                finally:
+                    # Still pinned if the Runner failed before loading it
+                    self._unpin(session)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._turns[key]
+
+    def close(self) -> None:
+        """Drain the queued writes and stop the writer thread."""
+        self._executor.shutdown(wait=True)
+
+    # ------------------------------------------------------------------- sync
+
+    def _call(self, func, *args, **kwargs):
+        return self._executor.submit(func, *args, **kwargs).result()
+
+    def create_session(self, **kwargs: Any) -> Session:
+        return self._call(self._backend.create_session, **kwargs)
+
+    def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        self._raise_failed([(app_name, user_id, session_id)])
+        pinned = self._pinned.get((app_name, user_id, session_id))
+        if pinned and config is None:
+            session = pinned.pop(0)
+            if not pinned:
+                del self._pinned[(app_name, user_id, session_id)]
+            return session
+        # Not preloaded: this blocks the caller until the read is done
+        return self._call(
+            self._backend.get_session,
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config,
+        )
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        return self._call(self._backend.list_sessions, app_name=app_name, user_id=user_id)
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        self._pinned.pop(key, None)
+        self._call(
+            self._backend.delete_session,
+            app_name=app_name, user_id=user_id, session_id=session_id,
+        )
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        return self._call(
+            self._backend.list_events,
+            app_name=app_name, user_id=user_id, session_id=session_id,
+        )
+
+    def close_session(self, *, session: Session):
+        # A session that is done with no longer needs a pin for the Runner
+        self._pinned.pop((session.app_name, session.user_id, session.id), None)
+        self._backend.close_session(session=session)
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        # The in-memory session is what the running agent reads from
+        super().append_event(session=session, event=event)
+        self._executor.submit(self._write_event, session, event)
+        return event
+
+    def _write_event(self, session: Session, event: Event) -> None:
+        """Writer-thread half of append_event."""
+        key = (session.app_name, session.user_id, session.id)
+        with self._failed_lock:
+            if key in self._failed:
+                # Writing it would leave a gap where the failed event belongs
+                self._failed[key].append((session, event, RuntimeError("an earlier write of this session failed")))
+                return
+        # The backend also applies the event to the session object it is
+        # given; hand it an empty stand-in so the live session isn't updated
+        # twice. The stand-in carries the live session's last_update_time, so
+        # ADK's stale-session check still rejects writes to a session that was
+        # changed in storage after it was loaded.
+        stand_in = Session(
+            app_name=session.app_name,
+            user_id=session.user_id,
+            id=session.id,
+            last_update_time=session.last_update_time,
+        )
+        try:
+            self._backend.append_event(session=stand_in, event=event)
+        except Exception as e:
+            logger.exception("Failed to persist event %s of session %s", event.id, session.id)
+            with self._failed_lock:
+                self._failed.setdefault(key, []).append((session, event, e))
+            return
+        session.last_update_time = stand_in.last_update_time
@@ -0,0 +1,252 @@
+"""
+Content-addressed blob store for large session-state values.
+
+The code pipeline keeps whole files (`generated_code`, `review_comments`,
+`refactored_code`) in session state, and ADK rewrites the full state JSON on
+every append_event and reloads it on every get_session. The same text is
+also in the content of the event that produced it. Large values are instead
+written once to a deduplicated, zlib-compressed blob store and only a short
+reference ("blob:sha256:<hex>") is kept in state and in stored events.
+
+Values are loaded back lazily, only where they are actually read:
+`resolve_blob_refs` is a before-model callback that swaps the blob contents
+into the system instruction (where templates such as `{generated_code}`
+render to the reference) and into the conversation history just before the
+model call; `BlobStore.resolve` is for code that reads state directly (e.g.
+"show final code").
+
+Blobs are shared by every session that stores the same content, so they are
+not removed with a session; `BlobStore.sweep` (run by `python -m
+common.session_maintenance --sweep-blobs`) deletes the ones no session
+references any more.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.genai import types
+
+BLOB_REF_PREFIX = "blob:sha256:"
+BLOB_REF_PATTERN = re.compile(r"blob:sha256:[0-9a-f]{64}")
+BLOB_DIGEST_PATTERN = re.compile(r"blob:sha256:([0-9a-f]{64})")
+
+
+class MissingBlobError(RuntimeError):
+    """A reference whose blob isn't in the store (swept, or written under another root)."""
+
+
+def is_blob_ref(value: Any) -> bool:
+    """Whether a state value is a blob reference rather than the value itself."""
+    return isinstance(value, str) and BLOB_REF_PATTERN.fullmatch(value) is not None
+
+
+class BlobStore:
+    """Stores strings by SHA-256 under `root`, compressed, with a small read cache."""
+
+    def __init__(self, root: str = "./db/blobs", min_size: int = 1024, cache_size: int = 64):
+        """
+        Args:
+            root: Directory holding the blob files.
+            min_size: Strings shorter than this stay inline in state.
+            cache_size: Number of decoded blobs kept in memory.
+        """
+        self.root = root
+        self.min_size = min_size
+        self._cache_size = cache_size
+        self._cache: OrderedDict[str, str] = OrderedDict()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:] + ".zz")
+
+    def put(self, value: str) -> str:
+        """Store `value` (once per distinct content) and return its reference."""
+        data = value.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename, so readers never see half a blob
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(zlib.compress(data, 6))
+            os.replace(tmp_path, path)
+        self._remember(digest, value)
+        return BLOB_REF_PREFIX + digest
+
+    def get(self, ref: str) -> str:
+        """Load the value behind a reference; MissingBlobError if the blob is gone."""
+        if not is_blob_ref(ref):
+            raise ValueError(f"Not a blob reference: {ref[:80]!r}")
+        digest = ref[len(BLOB_REF_PREFIX):]
+        cached = self._cache.get(digest)
+        if cached is not None:
+            self._cache.move_to_end(digest)
+            return cached
+        try:
+            with open(self._path(digest), "rb") as f:
+                value = zlib.decompress(f.read()).decode("utf-8")
+        except FileNotFoundError:
+            raise MissingBlobError(
+                f"Blob {digest} is not under {self.root}: it was swept (session_maintenance"
+                " --sweep-blobs) or stored under another root"
+            ) from None
+        self._remember(digest, value)
+        return value
+
+    def _remember(self, digest: str, value: str) -> None:
+        self._cache[digest] = value
+        self._cache.move_to_end(digest)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def offload(self, value: Any) -> Any:
+        """Replace a large string with its reference; leave anything else as is."""
+        if isinstance(value, str) and len(value) >= self.min_size and not is_blob_ref(value):
+            return self.put(value)
+        return value
+
+    def resolve(self, value: Any) -> Any:
+        """Return the stored value if `value` is a reference, else `value` itself."""
+        return self.get(value) if is_blob_ref(value) else value
+
+    def resolve_text(self, text: str) -> str:
+        """Expand every reference embedded in a larger string."""
+        return BLOB_REF_PATTERN.sub(lambda match: self.get(match.group()), text)
+
+    def sweep(self, referenced: Set[str], min_age: float = 3600.0) -> Tuple[int, int]:
+        """
+        Delete the blobs whose digest is not in `referenced`.
+
+        Blobs younger than `min_age` seconds are kept: a value is put before
+        the event that references it is written (or flushed, with write-behind
+        sessions). Returns (files, bytes) removed.
+        """
+        if not os.path.isdir(self.root):
+            return 0, 0
+        cutoff = time.time() - min_age
+        files = size = 0
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if not name.endswith(".zz"):
+                    continue
+                digest = prefix + name[:-len(".zz")]
+                if digest in referenced:
+                    continue
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                os.remove(path)
+                self._cache.pop(digest, None)
+                files += 1
+                size += stat.st_size
+        return files, size
+
+
+def blob_digests(values: Iterable[Any]) -> Set[str]:
+    """Digests of the references found in `values` (strings, or bytes such as pickled actions)."""
+    digests = set()
+    for value in values:
+        if isinstance(value, bytes):
+            value = value.decode("latin-1")
+        if isinstance(value, str):
+            digests.update(BLOB_DIGEST_PATTERN.findall(value))
+    return digests
+
+
+# Shared by the session service wrapper and the model callback below; the
+# directory is created by the first put()
+default_blob_store = BlobStore()
+
+
+def resolve_blob_refs(callback_context, llm_request) -> None:
+    """
+    BEFORE-MODEL callback that expands blob references in the system instruction
+    and in the text of the conversation history (copies ADK made for this request).
+
+    Returning None lets the model call proceed with the updated request.
+    """
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    if isinstance(instruction, str) and BLOB_REF_PREFIX in instruction:
+        llm_request.config.system_instruction = default_blob_store.resolve_text(instruction)
+    for content in llm_request.contents or []:
+        for part in content.parts or []:
+            if part.text and BLOB_REF_PREFIX in part.text:
+                part.text = default_blob_store.resolve_text(part.text)
+    return None
+
+
+class BlobOffloadingSessionService(BaseSessionService):
+    """
+    Session-service wrapper that moves large state_delta values and event
+    texts into a BlobStore.
+
+    Only the references reach the wrapped service, so neither the in-memory
+    session nor the database rows carry the full values. Methods not
+    defined here (ensure_session, flush, close, ...) pass through.
+    """
+
+    def __init__(self, backend: BaseSessionService, blob_store: Optional[BlobStore] = None):
+        self._backend = backend
+        self.blob_store = blob_store or default_blob_store
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+    def _offload_state(self, state: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not state:
+            return state
+        return {key: self.blob_store.offload(value) for key, value in state.items()}
+
+    def _offload_content(self, content: Optional[types.Content]) -> Optional[types.Content]:
+        """A copy of `content` with large text parts replaced by references, or `content` itself."""
+        if content is None or not content.parts:
+            return content
+        parts = [
+            part.model_copy(update={"text": self.blob_store.offload(part.text)}) if part.text else part
+            for part in content.parts
+        ]
+        if all(new.text == old.text for new, old in zip(parts, content.parts)):
+            return content
+        return content.model_copy(update={"parts": parts})
+
+    def create_session(self, *, state: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Session:
+        return self._backend.create_session(state=self._offload_state(state), **kwargs)
+
+    def get_session(self, **kwargs: Any) -> Optional[Session]:
+        return self._backend.get_session(**kwargs)
+
+    def list_sessions(self, **kwargs: Any):
+        return self._backend.list_sessions(**kwargs)
+
+    def delete_session(self, **kwargs: Any) -> None:
+        self._backend.delete_session(**kwargs)
+
+    def list_events(self, **kwargs: Any):
+        return self._backend.list_events(**kwargs)
+
+    def close_session(self, *, session: Session):
+        self._backend.close_session(session=session)
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        if event.actions and event.actions.state_delta:
+            event.actions.state_delta = self._offload_state(event.actions.state_delta)
+        content = None if event.partial else self._offload_content(event.content)
+        if content is not None and content is not event.content:
+            # Store a copy: the Runner yields `event` itself after appending it,
+            # and callers read the response text from it
+            self._backend.append_event(session=session, event=event.model_copy(update={"content": content}))
+            return event
+        return self._backend.append_event(session=session, event=event)
@@ -0,0 +1,247 @@
+"""
+Append-only chat storage for the Streamlit UI (geometry_ui.py).
+
+The UI used to keep each user's whole conversation as one JSON array in
+`chat_history.messages`, rewritten on every turn and parsed again on every
+rerun, so a turn cost O(history) and a conversation O(n²). Here every
+message is its own row:
+
+    chat_messages (user_id, seq, role, content, created_at)
+        PRIMARY KEY (user_id, seq)
+    chat_users (user_id, length, width, created_at)
+
+A turn is one insert of its new messages, plus a one-row update when the
+rectangle's dimensions changed. History is read newest first a page at a
+time through the (user_id, seq) key, so opening a long conversation reads
+one page and parses nothing.
+
+The database runs in WAL mode, so the UI's reads never wait for a write
+in another browser session. One ChatStore (one connection) can be shared
+by every script thread of the Streamlit process; its methods take a lock,
+so each transaction stays on one thread.
+
+Opening the store converts any `chat_history` rows it finds, in a single
+transaction, and then drops that table. This can also be run explicitly:
+
+    python -m common.chat_store --migrate [--db ./db/ui_sessions.db]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.session_dbs import connect, table_names
+
+DEFAULT_DB_PATH = "./db/ui_sessions.db"
+DEFAULT_DIMENSIONS = (5.0, 3.0)
+GREETING = (
+    "Hello! I'm your geometry assistant. I can help you calculate the area and perimeter of rectangles. "
+    "Just tell me the dimensions (e.g., 'Calculate the area of a rectangle with length 5 and width 3')."
+)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS chat_users (
+        user_id TEXT PRIMARY KEY,
+        length REAL NOT NULL,
+        width REAL NOT NULL,
+        created_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        user_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (user_id, seq)
+    )
+    """,
+]
+
+Message = Dict[str, object]
+
+
+def _message(row: Tuple) -> Message:
+    return {"seq": row[0], "role": row[1], "content": row[2]}
+
+
+class ChatStore:
+    """Per-user chat messages and rectangle dimensions in the UI's SQLite database."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, migrate: bool = True):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.conn = connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        if migrate:
+            migrate_chat_history(self.conn)
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    # ------------------------------------------------------------ users
+
+    def open_conversation(self, user_id: str, greeting: Optional[str] = GREETING) -> Tuple[float, float]:
+        """(length, width) of the user's conversation, starting it (with the greeting) if it is new."""
+        with self._lock:
+            row = self.conn.execute("SELECT length, width FROM chat_users WHERE user_id = ?", (user_id,)).fetchone()
+            if row is not None:
+                return row[0], row[1]
+            now = time.time()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                inserted = self.conn.execute(
+                    "INSERT OR IGNORE INTO chat_users (user_id, length, width, created_at) VALUES (?, ?, ?, ?)",
+                    (user_id, *DEFAULT_DIMENSIONS, now),
+                ).rowcount
+                if inserted and greeting is not None:
+                    self._insert(user_id, [("assistant", greeting)], now)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return DEFAULT_DIMENSIONS
+
+    def set_dimensions(self, user_id: str, length: float, width: float) -> None:
+        with self._lock:
+            self._set_dimensions(user_id, length, width)
+
+    def _set_dimensions(self, user_id: str, length: float, width: float) -> None:
+        self.conn.execute(
+            "UPDATE chat_users SET length = ?, width = ? WHERE user_id = ? AND (length != ? OR width != ?)",
+            (length, width, user_id, length, width),
+        )
+
+    # --------------------------------------------------------- messages
+
+    def _insert(self, user_id: str, messages: Iterable[Tuple[str, str]], now: float) -> List[int]:
+        """Insert messages after the user's last one (inside a transaction); returns their seqs."""
+        last = self.conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM chat_messages WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+        rows = [(user_id, last + offset, role, content, now) for offset, (role, content) in enumerate(messages, 1)]
+        self.conn.executemany(
+            "INSERT INTO chat_messages (user_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        return [row[1] for row in rows]
+
+    def append_turn(self, user_id: str, messages: List[Tuple[str, str]],
+                    length: Optional[float] = None, width: Optional[float] = None) -> List[int]:
+        """
+        Store one turn: its new (role, content) messages, and the dimensions
+        if given, in one transaction. Returns the messages' seqs.
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                seqs = self._insert(user_id, messages, time.time())
+                if length is not None and width is not None:
+                    self._set_dimensions(user_id, length, width)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return seqs
+
+    def recent(self, user_id: str, limit: int = 50, before_seq: Optional[int] = None) -> List[Message]:
+        """Up to `limit` messages, newest first, optionally only those before `before_seq`."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT seq, role, content FROM chat_messages WHERE user_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (user_id, before_seq if before_seq is not None else sys.maxsize, limit),
+            ).fetchall()
+        return [_message(row) for row in rows]
+
+
+def migrate_chat_history(conn: sqlite3.Connection) -> int:
+    """
+    Move every `chat_history` row into chat_users / chat_messages and drop
+    chat_history, all in one transaction. Users already present in
+    chat_users keep their rows. Returns the number of users converted.
+    """
+    if "chat_history" not in table_names(conn):
+        return 0
+    converted = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Checked again under the write lock: another process may have migrated meanwhile
+        if "chat_history" in table_names(conn):
+            converted = _convert_chat_history(conn)
+            conn.execute("DROP TABLE chat_history")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return converted
+
+
+def _convert_chat_history(conn: sqlite3.Connection) -> int:
+    converted = 0
+    now = time.time()
+    cursor = conn.execute("SELECT user_id, messages, length, width FROM chat_history")
+    while True:
+        rows = cursor.fetchmany(500)
+        if not rows:
+            return converted
+        for user_id, messages, length, width in rows:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO chat_users (user_id, length, width, created_at) VALUES (?, ?, ?, ?)",
+                (
+                    user_id,
+                    length if length is not None else DEFAULT_DIMENSIONS[0],
+                    width if width is not None else DEFAULT_DIMENSIONS[1],
+                    now,
+                ),
+            ).rowcount
+            if not inserted:
+                continue
+            try:
+                history = json.loads(messages or "[]")
+            except json.JSONDecodeError:
+                history = []
+            conn.executemany(
+                "INSERT INTO chat_messages (user_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (user_id, seq, str(message.get("role", "")), str(message.get("content", "")), now)
+                    for seq, message in enumerate((m for m in history if isinstance(m, dict)), 1)
+                ],
+            )
+            converted += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UI chat storage.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--migrate", action="store_true", help="Convert chat_history rows to chat_messages")
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        parser.error(f"No such database: {args.db}")
+    conn = connect(args.db)
+    try:
+        for statement in SCHEMA:
+            conn.execute(statement)
+        if args.migrate:
+            print(f"Converted {migrate_chat_history(conn)} chat_history rows")
+        users, messages = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM chat_users), (SELECT COUNT(*) FROM chat_messages)"
+        ).fetchone()
+        print(f"{args.db}: {users} users, {messages} messages")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
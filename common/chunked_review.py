@@ -0,0 +1,302 @@
+"""
+Review stage that reviews large code chunk by chunk, in parallel.
+
+One prompt holding a 2,000-line `generated_code` is slow and close to the
+context limit. `ChunkedReviewAgent` splits the code along its AST into
+function- and class-level chunks (small neighbours are grouped, oversized
+classes are split per method), reviews the chunks concurrently, and merges
+the comments into `review_comments`, grouped per chunk with line ranges, so
+the refactorer knows where each comment applies. A comment made about
+several chunks is listed once. The stage then takes about as long as its
+largest chunk instead of the whole file.
+
+Each chunk is reviewed by the chunk-reviewer agent in a private copy of the
+session holding only the user's message plus `review_chunk`,
+`review_chunk_name`, `review_outline` (imports and top-level signatures of
+the whole file) and `review_chunk_findings` (the static-analysis findings
+for its lines). With the stage cache, unchanged chunks are not reviewed
+twice. Code shorter than `min_chunked_lines` goes to the whole-file reviewer.
+"""
+from __future__ import annotations
+
+import ast
+import asyncio
+import logging
+import re
+from typing import AsyncGenerator, Dict, List
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.sessions import Session
+from google.genai import types
+from pydantic import BaseModel, Field
+
+from common.blob_store import default_blob_store
+from common.code_checks import FINDINGS_KEY, strip_code_fences
+
+logger = logging.getLogger(__name__)
+
+CHUNK_REVIEWS_KEY = "chunk_reviews"
+COMMENT_START = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+FINDING_LINE = re.compile(r"\bline (\d+)\b")
+NO_ISSUES = re.compile(r"^\W*no (?:issues|comments|changes)\b", re.IGNORECASE)
+
+
+class CodeChunk(BaseModel):
+    """A contiguous range of lines (1-based, inclusive) reviewed as one unit."""
+
+    name: str
+    start: int
+    end: int
+    text: str
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start + 1
+
+
+class ChunkReview(BaseModel):
+    chunk: str
+    start: int
+    end: int
+    comments: List[str] = Field(default_factory=list)
+
+
+def _node_start(node: ast.AST) -> int:
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno] + [d.lineno for d in decorators])
+
+
+def _units(tree: ast.Module, line_count: int, max_lines: int) -> List[tuple]:
+    """(name, start, end) for each top-level statement group, classes over max_lines split per method."""
+    units: List[tuple] = []
+    previous_end = 0
+    for node in tree.body:
+        # Comments and blank lines before a statement belong to it
+        start, end = previous_end + 1, node.end_lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if isinstance(node, ast.ClassDef) and end - start + 1 > max_lines:
+                methods = [n for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+                cursor = start
+                for index, method in enumerate(methods):
+                    if index == 0 and _node_start(method) > cursor:
+                        units.append((f"class {node.name}", cursor, _node_start(method) - 1))
+                        cursor = _node_start(method)
+                    units.append((f"{node.name}.{method.name}", cursor, method.end_lineno))
+                    cursor = method.end_lineno + 1
+                if cursor <= end:
+                    units.append((f"class {node.name}", cursor, end))
+            else:
+                units.append((node.name, start, end))
+        elif units and units[-1][0] == "module code":
+            units[-1] = ("module code", units[-1][1], end)
+        else:
+            units.append(("module code", start, end))
+        previous_end = end
+    if units and previous_end < line_count:
+        name, start, _ = units[-1]
+        units[-1] = (name, start, line_count)
+    return units
+
+
+def fence_offset(text: str) -> int:
+    """How many lines of `text` come before the code strip_code_fences returns (0 if unfenced)."""
+    stripped = text.lstrip()
+    if not stripped.startswith("```") or "\n" not in stripped:
+        return 0
+    return text[:len(text) - len(stripped)].count("\n") + 1
+
+
+def split_code(code: str, target_lines: int = 120, max_lines: int = 300, first_line: int = 1) -> List[CodeChunk]:
+    """
+    Split Python source into chunks along top-level definitions.
+
+    Consecutive definitions are grouped until a chunk would pass
+    `target_lines`; classes longer than `max_lines` are split per method.
+    Code that doesn't parse comes back as a single chunk. Chunk line
+    numbers count from `first_line`, the code's first line in the text
+    the reader sees (2 inside a fence).
+    """
+    lines = code.splitlines()
+    shift = first_line - 1
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return [CodeChunk(name="whole file", start=first_line, end=len(lines) + shift, text=code)]
+    groups: List[List[tuple]] = []
+    for unit in _units(tree, len(lines), max_lines):
+        if groups and (unit[2] - groups[-1][0][1] + 1) <= target_lines:
+            groups[-1].append(unit)
+        else:
+            groups.append([unit])
+    chunks = []
+    for group in groups:
+        names = list(dict.fromkeys(name for name, _, _ in group))
+        name = ", ".join(names[:3]) + (f" and {len(names) - 3} more" if len(names) > 3 else "")
+        start, end = group[0][1], group[-1][2]
+        chunks.append(CodeChunk(name=name, start=start + shift, end=end + shift, text="\n".join(lines[start - 1:end])))
+    return chunks
+
+
+def outline(code: str) -> str:
+    """Imports and top-level signatures, so a chunk's reviewer knows what else exists."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return ""
+    lines = code.splitlines()
+    entries = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            entries.append(ast.get_source_segment(code, node) or "")
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            entries.append(lines[node.lineno - 1].strip())
+            if isinstance(node, ast.ClassDef):
+                entries += [
+                    "    " + lines[n.lineno - 1].strip()
+                    for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))
+                ]
+    return "\n".join(entries)
+
+
+def parse_comments(text: str) -> List[str]:
+    """Split a review reply into individual comments (bullets or numbered items)."""
+    comments: List[str] = []
+    for line in text.splitlines():
+        if COMMENT_START.match(line):
+            comments.append(COMMENT_START.sub("", line).strip())
+        elif line.strip() and comments:
+            comments[-1] += " " + line.strip()
+    if not comments and text.strip():
+        comments = [text.strip()]
+    return [c for c in comments if not NO_ISSUES.match(c)]
+
+
+def _normalize(comment: str) -> str:
+    # Line references differ between chunks; the advice itself is what repeats
+    comment = re.sub(r"\blines? \d+(?:\s*[-–]\s*\d+)?", "", comment.lower())
+    return re.sub(r"[^a-z0-9]+", " ", comment).strip()
+
+
+def merge_reviews(reviews: List[ChunkReview]) -> str:
+    """Chunk-scoped review text; a comment repeated across chunks is listed once, with the chunks it applies to."""
+    seen: Dict[str, List[str]] = {}
+    for review in reviews:
+        for comment in review.comments:
+            seen.setdefault(_normalize(comment), []).append(f"{review.start}-{review.end}")
+    repeated = {key for key, chunks in seen.items() if len(set(chunks)) > 1}
+
+    sections = []
+    listed = set()
+    for review in reviews:
+        own = []
+        for comment in review.comments:
+            key = _normalize(comment)
+            if key in repeated or key in listed:
+                continue
+            listed.add(key)
+            own.append(f"- {comment}")
+        if own:
+            sections.append(f"## {review.chunk} (lines {review.start}-{review.end})\n" + "\n".join(own))
+    if repeated:
+        general = []
+        for review in reviews:
+            for comment in review.comments:
+                key = _normalize(comment)
+                if key in repeated and key not in listed:
+                    listed.add(key)
+                    general.append(f"- {comment} (lines {', '.join(dict.fromkeys(seen[key]))})")
+        sections.insert(0, "## Applies to several parts of the file\n" + "\n".join(general))
+    return "\n\n".join(sections) or "No issues found."
+
+
+class ChunkedReviewAgent(BaseAgent):
+    """Reviews large code as parallel per-chunk reviews merged into one."""
+
+    output_key: str = "review_comments"
+    code_key: str = "generated_code"
+    min_chunked_lines: int = 200
+    target_chunk_lines: int = 120
+    max_chunk_lines: int = 300
+    max_parallel: int = 8
+
+    def __init__(self, name: str, chunk_reviewer: BaseAgent, whole_reviewer: BaseAgent, **kwargs):
+        """
+        Args:
+            chunk_reviewer: LLM agent whose instruction reads {review_chunk},
+                {review_chunk_name}, {review_outline} and {review_chunk_findings?}.
+            whole_reviewer: Reviewer for code under `min_chunked_lines`; writes
+                `output_key` itself.
+            kwargs: output_key, code_key, min_chunked_lines, target_chunk_lines,
+                max_chunk_lines, max_parallel, description, callbacks.
+        """
+        super().__init__(name=name, sub_agents=[chunk_reviewer, whole_reviewer], **kwargs)
+        self._chunk_reviewer = chunk_reviewer
+        self._whole_reviewer = whole_reviewer
+
+    def _chunk_session(self, session: Session, chunk: CodeChunk, code_outline: str, findings: str,
+                       offset: int = 0) -> Session:
+        # Findings count lines of the unfenced code; chunks those of the stored text
+        chunk_findings = "\n".join(
+            FINDING_LINE.sub(lambda match: f"line {int(match.group(1)) + offset}", line)
+            for line in findings.splitlines()
+            if (match := FINDING_LINE.search(line)) and chunk.start <= int(match.group(1)) + offset <= chunk.end
+        )
+        user_events = [event for event in session.events if event.author == "user"]
+        return Session(
+            app_name=session.app_name,
+            user_id=session.user_id,
+            id=session.id,
+            state={
+                "review_chunk": chunk.text,
+                "review_chunk_name": f"{chunk.name} (lines {chunk.start}-{chunk.end})",
+                "review_outline": code_outline,
+                "review_chunk_findings": chunk_findings,
+            },
+            events=user_events[-1:],
+        )
+
+    async def _review_chunk(self, ctx: InvocationContext, chunk: CodeChunk, session: Session,
+                            slots: asyncio.Semaphore) -> ChunkReview:
+        chunk_ctx = ctx.model_copy(update={"session": session, "branch": f"{ctx.branch or self.name}.{chunk.start}"})
+        text = ""
+        async with slots:
+            async for event in self._chunk_reviewer.run_async(chunk_ctx):
+                if event.is_final_response() and event.content and event.content.parts:
+                    text = "".join(part.text or "" for part in event.content.parts)
+        return ChunkReview(chunk=chunk.name, start=chunk.start, end=chunk.end, comments=parse_comments(text))
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        stored = default_blob_store.resolve(ctx.session.state.get(self.code_key) or "")
+        code = strip_code_fences(stored)
+        # Line ranges are given in the stored (usually fenced) text, which is what the refactorer reads
+        offset = fence_offset(stored)
+        chunks = split_code(code, self.target_chunk_lines, self.max_chunk_lines, first_line=offset + 1)
+        if len(code.splitlines()) < self.min_chunked_lines or len(chunks) < 2:
+            async for event in self._whole_reviewer.run_async(ctx):
+                yield event
+            return
+
+        code_outline = outline(code)
+        findings = default_blob_store.resolve(ctx.session.state.get(FINDINGS_KEY) or "")
+        slots = asyncio.Semaphore(self.max_parallel)
+        reviews = await asyncio.gather(*(
+            self._review_chunk(ctx, chunk, self._chunk_session(ctx.session, chunk, code_outline, findings, offset), slots)
+            for chunk in chunks
+        ))
+        logger.info(
+            "Reviewed %d chunks (largest %d of %d lines)",
+            len(chunks), max(chunk.size for chunk in chunks), len(code.splitlines()),
+        )
+        merged = merge_reviews(list(reviews))
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=merged)]),
+            actions=EventActions(state_delta={
+                self.output_key: merged,
+                CHUNK_REVIEWS_KEY: [review.model_dump() for review in reviews],
+            }),
+        )
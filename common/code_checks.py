@@ -0,0 +1,361 @@
+"""
+Local checks on generated code, run before any LLM looks at it.
+
+A GPT-4o review of code that doesn't even parse is wasted, and so is the
+refactor that follows it. `CodeChecker` runs, in order of cost:
+
+1. a syntax check (ast.parse),
+2. a fast lint pass: pyflakes when it is installed, plus a few AST checks
+   of our own (bare except, mutable default arguments, `== None`); without
+   pyflakes, unused imports are found by the AST pass too,
+3. optionally, the tests contained in the code, in a separate subprocess
+   (isolated interpreter mode, temporary working directory, stripped
+   environment, CPU/memory limits, timeout). At most `test_workers` of
+   these run at once per process. This contains runaway tests, not hostile
+   ones: the code still runs as the server's user, with its file system
+   and network access.
+
+`StaticCheckAgent` wraps the writer with these checks: broken code goes back
+to the writer with the findings (up to `max_rewrites` times), and the
+findings (`static_findings`) and a verdict (`static_verdict`: "clean",
+"review" or "broken") are stored in state for the later stages.
+
+Code is "clean" when it has at most `clean_max_findings` lint findings (0 by
+default) or is trivially short; None never counts code as clean.
+`skip_if_clean` is a before-agent callback for the review and refactor
+stages that skips them for clean code, so raise the threshold with care.
+"""
+from __future__ import annotations
+
+import ast
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+import tempfile
+import warnings
+from typing import AsyncGenerator, List, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+from pydantic import BaseModel, Field
+
+from common.blob_store import default_blob_store
+
+try:
+    from pyflakes import api as pyflakes_api
+    from pyflakes import reporter as pyflakes_reporter
+except ImportError:  # optional; the built-in AST checks still run
+    pyflakes_api = None
+
+logger = logging.getLogger(__name__)
+
+# The test runs use pytest; without it, tests are skipped
+_HAS_PYTEST = importlib.util.find_spec("pytest") is not None
+
+FINDINGS_KEY = "static_findings"
+VERDICT_KEY = "static_verdict"
+WRITER_FEEDBACK_KEY = "writer_feedback"
+
+
+def strip_code_fences(text: str) -> str:
+    """The code inside a ```-fenced block, or the text itself if it isn't fenced."""
+    stripped = text.strip()
+    if not stripped.startswith("```"):
+        return text
+    body = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+    return body.rsplit("```", 1)[0]
+
+
+class CheckReport(BaseModel):
+    """Findings of one CodeChecker run."""
+
+    syntax_error: Optional[str] = None
+    lint: List[str] = Field(default_factory=list)
+    tests_passed: Optional[bool] = None  # None: no tests were run
+    test_output: str = ""
+    code_lines: int = 0
+    trivial_lines: int = 5
+    clean_max_findings: Optional[int] = 0
+
+    @property
+    def broken(self) -> bool:
+        return self.syntax_error is not None or self.tests_passed is False
+
+    @property
+    def verdict(self) -> str:
+        if self.broken:
+            return "broken"
+        if self.clean_max_findings is None:
+            return "review"
+        if len(self.lint) <= self.clean_max_findings or self.code_lines < self.trivial_lines:
+            return "clean"
+        return "review"
+
+    def summary(self) -> str:
+        """The findings as text for a prompt."""
+        if self.syntax_error:
+            return f"The code does not parse: {self.syntax_error}"
+        lines = [f"- {finding}" for finding in self.lint]
+        if self.tests_passed is not None:
+            lines.append("- Tests passed." if self.tests_passed else f"- Tests failed:\n{self.test_output}")
+        return "\n".join(lines) or "No issues found by local checks."
+
+
+class _LintVisitor(ast.NodeVisitor):
+    def __init__(self, check_imports: bool):
+        self.findings: List[str] = []
+        self.check_imports = check_imports
+        self.imported = {}
+        self.used = set()
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.imported[(alias.asname or alias.name).split(".")[0]] = node.lineno
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name != "*":
+                self.imported[alias.asname or alias.name] = node.lineno
+
+    def visit_Name(self, node):
+        self.used.add(node.id)
+
+    def visit_ExceptHandler(self, node):
+        if node.type is None:
+            self.findings.append(f"line {node.lineno}: bare 'except:' also catches KeyboardInterrupt and SystemExit")
+        self.generic_visit(node)
+
+    def _check_defaults(self, node):
+        for default in node.args.defaults + [d for d in node.args.kw_defaults if d is not None]:
+            if isinstance(default, (ast.List, ast.Dict, ast.Set)):
+                self.findings.append(f"line {node.lineno}: mutable default argument in {node.name}()")
+        self.generic_visit(node)
+
+    visit_FunctionDef = visit_AsyncFunctionDef = _check_defaults
+
+    def visit_Compare(self, node):
+        for op, right in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.Eq, ast.NotEq)) and isinstance(right, ast.Constant) and right.value is None:
+                self.findings.append(f"line {node.lineno}: comparison to None should use 'is' / 'is not'")
+        self.generic_visit(node)
+
+    def report(self) -> List[str]:
+        findings = list(self.findings)
+        if self.check_imports:
+            findings += [
+                f"line {line}: '{name}' imported but unused"
+                for name, line in self.imported.items() if name not in self.used
+            ]
+        return findings
+
+
+def _pyflakes_findings(code: str) -> List[str]:
+    class _Collect(pyflakes_reporter.Reporter):
+        def __init__(self):
+            self.messages: List[str] = []
+
+        def flake(self, message):
+            self.messages.append(f"line {message.lineno}: {message.message % message.message_args}")
+
+        def syntaxError(self, *args):  # ast.parse has already reported it
+            pass
+
+        def unexpectedError(self, *args):
+            pass
+
+    collect = _Collect()
+    pyflakes_api.check(code, "generated.py", collect)
+    return collect.messages
+
+
+# Run by the test subprocess itself: it limits its own CPU time and address
+# space, then starts pytest. (A preexec_fn would run Python between fork and
+# exec, which isn't safe in a multithreaded server.)
+# argv: cpu_seconds memory_bytes pytest-args...
+_LIMITED_PYTEST = """\
+import resource, sys
+cpu, memory = int(sys.argv[1]), int(sys.argv[2])
+resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+import pytest
+sys.exit(pytest.main(sys.argv[3:]))
+"""
+
+
+class CodeChecker:
+    """Syntax, lint and (optionally) test checks for a piece of generated Python."""
+
+    def __init__(
+        self,
+        run_tests: bool = False,
+        test_timeout: float = 10.0,
+        test_workers: Optional[int] = None,
+        test_memory_mb: int = 512,
+        trivial_lines: int = 5,
+        clean_max_findings: Optional[int] = 0,
+    ):
+        """
+        Args:
+            run_tests: Run test functions/TestCases found in the code.
+            test_timeout: Seconds before a test run is killed.
+            test_workers: Test subprocesses allowed at once (default: CPU count).
+            test_memory_mb: Address-space limit of a test subprocess.
+            trivial_lines: Code with fewer non-blank lines counts as trivial.
+            clean_max_findings: Code with at most this many lint findings is
+                "clean" and skips the LLM stages; None: never.
+        """
+        self.run_tests = run_tests
+        self.test_timeout = test_timeout
+        self.test_workers = test_workers or os.cpu_count() or 2
+        self.test_memory_mb = test_memory_mb
+        self.trivial_lines = trivial_lines
+        self.clean_max_findings = clean_max_findings
+        self._test_slots: Optional[asyncio.Semaphore] = None
+
+    def lint(self, code: str, tree: ast.AST) -> List[str]:
+        visitor = _LintVisitor(check_imports=pyflakes_api is None)
+        visitor.visit(tree)
+        findings = visitor.report()
+        if pyflakes_api is not None:
+            findings = _pyflakes_findings(code) + findings
+        return findings
+
+    async def check(self, code: str) -> CheckReport:
+        code = strip_code_fences(code)
+        report = CheckReport(
+            code_lines=sum(1 for line in code.splitlines() if line.strip() and not line.strip().startswith("#")),
+            trivial_lines=self.trivial_lines,
+            clean_max_findings=self.clean_max_findings,
+        )
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always", SyntaxWarning)
+                tree = ast.parse(code)
+                compile(tree, "generated.py", "exec")
+        except SyntaxError as e:
+            report.syntax_error = f"line {e.lineno}: {e.msg}"
+            return report
+        report.lint = [f"line {w.lineno}: {w.message}" for w in caught] + self.lint(code, tree)
+        if self.run_tests and _has_tests(tree) and _HAS_PYTEST:
+            report.tests_passed, report.test_output = await self._run_tests(code)
+        return report
+
+    async def _run_tests(self, code: str):
+        if self._test_slots is None:
+            self._test_slots = asyncio.Semaphore(self.test_workers)
+        async with self._test_slots:
+            with tempfile.TemporaryDirectory(prefix="generated-tests-") as workdir:
+                path = os.path.join(workdir, "test_generated.py")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(code)
+                pytest_args = ["-q", "-x", "-p", "no:cacheprovider", path]
+                if os.name == "posix":
+                    limits = [str(int(self.test_timeout) + 1), str(self.test_memory_mb * 1024 * 1024)]
+                    command = [sys.executable, "-I", "-c", _LIMITED_PYTEST, *limits, *pytest_args]
+                else:
+                    command = [sys.executable, "-I", "-m", "pytest", *pytest_args]
+                process = await asyncio.create_subprocess_exec(
+                    *command,
+                    cwd=workdir,
+                    env={"PATH": os.environ.get("PATH", ""), "PYTHONDONTWRITEBYTECODE": "1"},
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                )
+                try:
+                    output, _ = await asyncio.wait_for(process.communicate(), self.test_timeout)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    return False, f"Tests timed out after {self.test_timeout:.0f}s"
+        text = output.decode("utf-8", "replace")
+        # pytest exit code 5: no tests collected
+        if process.returncode == 5:
+            return None, ""
+        return process.returncode == 0, text[-2000:]
+
+
+def _has_tests(tree: ast.AST) -> bool:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            return True
+        if isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+            return True
+    return False
+
+
+class StaticCheckAgent(BaseAgent):
+    """Runs the writer, checks its code locally and sends broken code back to it."""
+
+    output_key: str = "generated_code"
+    max_rewrites: int = 1
+
+    def __init__(self, name: str, writer: BaseAgent, checker: Optional[CodeChecker] = None, **kwargs):
+        """
+        Args:
+            writer: The code-writer agent; its instruction should read the
+                optional `{writer_feedback?}` placeholder.
+            checker: Defaults to syntax and lint checks only.
+            kwargs: output_key, max_rewrites, description.
+        """
+        super().__init__(name=name, sub_agents=[writer], **kwargs)
+        self._writer = writer
+        self._checker = checker or CodeChecker()
+
+    def _event(self, ctx: InvocationContext, state_delta: dict) -> Event:
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta=state_delta),
+        )
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        for attempt in range(self.max_rewrites + 1):
+            async for event in self._writer.run_async(ctx):
+                yield event
+            code = default_blob_store.resolve(ctx.session.state.get(self.output_key) or "")
+            report = await self._checker.check(code)
+            if not report.broken or attempt == self.max_rewrites:
+                break
+            logger.info("Generated code is broken, asking the writer again: %s", report.summary())
+            yield self._event(ctx, {
+                WRITER_FEEDBACK_KEY: (
+                    "Your previous code failed these checks; write a version that fixes them:\n"
+                    + report.summary()
+                ),
+            })
+        yield self._event(ctx, {
+            FINDINGS_KEY: report.summary(),
+            VERDICT_KEY: report.verdict,
+            # Empty rather than removed: "{writer_feedback?}" renders a None as "None"
+            WRITER_FEEDBACK_KEY: "",
+        })
+
+
+def skip_if_clean(callback_context: CallbackContext) -> Optional[types.Content]:
+    """
+    BEFORE-AGENT callback for the review and refactor stages.
+
+    When the local checks judged the code clean (see `clean_max_findings`), the
+    stage is skipped: a refactorer passes `generated_code` through as its
+    output, a reviewer records that no review was needed.
+    """
+    state = callback_context.state
+    if state.get(VERDICT_KEY) != "clean":
+        return None
+    agent = callback_context._invocation_context.agent
+    output_key = getattr(agent, "output_key", None)
+    if output_key == "refactored_code":
+        state[output_key] = state.get("generated_code")
+        message = "Local checks found no issues; the generated code is final."
+    else:
+        message = "No review needed: local checks found no issues."
+        if output_key:
+            state[output_key] = message
+    return types.Content(role="model", parts=[types.Part(text=message)])
@@ -0,0 +1,170 @@
+"""
+Refactor stage that asks the model for edits instead of a whole new file.
+
+Output tokens dominate the refactor stage's latency, and a full rewrite of a
+large `generated_code` costs the same whether the review asked for one
+change or fifty. `DiffRefactorAgent` has its edit agent reply with
+SEARCH/REPLACE blocks (or a unified diff) against `generated_code`, applies
+them locally and validates the result. If the edits don't apply cleanly, or
+the patched code no longer parses, it falls back to the full-rewrite agent.
+Files shorter than `min_diff_chars` go straight to the full rewrite, which
+is just as fast for them and never has to fall back.
+
+Edit format the edit agent is asked for:
+
+    <<<<<<< SEARCH
+    exact lines of the original code
+    =======
+    replacement lines
+    >>>>>>> REPLACE
+"""
+from __future__ import annotations
+
+import ast
+import logging
+import re
+from typing import AsyncGenerator, List, Optional, Tuple
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from common.blob_store import default_blob_store
+from common.code_checks import strip_code_fences
+
+logger = logging.getLogger(__name__)
+
+EDIT_BLOCK_PATTERN = re.compile(
+    r"^<{5,9} SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} REPLACE[^\n]*$",
+    re.DOTALL | re.MULTILINE,
+)
+NO_CHANGES = "NO CHANGES"
+
+Edit = Tuple[List[str], List[str]]
+
+
+class EditError(ValueError):
+    """The model's edits can't be applied to the code."""
+
+
+def _parse_unified_diff(text: str) -> List[Edit]:
+    edits: List[Edit] = []
+    hunk: Optional[Edit] = None
+    for line in text.splitlines():
+        if line.startswith("@@"):
+            hunk = ([], [])
+            edits.append(hunk)
+        elif hunk is None or line.startswith(("---", "+++", "\\")):
+            continue
+        elif line.startswith("-"):
+            hunk[0].append(line[1:])
+        elif line.startswith("+"):
+            hunk[1].append(line[1:])
+        else:
+            # Context line; models often drop the leading space of blank ones
+            hunk[0].append(line[1:] if line.startswith(" ") else line)
+            hunk[1].append(line[1:] if line.startswith(" ") else line)
+    return edits
+
+
+def parse_edits(text: str) -> List[Edit]:
+    """Parse SEARCH/REPLACE blocks or unified-diff hunks into (old lines, new lines) pairs."""
+    text = strip_code_fences(text)
+    if text.strip() == NO_CHANGES:
+        return []
+    edits = [
+        (search.splitlines(), replace.splitlines())
+        for search, replace in EDIT_BLOCK_PATTERN.findall(text)
+    ]
+    if not edits and re.search(r"^@@", text, re.MULTILINE):
+        edits = _parse_unified_diff(text)
+    if not edits:
+        raise EditError("Response contains no edit blocks")
+    return edits
+
+
+def _find_block(lines: List[str], block: List[str]) -> int:
+    """Index where `block` starts in `lines`, ignoring trailing whitespace; it must occur once."""
+    wanted = [line.rstrip() for line in block]
+    stripped = [line.rstrip() for line in lines]
+    size = len(wanted)
+    matches = [
+        start for start in range(len(stripped) - size + 1)
+        if stripped[start:start + size] == wanted
+    ]
+    if not matches:
+        raise EditError(f"SEARCH block not found: {block[0].strip()!r}...")
+    if len(matches) > 1:
+        raise EditError(f"SEARCH block matches {len(matches)} places: {block[0].strip()!r}...")
+    return matches[0]
+
+
+def apply_edits(code: str, edits: List[Edit]) -> str:
+    """Apply edits in order; each SEARCH block must match the current code exactly once."""
+    lines = code.splitlines()
+    for search, replace in edits:
+        if not any(line.strip() for line in search):
+            raise EditError("Empty SEARCH block")
+        start = _find_block(lines, search)
+        lines[start:start + len(search)] = replace
+    patched = "\n".join(lines)
+    return patched + "\n" if code.endswith("\n") else patched
+
+
+def apply_edit_text(code: str, edit_text: str) -> str:
+    """Parse the model's edits, apply them and check the result still parses."""
+    patched = apply_edits(code, parse_edits(edit_text))
+    try:
+        ast.parse(strip_code_fences(code))
+    except SyntaxError:
+        return patched  # nothing to preserve
+    try:
+        ast.parse(strip_code_fences(patched))
+    except SyntaxError as e:
+        raise EditError(f"Patched code doesn't parse: {e}") from e
+    return patched
+
+
+class DiffRefactorAgent(BaseAgent):
+    """Refactors via an edit list applied locally, falling back to a full rewrite."""
+
+    output_key: str = "refactored_code"
+    code_key: str = "generated_code"
+    min_diff_chars: int = 2000
+
+    def __init__(self, name: str, edit_agent: BaseAgent, rewrite_agent: BaseAgent, **kwargs):
+        """
+        Args:
+            edit_agent: LLM agent that writes the edits to its own output_key.
+            rewrite_agent: LLM agent that writes the whole refactored file to
+                `output_key`; used for short files and as the fallback.
+            kwargs: output_key, code_key, min_diff_chars, description.
+        """
+        super().__init__(name=name, sub_agents=[edit_agent, rewrite_agent], **kwargs)
+        self._edit_agent = edit_agent
+        self._rewrite_agent = rewrite_agent
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        code = default_blob_store.resolve(ctx.session.state.get(self.code_key) or "")
+        if len(code) >= self.min_diff_chars:
+            async for event in self._edit_agent.run_async(ctx):
+                yield event
+            edit_text = default_blob_store.resolve(
+                ctx.session.state.get(self._edit_agent.output_key) or ""
+            )
+            try:
+                patched = apply_edit_text(code, edit_text)
+            except EditError as e:
+                logger.warning("Falling back to a full rewrite, edits didn't apply: %s", e)
+            else:
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    content=types.Content(role="model", parts=[types.Part(text=patched)]),
+                    actions=EventActions(state_delta={self.output_key: patched}),
+                )
+                return
+        async for event in self._rewrite_agent.run_async(ctx):
+            yield event
@@ -0,0 +1,48 @@
+"""
+Helpers for returning a deterministic tool's result without a second LLM turn.
+
+Normally an agent makes one model call to pick the tool and a second one to
+turn the tool's dict into prose. Agents that opt in attach
+`skip_summarization` as their `after_tool_callback`; ADK then treats the
+function-response event as the final response, and `tool_response_from_event`
+pulls the structured result back out of it. The caller reads such a response
+with `result_text`.
+"""
+from typing import Any, Dict, Optional
+
+
+def skip_summarization(tool, args, tool_context, tool_response) -> None:
+    """
+    AFTER-TOOL callback that ends the turn on the tool's own response.
+
+    Returning None keeps the tool response unchanged.
+    """
+    tool_context.actions.skip_summarization = True
+    return None
+
+
+def tool_response_from_event(event, tool_name: str) -> Optional[Dict[str, Any]]:
+    """Return the response dict of `tool_name` carried by `event`, if any."""
+    for function_response in event.get_function_responses():
+        if function_response.name == tool_name:
+            return function_response.response
+    return None
+
+
+def render_result(template: str, **values: Any) -> Optional[str]:
+    """Format the local result sentence; an empty template leaves it out."""
+    if not template:
+        return None
+    return template.format(**values)
+
+
+def result_text(response: Dict[str, Any], value_key: str, missing: str) -> str:
+    """
+    The 'result' sentence of an agent's response. Without one (the sentence
+    was left out), the value and unit; `missing` if there's no value either.
+    """
+    if response.get("result"):
+        return response["result"]
+    if response.get(value_key) is not None:
+        return f"{response[value_key]} {response.get('unit', '')}".rstrip()
+    return missing
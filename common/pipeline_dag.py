@@ -0,0 +1,238 @@
+"""
+Pipeline of agents declared as a dependency graph instead of a fixed chain.
+
+Each `Stage` wraps an agent and names the state keys it reads. A stage
+depends on whichever stages write those keys (their `output_key`); keys
+nobody in the pipeline writes are treated as inputs that are already in
+state. Every stage starts as soon as all of its dependencies are done, so
+independent stages (e.g. several reviewers of the same code) run
+concurrently and a run takes as long as its critical path rather than the
+sum of all stages.
+
+Completed stages are recorded, one checkpoint per stage, in the session
+state under `completed_stages`; a resumed run skips them. The checkpoints
+are written through a SessionUnitOfWork over the session the Runner loaded
+for the turn, so each one is a single event carrying only the keys that
+changed.
+
+    pipeline = DagPipelineAgent(
+        name="code_pipeline_agent",
+        stages=[
+            Stage(agent=code_writer_agent),
+            Stage(agent=style_reviewer_agent, needs=["generated_code"]),
+            Stage(agent=security_reviewer_agent, needs=["generated_code"]),
+            Stage(agent=refactorer_agent, needs=["generated_code", "style_review", "security_review"]),
+        ],
+    )
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from pydantic import BaseModel, ConfigDict, Field
+
+from common.unit_of_work import SessionUnitOfWork
+
+logger = logging.getLogger(__name__)
+
+COMPLETED_STAGES_KEY = "completed_stages"
+
+
+class Stage(BaseModel):
+    """One node of a pipeline: an agent and the state keys it reads."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    agent: Any
+    needs: List[str] = Field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return self.agent.name
+
+    @property
+    def output_key(self) -> Optional[str]:
+        return getattr(self.agent, "output_key", None)
+
+
+class PipelineDAG:
+    """Dependency graph of stages, with a scheduler that runs ready stages concurrently."""
+
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages: List[Stage] = list(stages)
+        self.by_name: Dict[str, Stage] = {}
+        producers: Dict[str, str] = {}
+        for stage in self.stages:
+            if stage.name in self.by_name:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            self.by_name[stage.name] = stage
+            if stage.output_key:
+                if stage.output_key in producers:
+                    raise ValueError(
+                        f"Stages {producers[stage.output_key]} and {stage.name} both write {stage.output_key}"
+                    )
+                producers[stage.output_key] = stage.name
+        self.dependencies: Dict[str, Set[str]] = {
+            stage.name: {producers[key] for key in stage.needs if key in producers}
+            for stage in self.stages
+        }
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        remaining = {name: set(deps) for name, deps in self.dependencies.items()}
+        order = []
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Stages form a cycle: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+                for deps in remaining.values():
+                    deps.discard(name)
+            order.extend(ready)
+        return order
+
+    async def run(
+        self,
+        run_stage: Callable[[Stage], Awaitable[Any]],
+        completed: Iterable[str] = (),
+        on_complete: Optional[Callable[[Stage, Any], Awaitable[None]]] = None,
+    ) -> Dict[str, float]:
+        """
+        Run every stage not in `completed`, each as soon as its dependencies are done.
+
+        Args:
+            run_stage: Coroutine function that runs one stage and returns its result.
+            completed: Names of stages finished in an earlier run.
+            on_complete: Awaited with (stage, result) when a stage finishes, before
+                any stage depending on it starts; use it to checkpoint.
+
+        Returns:
+            Seconds each stage that ran took, by stage name.
+
+        If a stage fails, stages still running are cancelled once the stages that
+        finished alongside it have been recorded, and the error is raised.
+        """
+        done = set(completed)
+        pending = [name for name in self.order if name not in done]
+        running: Dict[asyncio.Task, Tuple[Stage, float]] = {}
+        durations: Dict[str, float] = {}
+        error: Optional[BaseException] = None
+        try:
+            while pending or running:
+                if error is None:
+                    for name in [n for n in pending if self.dependencies[n] <= done]:
+                        pending.remove(name)
+                        stage = self.by_name[name]
+                        running[asyncio.create_task(run_stage(stage))] = (stage, time.perf_counter())
+                if not running:
+                    break
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    stage, started = running.pop(task)
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    durations[stage.name] = time.perf_counter() - started
+                    if on_complete is not None:
+                        await on_complete(stage, task.result())
+                    done.add(stage.name)
+                if error is not None:
+                    break
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+        if error is not None:
+            raise error
+        return durations
+
+    def critical_path(self, durations: Dict[str, float]) -> Tuple[float, List[str]]:
+        """Longest chain of dependent stages by duration; stages missing from `durations` count as 0."""
+        finish: Dict[str, Tuple[float, List[str]]] = {}
+        for name in self.order:
+            before = max((finish[dep] for dep in self.dependencies[name]), default=(0.0, []))
+            finish[name] = (before[0] + durations.get(name, 0.0), before[1] + [name])
+        return max(finish.values(), default=(0.0, []))
+
+    def log_timings(self, durations: Dict[str, float], wall_time: float) -> None:
+        length, path = self.critical_path(durations)
+        logger.info(
+            "Pipeline ran %d stages in %.2fs: critical path %.2fs (%s), stages summed %.2fs",
+            len(durations), wall_time, length, " → ".join(path), sum(durations.values()),
+        )
+
+
+class DagPipelineAgent(BaseAgent):
+    """Runs its sub-agents as a PipelineDAG, checkpointing each stage in session state."""
+
+    def __init__(self, name: str, stages: List[Stage], description: str = ""):
+        super().__init__(name=name, description=description, sub_agents=[stage.agent for stage in stages])
+        self._dag = PipelineDAG(stages)
+
+    @property
+    def dag(self) -> PipelineDAG:
+        return self._dag
+
+    def unit_of_work(self, ctx: InvocationContext) -> SessionUnitOfWork:
+        """The turn's session, already loaded by the Runner, as a unit of work authored by this agent."""
+        return SessionUnitOfWork(ctx.session_service, ctx.session, author=self.name)
+
+    def _stage_checkpoint(self, uow: SessionUnitOfWork, completed: List[str]) -> None:
+        all_done = len(completed) == len(self._dag.stages)
+        uow.update({
+            COMPLETED_STAGES_KEY: list(completed),
+            "workflow_checkpoint": "complete" if all_done else "in_progress",
+        })
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        uow = self.unit_of_work(ctx)
+        completed = [
+            name for name in uow.get(COMPLETED_STAGES_KEY) or []
+            if name in self._dag.by_name
+        ]
+        if len(completed) == len(self._dag.stages):
+            # The previous run finished; this is a new one
+            completed = []
+        # (event, processed) pairs; a stage doesn't go on until the Runner has
+        # appended its event, so the next stage sees the state it wrote
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def emit(event: Event) -> None:
+            processed = asyncio.Event()
+            await events.put((event, processed))
+            await processed.wait()
+
+        async def run_stage(stage: Stage) -> None:
+            # Separate branches keep concurrent stages out of each other's history
+            stage_ctx = ctx.model_copy(update={
+                "branch": f"{ctx.branch or self.name}.{stage.name}",
+            })
+            async for event in stage.agent.run_async(stage_ctx):
+                await emit(event)
+
+        async def checkpoint(stage: Stage, _result: Any) -> None:
+            completed.append(stage.name)
+            self._stage_checkpoint(uow, completed)
+            event = uow.event(invocation_id=ctx.invocation_id, branch=ctx.branch)
+            if event is not None:
+                await emit(event)
+
+        started = time.perf_counter()
+        scheduler = asyncio.create_task(self._dag.run(run_stage, completed=list(completed), on_complete=checkpoint))
+        scheduler.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (item := await events.get()) is not None:
+                event, processed = item
+                yield event
+                processed.set()
+            durations = scheduler.result()
+        finally:
+            scheduler.cancel()
+        self._dag.log_timings(durations, time.perf_counter() - started)
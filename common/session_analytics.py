@@ -0,0 +1,517 @@
+"""
+Analytics over the session databases, computed inside SQLite and cached.
+
+Questions like "messages per user" or "which agent dominates latency" used
+to mean pulling whole tables into Python. Each query in QUERIES is instead
+an aggregate that SQLite evaluates in place (with json_extract / json_each
+where the answer is inside the JSON columns), and only the aggregated rows
+leave the database.
+
+Results are cached in ./db/analytics.db, one table per query. Queries
+over the append-only events table aggregate only the rows past the rowid
+they last read and merge them into the cached rows; the others are
+recomputed, and a database whose files haven't changed isn't read at all.
+A query is rebuilt from scratch when its SQL changes or rows were deleted:
+the row count no longer matches, or the row at the last rowid read is gone
+or different (SQLite reuses rowids).
+
+All queries of one database read a single snapshot on a read-only
+connection, so they agree with each other and never block the agents.
+
+`--create-indexes` adds the covering indexes the full builds use
+(ANALYTICS_INDEXES). That takes the write lock while each index is built,
+so run it when the agents are idle. Without them every query still works,
+only the first build is slower.
+
+Usage:
+    python -m common.session_analytics                       # refresh and report every query
+    python -m common.session_analytics --query agent_latency tool_calls --limit 10
+    python -m common.session_analytics code_pipeline.db --create-indexes
+    python -m common.session_analytics --list
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.session_dbs import connect, existing_databases, table_names
+
+DEFAULT_CACHE_PATH = "./db/analytics.db"
+
+# Covering indexes for the full builds of the events queries
+ANALYTICS_INDEXES = [
+    # messages_per_user: reads (author, app_name, user_id) only
+    "CREATE INDEX IF NOT EXISTS ix_events_author_app_user ON events (author, app_name, user_id)",
+    # events_per_session: grouped in index order, no temp b-tree
+    "CREATE INDEX IF NOT EXISTS ix_events_app_session_ts ON events (app_name, session_id, timestamp)",
+    # agent_latency: events in window order, and the earlier events of an invocation
+    "CREATE INDEX IF NOT EXISTS ix_events_invocation_ts "
+    "ON events (session_id, invocation_id, timestamp, app_name, author)",
+    # tool_calls: a partial index of just the events that carry a function call,
+    # so a full build parses those instead of every event's JSON
+    "CREATE INDEX IF NOT EXISTS ix_events_function_calls ON events (app_name) "
+    "WHERE content LIKE '%\"function_call\"%'",
+]
+
+MERGES = {
+    "sum": "COALESCE({0}, 0) + COALESCE(excluded.{0}, 0)",
+    "min": "MIN(COALESCE({0}, excluded.{0}), COALESCE(excluded.{0}, {0}))",
+    "max": "MAX(COALESCE({0}, excluded.{0}), COALESCE(excluded.{0}, {0}))",
+}
+
+
+class AnalyticsQuery(BaseModel):
+    """
+    One cached aggregate.
+
+    `sql` selects the `keys` columns, then the `measures` columns, grouped by
+    the keys. It reads `{source}` and filters on `{rows}`, which a refresh
+    fills in with the table and the range of rows not aggregated yet;
+    `{older}` selects the rows aggregated before (none in a full build).
+    `build_sql`, if given, is an equivalent used for full builds instead.
+    `measures` maps each measure to how two partial results are merged:
+    "sum", "min" or "max". `report` reads the cached rows from `{cache}`.
+    """
+
+    name: str
+    description: str
+    table: str
+    keys: List[str]
+    measures: Dict[str, str]
+    sql: str
+    report: str
+    build_sql: Optional[str] = None
+    incremental: bool = True
+
+    @property
+    def cache_table(self) -> str:
+        return f"q_{self.name}"
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha1(self.model_dump_json().encode("utf-8")).hexdigest()[:16]
+
+
+QUERIES = [
+    AnalyticsQuery(
+        name="messages_per_user",
+        description="User messages per user",
+        table="events",
+        keys=["app_name", "user_id"],
+        measures={"messages": "sum"},
+        sql="""
+            SELECT app_name, user_id, COUNT(*) AS messages
+            FROM {source} WHERE author = 'user' AND {rows}
+            GROUP BY app_name, user_id
+        """,
+        report="SELECT db, app_name, user_id, messages FROM {cache} ORDER BY messages DESC",
+    ),
+    AnalyticsQuery(
+        name="events_per_session",
+        description="Events and duration per session, by app",
+        table="events",
+        keys=["app_name", "session_id"],
+        measures={"events": "sum", "first_event": "min", "last_event": "max"},
+        sql="""
+            SELECT app_name, session_id, COUNT(*) AS events,
+                   MIN(timestamp) AS first_event, MAX(timestamp) AS last_event
+            FROM {source} WHERE {rows}
+            GROUP BY app_name, session_id
+        """,
+        report="""
+            SELECT db, app_name, COUNT(*) AS sessions, SUM(events) AS events,
+                   ROUND(AVG(events), 1) AS avg_events, MAX(events) AS max_events,
+                   ROUND(AVG((julianday(last_event) - julianday(first_event)) * 1440), 1) AS avg_minutes
+            FROM {cache} GROUP BY db, app_name ORDER BY events DESC
+        """,
+    ),
+    AnalyticsQuery(
+        # An agent's time is the gap between its event and the event before
+        # it in the same invocation, i.e. how long the user waited for it.
+        # The window runs over the new rows plus the already aggregated
+        # rows of the invocations they belong to; only new rows are counted.
+        name="agent_latency",
+        description="Time spent per agent (gap to the previous event of the invocation)",
+        table="events",
+        keys=["app_name", "author"],
+        measures={"responses": "sum", "total_seconds": "sum", "max_seconds": "max"},
+        sql="""
+            WITH fresh AS MATERIALIZED (
+                SELECT app_name, author, session_id, invocation_id, timestamp
+                FROM {source} WHERE {rows}
+            ), ordered AS (
+                SELECT app_name, author, timestamp, is_new,
+                       LAG(timestamp) OVER (PARTITION BY session_id, invocation_id ORDER BY timestamp) AS previous
+                FROM (
+                    SELECT *, 1 AS is_new FROM fresh
+                    UNION ALL
+                    SELECT app_name, author, session_id, invocation_id, timestamp, 0 FROM events
+                    WHERE {older} AND (session_id, invocation_id) IN (SELECT session_id, invocation_id FROM fresh)
+                )
+            ), gaps AS (
+                SELECT app_name, author, (julianday(timestamp) - julianday(previous)) * 86400 AS seconds
+                FROM ordered WHERE is_new AND author != 'user'
+            )
+            SELECT app_name, author, COUNT(*) AS responses,
+                   SUM(seconds) AS total_seconds, MAX(seconds) AS max_seconds
+            FROM gaps WHERE seconds IS NOT NULL
+            GROUP BY app_name, author
+        """,
+        # One ordered pass over ix_events_invocation_ts, no sort
+        build_sql="""
+            SELECT app_name, author, COUNT(*) AS responses,
+                   SUM(seconds) AS total_seconds, MAX(seconds) AS max_seconds
+            FROM (
+                SELECT app_name, author, (julianday(timestamp) - julianday(
+                           LAG(timestamp) OVER (PARTITION BY session_id, invocation_id ORDER BY timestamp)
+                       )) * 86400 AS seconds
+                FROM events
+            )
+            WHERE author != 'user' AND seconds IS NOT NULL
+            GROUP BY app_name, author
+        """,
+        report="""
+            SELECT db, app_name, author, responses,
+                   ROUND(total_seconds, 1) AS total_seconds,
+                   ROUND(total_seconds / responses, 2) AS avg_seconds,
+                   ROUND(max_seconds, 1) AS max_seconds,
+                   ROUND(100 * total_seconds / SUM(total_seconds) OVER (PARTITION BY db, app_name), 1) AS pct_of_app
+            FROM {cache} ORDER BY total_seconds DESC
+        """,
+    ),
+    AnalyticsQuery(
+        # The LIKE skips parsing events that can't contain a call
+        name="tool_calls",
+        description="Function calls per tool",
+        table="events",
+        keys=["app_name", "tool"],
+        measures={"calls": "sum"},
+        sql="""
+            SELECT events.app_name, json_extract(part.value, '$.function_call.name') AS tool, COUNT(*) AS calls
+            FROM {source}, json_each(events.content, '$.parts') AS part
+            WHERE {rows} AND events.content LIKE '%"function_call"%' AND json_valid(events.content)
+              AND tool IS NOT NULL
+            GROUP BY events.app_name, tool
+        """,
+        report="SELECT db, app_name, tool, calls FROM {cache} ORDER BY calls DESC",
+    ),
+    AnalyticsQuery(
+        name="ui_messages_per_user",
+        description="Streamlit UI chat messages per user",
+        table="chat_messages",
+        keys=["user_id", "role"],
+        measures={"messages": "sum"},
+        sql="""
+            SELECT user_id, role, COUNT(*) AS messages
+            FROM {source} WHERE {rows}
+            GROUP BY user_id, role
+        """,
+        report="""
+            SELECT db, user_id, SUM(messages) AS messages,
+                   SUM(CASE WHEN role = 'user' THEN messages ELSE 0 END) AS from_user
+            FROM {cache} GROUP BY db, user_id ORDER BY messages DESC
+        """,
+    ),
+]
+
+QUERIES_BY_NAME = {query.name: query for query in QUERIES}
+
+
+class RefreshResult(BaseModel):
+    """What refreshing one query on one database did."""
+
+    db_path: str
+    query: str
+    mode: str  # "unchanged", "incremental" or "rebuilt"
+    rows_read: int
+    seconds: float
+
+
+def ensure_analytics_indexes(db_path: str) -> List[str]:
+    """Create ANALYTICS_INDEXES where their table exists; returns the statements run."""
+    conn = connect(db_path)
+    try:
+        present = set(table_names(conn))
+        statements = [sql for sql in ANALYTICS_INDEXES if sql.split(" ON ")[1].split(" ")[0] in present]
+        for sql in statements:
+            conn.execute(sql)
+        return statements
+    finally:
+        conn.close()
+
+
+def _row_digest(conn, table: str, rowid: int) -> Optional[str]:
+    """Digest of one row's content, or None if there is no such row."""
+    row = conn.execute(f'SELECT * FROM "{table}" WHERE rowid = ?', (rowid,)).fetchone()
+    return None if row is None else hashlib.sha1(repr(row).encode("utf-8")).hexdigest()
+
+
+def _file_fingerprint(db_path: str) -> str:
+    """Changes whenever the database is written: size and mtime of the file and its WAL."""
+    parts = []
+    for path in (db_path, db_path + "-wal"):
+        # Opening a WAL database creates an empty -wal file, which holds no writes
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            stat = os.stat(path)
+            parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return "/".join(parts)
+
+
+class SessionAnalytics:
+    """Runs QUERIES against session databases and keeps their results in a cache database."""
+
+    def __init__(self, cache_path: str = DEFAULT_CACHE_PATH, queries: Optional[List[AnalyticsQuery]] = None):
+        self.queries = list(queries or QUERIES)
+        directory = os.path.dirname(os.path.abspath(cache_path))
+        os.makedirs(directory, exist_ok=True)
+        self.cache = connect(cache_path)
+        self.cache.execute("PRAGMA journal_mode=WAL")
+        self.cache.execute(
+            "CREATE TABLE IF NOT EXISTS analytics_queries (name TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)"
+        )
+        # after: last rowid aggregated; after_digest: that row's content, to notice
+        # its rowid being reused; rows: source rows the cached result covers
+        columns = [row[1] for row in self.cache.execute("PRAGMA table_info(analytics_state)")]
+        if columns and "after_digest" not in columns:
+            # Written by an older version: forget it, so every query is rebuilt once
+            self.cache.execute("DROP TABLE analytics_state")
+        self.cache.execute(
+            """
+            CREATE TABLE IF NOT EXISTS analytics_state (
+                db TEXT NOT NULL, query TEXT NOT NULL, after INTEGER NOT NULL, after_digest TEXT,
+                rows INTEGER NOT NULL, files TEXT NOT NULL, refreshed_at REAL NOT NULL,
+                PRIMARY KEY (db, query)
+            )
+            """
+        )
+        for query in self.queries:
+            self._ensure_cache_table(query)
+
+    def close(self) -> None:
+        self.cache.close()
+
+    def _ensure_cache_table(self, query: AnalyticsQuery) -> None:
+        """Create the query's cache table, or start it over if the query definition changed."""
+        row = self.cache.execute("SELECT fingerprint FROM analytics_queries WHERE name = ?", (query.name,)).fetchone()
+        if row is not None and row[0] == query.fingerprint:
+            return
+        columns = ", ".join(f'"{column}"' for column in ["db", *query.keys])
+        measures = ", ".join(f'"{measure}"' for measure in query.measures)
+        self.cache.execute("BEGIN IMMEDIATE")
+        try:
+            self.cache.execute(f'DROP TABLE IF EXISTS "{query.cache_table}"')
+            self.cache.execute(f'CREATE TABLE "{query.cache_table}" ({columns}, {measures}, PRIMARY KEY ({columns}))')
+            self.cache.execute("DELETE FROM analytics_state WHERE query = ?", (query.name,))
+            self.cache.execute(
+                "INSERT OR REPLACE INTO analytics_queries (name, fingerprint) VALUES (?, ?)",
+                (query.name, query.fingerprint),
+            )
+            self.cache.execute("COMMIT")
+        except BaseException:
+            self.cache.execute("ROLLBACK")
+            raise
+
+    def _select(self, names: Optional[List[str]]) -> List[AnalyticsQuery]:
+        if names is None:
+            return self.queries
+        unknown = [name for name in names if name not in {query.name for query in self.queries}]
+        if unknown:
+            raise KeyError(f"Unknown analytics queries: {', '.join(unknown)}")
+        return [query for query in self.queries if query.name in names]
+
+    # -------------------------------------------------------------- refresh
+
+    def refresh(self, db_paths: List[str], names: Optional[List[str]] = None,
+                rebuild: bool = False) -> List[RefreshResult]:
+        """Bring the cached results of the given queries up to date with every database."""
+        results = []
+        queries = self._select(names)
+        for db_path in db_paths:
+            if os.path.exists(db_path):
+                results += self._refresh_database(db_path, queries, rebuild)
+        return results
+
+    def _refresh_database(self, db_path: str, queries: List[AnalyticsQuery], rebuild: bool) -> List[RefreshResult]:
+        db = os.path.abspath(db_path)
+        files = _file_fingerprint(db_path)
+        conn = connect(db_path, readonly=True)
+        results = []
+        try:
+            # One read transaction: every query sees the same snapshot
+            conn.execute("BEGIN")
+            present = set(table_names(conn))
+            totals: Dict[str, Tuple[int, int, Optional[str]]] = {}
+            for query in queries:
+                if query.table not in present:
+                    continue
+                began = time.perf_counter()
+                state = self.cache.execute(
+                    "SELECT after, after_digest, rows, files FROM analytics_state WHERE db = ? AND query = ?",
+                    (db, query.name),
+                ).fetchone()
+                if state is not None and state[3] == files and not rebuild:
+                    results.append(RefreshResult(
+                        db_path=db_path, query=query.name, mode="unchanged", rows_read=0,
+                        seconds=time.perf_counter() - began,
+                    ))
+                    continue
+                if query.table not in totals:
+                    count, last = conn.execute(
+                        f'SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM "{query.table}"'
+                    ).fetchone()
+                    totals[query.table] = (count, last, _row_digest(conn, query.table, last))
+                total_rows, max_rowid, max_digest = totals[query.table]
+
+                after = 0
+                # The row read last is still there unchanged, so no rowid up to it was reused
+                if (query.incremental and state is not None and not rebuild and state[0] > 0
+                        and _row_digest(conn, query.table, state[0]) == state[1]):
+                    new_rows = conn.execute(
+                        f'SELECT COUNT(*) FROM "{query.table}" WHERE rowid > ?', (state[0],)
+                    ).fetchone()[0]
+                    # Fewer rows than the cache covers plus the new ones: some were deleted
+                    if total_rows - new_rows == state[2]:
+                        after = state[0]
+                incremental = after > 0
+                if incremental:
+                    # NOT INDEXED: read the new rows by rowid, not through an index over all of them
+                    source, rows = f'"{query.table}" NOT INDEXED', f'"{query.table}".rowid > :after'
+                    older = f'"{query.table}".rowid <= :after'
+                else:
+                    source, rows, older, new_rows = f'"{query.table}"', "1", "0", total_rows
+                sql = (query.sql if incremental else query.build_sql or query.sql).format(
+                    source=source, rows=rows, older=older,
+                )
+                partials = conn.execute(sql, {"after": after}).fetchall()
+                self._merge(db, query, partials, replace=not incremental)
+                self.cache.execute(
+                    "INSERT OR REPLACE INTO analytics_state"
+                    " (db, query, after, after_digest, rows, files, refreshed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        db, query.name, max_rowid if query.incremental else 0,
+                        max_digest if query.incremental else None, total_rows, files, time.time(),
+                    ),
+                )
+                results.append(RefreshResult(
+                    db_path=db_path, query=query.name, mode="incremental" if incremental else "rebuilt",
+                    rows_read=new_rows, seconds=time.perf_counter() - began,
+                ))
+        finally:
+            conn.close()
+        return results
+
+    def _merge(self, db: str, query: AnalyticsQuery, partials: List[Tuple], replace: bool) -> None:
+        """Fold partial aggregates into the cache table, or replace the database's rows with them."""
+        columns = ["db", *query.keys, *query.measures]
+        names = ", ".join(f'"{column}"' for column in columns)
+        conflict = ", ".join(f'"{column}"' for column in ["db", *query.keys])
+        updates = ", ".join(
+            f'"{measure}" = ' + MERGES[merge].format(f'"{measure}"') for measure, merge in query.measures.items()
+        )
+        self.cache.execute("BEGIN IMMEDIATE")
+        try:
+            if replace:
+                self.cache.execute(f'DELETE FROM "{query.cache_table}" WHERE db = ?', (db,))
+            self.cache.executemany(
+                f'INSERT INTO "{query.cache_table}" ({names}) VALUES ({", ".join("?" * len(columns))})'
+                f" ON CONFLICT ({conflict}) DO UPDATE SET {updates}",
+                [(db, *row) for row in partials],
+            )
+            self.cache.execute("COMMIT")
+        except BaseException:
+            self.cache.execute("ROLLBACK")
+            raise
+
+    # --------------------------------------------------------------- report
+
+    def report(self, name: str, db_paths: Optional[List[str]] = None,
+               limit: Optional[int] = None) -> Tuple[List[str], List[Tuple]]:
+        """(columns, rows) of a query's report over the cached results, optionally for some databases only."""
+        query = self._select([name])[0]
+        cache = f'"{query.cache_table}"'
+        params: List[Any] = []
+        if db_paths is not None:
+            dbs = [os.path.abspath(path) for path in db_paths]
+            cache = f"(SELECT * FROM {cache} WHERE db IN ({', '.join('?' * len(dbs))}))"
+            params += dbs
+        sql = query.report.format(cache=cache)
+        if limit is not None:
+            sql = f"SELECT * FROM ({sql}) LIMIT ?"
+            params.append(limit)
+        cursor = self.cache.execute(sql, params)
+        columns = [description[0] for description in cursor.description]
+        rows = [(os.path.relpath(row[0]), *row[1:]) if columns[0] == "db" else row for row in cursor.fetchall()]
+        return columns, rows
+
+
+def format_table(columns: List[str], rows: List[Tuple]) -> str:
+    cells = [columns] + [["" if value is None else str(value) for value in row] for row in rows]
+    widths = [max(len(row[index]) for row in cells) for index in range(len(columns))]
+    return "\n".join("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session analytics computed in SQLite, cached and refreshed incrementally.")
+    parser.add_argument("databases", nargs="*", help="Databases (default: all known session DBs)")
+    parser.add_argument("--query", nargs="+", help="Only these queries (default: all)")
+    parser.add_argument("--list", action="store_true", help="List the available queries")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="Cache database")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute from scratch instead of incrementally")
+    parser.add_argument("--no-refresh", action="store_true", help="Report what is cached without reading the databases")
+    parser.add_argument("--create-indexes", action="store_true", help="Create the indexes the full builds use (takes the write lock)")
+    parser.add_argument("--limit", type=int, default=20, help="Rows per report")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text")
+    args = parser.parse_args()
+
+    if args.list:
+        for query in QUERIES:
+            print(f"{query.name:<22} {query.table:<13} {query.description}")
+        return
+    unknown = [name for name in args.query or [] if name not in QUERIES_BY_NAME]
+    if unknown:
+        parser.error(f"Unknown queries: {', '.join(unknown)} (see --list)")
+    db_paths = args.databases or existing_databases()
+    missing = [path for path in db_paths if not os.path.exists(path)]
+    if missing:
+        parser.error(f"No such database: {', '.join(missing)}")
+
+    if args.create_indexes:
+        for db_path in db_paths:
+            began = time.perf_counter()
+            created = ensure_analytics_indexes(db_path)
+            print(f"{db_path}: {len(created)} indexes ensured in {time.perf_counter() - began:.1f}s", file=sys.stderr)
+
+    analytics = SessionAnalytics(args.cache)
+    try:
+        if not args.no_refresh:
+            began = time.perf_counter()
+            results = analytics.refresh(db_paths, args.query, args.rebuild)
+            modes = {mode: sum(r.mode == mode for r in results) for mode in ("rebuilt", "incremental", "unchanged")}
+            print(
+                f"-- refreshed in {time.perf_counter() - began:.2f}s: "
+                + ", ".join(f"{count} {mode}" for mode, count in modes.items() if count)
+                + f"; {sum(r.rows_read for r in results)} rows read",
+                file=sys.stderr,
+            )
+        for name in args.query or [query.name for query in QUERIES]:
+            columns, rows = analytics.report(name, db_paths, args.limit)
+            if args.format == "jsonl":
+                for row in rows:
+                    print(json.dumps({"query": name, **dict(zip(columns, row))}, default=str))
+            else:
+                print(f"== {name}: {QUERIES_BY_NAME[name].description}")
+                print(format_table(columns, rows) if rows else "(no data)")
+                print()
+    finally:
+        analytics.close()
+
+
+if __name__ == "__main__":
+    main()
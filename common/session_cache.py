@@ -0,0 +1,322 @@
+"""
+Write-behind, in-memory session cache for DatabaseSessionService.
+
+Every ADK event append is its own committed SQLite transaction, and every
+get_session re-reads all of a session's events. `WriteBehindSessionService`
+serves hot sessions from an LRU in memory and queues appends; a background
+thread writes the queue as one transaction every `flush_interval` seconds
+(or once `max_batch` events wait). Events that touch `durable_keys` (the
+pipeline checkpoint) are written, fsynced, before append_event returns.
+Pending events are flushed on close() and at interpreter exit. A batch that
+keeps failing is retried `max_flush_retries` times, then written session by
+session, and the sessions that still fail are dead-lettered.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import weakref
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, DatabaseSessionService, Session
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListEventsResponse,
+    ListSessionsResponse,
+)
+from sqlalchemy.orm import sessionmaker
+
+from common.adk_storage import (
+    SessionKey,
+    StorageAppState,
+    StorageSession,
+    StorageUserState,
+    split_state_delta,
+    storage_event,
+)
+from common.session_store import create_tuned_engine
+
+logger = logging.getLogger(__name__)
+
+# Services not closed yet; the set doesn't keep closed ones alive
+_open_services: "weakref.WeakSet[WriteBehindSessionService]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_services() -> None:
+    for service in list(_open_services):
+        service.close()
+
+
+def _key(session: Session) -> SessionKey:
+    return (session.app_name, session.user_id, session.id)
+
+
+class WriteBehindSessionService(BaseSessionService):
+    """Serves sessions from memory and persists appended events in batches."""
+
+    def __init__(
+        self,
+        backend: DatabaseSessionService,
+        *,
+        flush_interval: float = 0.05,
+        max_batch: int = 256,
+        max_cached_sessions: int = 1024,
+        durable_keys: Iterable[str] = ("workflow_checkpoint",),
+        max_flush_retries: int = 5,
+        max_dead_letters: int = 1000,
+    ):
+        self._backend = backend
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._max_cached_sessions = max_cached_sessions
+        self._durable_keys = frozenset(durable_keys)
+
+        self._sessions: OrderedDict[SessionKey, Session] = OrderedDict()
+        self._pending: List[Tuple[SessionKey, Event]] = []
+        self._lock = threading.RLock()
+        # Only one flush at a time, so batches reach the database in order
+        self._flush_lock = threading.Lock()
+        self._max_flush_retries = max_flush_retries
+        # Consecutive failed flushes of the batch at the front of the queue
+        self._flush_failures = 0
+        # (key, event, error) of events given up on, newest last
+        self.dead_letters: deque = deque(maxlen=max_dead_letters)
+
+        self._batched_factory = backend.DatabaseSessionFactory
+        db_url = backend.db_engine.url.render_as_string(hide_password=False)
+        if db_url.startswith("sqlite"):
+            self._durable_engine = create_tuned_engine(
+                db_url, pool_size=1, max_overflow=1, pragmas={"synchronous": "FULL"}
+            )
+            self._durable_factory = sessionmaker(bind=self._durable_engine)
+        else:
+            self._durable_engine = None
+            self._durable_factory = self._batched_factory
+
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="session-write-behind", daemon=True
+        )
+        self._flusher.start()
+        _open_services.add(self)
+
+    @property
+    def backend(self) -> DatabaseSessionService:
+        """The wrapped session service."""
+        return self._backend
+
+    # ------------------------------------------------------------------ cache
+
+    def _remember(self, session: Session) -> None:
+        with self._lock:
+            self._sessions[_key(session)] = session
+            self._sessions.move_to_end(_key(session))
+            while len(self._sessions) > self._max_cached_sessions:
+                self._sessions.popitem(last=False)
+
+    @staticmethod
+    def _copy(session: Session) -> Session:
+        # Callers may mutate what they get back; keep the cached copy intact
+        return session.model_copy(
+            update={"state": dict(session.state), "events": list(session.events)}
+        )
+
+    def _has_pending(self, key: SessionKey) -> bool:
+        with self._lock:
+            return any(pending_key == key for pending_key, _ in self._pending)
+
+    # -------------------------------------------------------------- sessions
+
+    def create_session(self, **kwargs: Any) -> Session:
+        session = self._backend.create_session(**kwargs)
+        self._remember(session)
+        return self._copy(session)
+
+    def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        if config is None:
+            with self._lock:
+                cached = self._sessions.get(key)
+                if cached is not None:
+                    self._sessions.move_to_end(key)
+                    return self._copy(cached)
+        if self._has_pending(key):
+            # Filtered reads and cache misses (an evicted session) go to the
+            # database, which must have this session's queued events first
+            self.flush()
+
+        session = self._backend.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        if session is not None and config is None:
+            self._remember(session)
+            return self._copy(session)
+        return session
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        self.flush()
+        return self._backend.list_sessions(app_name=app_name, user_id=user_id)
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        with self._lock:
+            self._sessions.pop(key, None)
+            self._pending = [item for item in self._pending if item[0] != key]
+        self._backend.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        self.flush()
+        return self._backend.list_events(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+
+    def close_session(self, *, session: Session):
+        self._backend.close_session(session=session)
+
+    # ---------------------------------------------------------------- events
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        key = _key(session)
+        super().append_event(session=session, event=event)
+        with self._lock:
+            cached = self._sessions.get(key)
+            if cached is not None and cached is not session:
+                super().append_event(session=cached, event=event)
+            self._pending.append((key, event))
+            backlog = len(self._pending)
+
+        state_delta = event.actions.state_delta if event.actions else None
+        if state_delta and self._durable_keys.intersection(state_delta):
+            self.flush(durable=True)
+        elif backlog >= self._max_batch:
+            self._wakeup.set()
+        return event
+
+    def flush(self, durable: bool = False) -> None:
+        """
+        Write every queued event now, in one transaction.
+
+        Args:
+            durable: Commit through the synchronous=FULL connection so the
+                batch is fsynced before returning.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            factory = self._durable_factory if durable else self._batched_factory
+            try:
+                update_times = self._write_batch(factory, batch)
+                self._flush_failures = 0
+            except Exception:
+                self._flush_failures += 1
+                if self._flush_failures <= self._max_flush_retries:
+                    # Put the batch back in front so nothing is lost or reordered
+                    with self._lock:
+                        self._pending = batch + self._pending
+                    raise
+                self._flush_failures = 0
+                update_times = self._write_isolated(factory, batch)
+            with self._lock:
+                for key, update_time in update_times.items():
+                    cached = self._sessions.get(key)
+                    if cached is not None:
+                        cached.last_update_time = update_time
+
+    def _write_isolated(self, factory, batch: List[Tuple[SessionKey, Event]]) -> Dict[SessionKey, float]:
+        """Write a repeatedly failing batch one session at a time, dead-lettering the sessions that fail."""
+        events_by_session: OrderedDict[SessionKey, List[Tuple[SessionKey, Event]]] = OrderedDict()
+        for item in batch:
+            events_by_session.setdefault(item[0], []).append(item)
+        update_times = {}
+        for key, items in events_by_session.items():
+            try:
+                update_times.update(self._write_batch(factory, items))
+            except Exception as e:
+                logger.error(
+                    "Giving up on %d events of session %s after %d failed flushes: %s",
+                    len(items), key[2], self._max_flush_retries + 1, e,
+                    exc_info=True,
+                )
+                self.dead_letters.extend((key, event, e) for _, event in items)
+                with self._lock:
+                    # The cached copy has events the database never got
+                    self._sessions.pop(key, None)
+        return update_times
+
+    def _write_batch(self, factory, batch: List[Tuple[SessionKey, Event]]) -> Dict[SessionKey, float]:
+        """Apply queued events the way DatabaseSessionService.append_event does, in one commit."""
+        events_by_session: OrderedDict[SessionKey, List[Event]] = OrderedDict()
+        for key, event in batch:
+            events_by_session.setdefault(key, []).append(event)
+
+        with factory() as db:
+            touched = {}
+            for key, events in events_by_session.items():
+                app_name, user_id, session_id = key
+                storage_session = db.get(StorageSession, key)
+                if storage_session is None:
+                    logger.warning("Dropping %d events of deleted session %s", len(events), session_id)
+                    continue
+                storage_app_state = db.get(StorageAppState, (app_name))
+                if storage_app_state is None:
+                    storage_app_state = StorageAppState(app_name=app_name, state={})
+                    db.add(storage_app_state)
+                storage_user_state = db.get(StorageUserState, (app_name, user_id))
+                if storage_user_state is None:
+                    storage_user_state = StorageUserState(app_name=app_name, user_id=user_id, state={})
+                    db.add(storage_user_state)
+
+                for event in events:
+                    if event.actions and event.actions.state_delta:
+                        app_delta, user_delta, session_delta = split_state_delta(event.actions.state_delta)
+                        storage_app_state.state.update(app_delta)
+                        storage_user_state.state.update(user_delta)
+                        storage_session.state.update(session_delta)
+                    db.add(storage_event(key, event))
+                touched[key] = storage_session
+
+            db.commit()
+            update_times = {}
+            for key, storage_session in touched.items():
+                db.refresh(storage_session)
+                update_times[key] = storage_session.update_time.timestamp()
+        return update_times
+
+    # ------------------------------------------------------------- lifecycle
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed; will retry")
+
+    def close(self) -> None:
+        """Stop the background flusher and durably write whatever is pending."""
+        if self._closed:
+            return
+        self._closed = True
+        _open_services.discard(self)
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush(durable=True)
+        if self._durable_engine is not None:
+            self._durable_engine.dispose()
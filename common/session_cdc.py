@@ -0,0 +1,272 @@
+"""
+Change-data capture for the session databases: new and updated rows as JSONL.
+
+Instead of copying whole databases to find what changed, the tailer keeps
+a watermark per table per database and emits only the rows past it.
+Sessions, app_states and user_states are updated in place and tracked by
+update_time; events are tracked by their timestamp. Each poll re-reads the
+last `overlap_seconds` (`append_overlap_seconds` for events) and skips rows
+whose content it already emitted: update_time has one-second resolution,
+and an event's timestamp is when it was created, which can be a while
+before a queued or write-behind write lands. Rowids aren't used for this,
+because SQLite reuses them once the newest rows are deleted (retention,
+delete_session). Tables with neither column are tracked by rowid; if the
+row at the watermark is gone or has changed, they are read again from the
+start, with a warning.
+
+Each line is {"db", "table", "op", "rowid", "row"}. `op` is "upsert" for
+update_time-tracked tables and "insert" for the others. BLOB values are
+base64-encoded. Deletes are not captured.
+
+Watermarks are saved to a JSON file after each chunk has been handed to the
+consumer, so a restarted tailer resumes where the last one stopped. A crash
+between output and save repeats at most one chunk (at-least-once).
+
+Reads use read-only connections, with one short statement per chunk, so
+the tailer never takes the write lock and doesn't keep live agents from
+writing. With WAL (as the agents use) readers don't block writers at all.
+
+Usage:
+    python -m common.session_cdc [DB ...] [-o changes.jsonl] [--follow]
+        [--interval 2] [--watermarks ./db/cdc_watermarks.json] [--reset]
+"""
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.session_dbs import ADK_SESSION_TABLES, connect, existing_databases, table_names
+
+logger = logging.getLogger(__name__)
+
+UPDATE_TIME_COLUMN = "update_time"
+TIMESTAMP_COLUMN = "timestamp"
+
+Change = Dict[str, Any]
+
+
+def _json_value(value: Any) -> Any:
+    return base64.b64encode(value).decode("ascii") if isinstance(value, bytes) else value
+
+
+def _digest(row: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _shift(timestamp: str, seconds: float) -> str:
+    """A stored DATETIME string moved by `seconds`, in the same sortable format."""
+    return (datetime.fromisoformat(timestamp) + timedelta(seconds=seconds)).isoformat(sep=" ")
+
+
+class SessionTailer:
+    """Emits new and updated rows of session databases past persisted watermarks."""
+
+    def __init__(
+        self,
+        db_paths: List[str],
+        watermark_path: str = "./db/cdc_watermarks.json",
+        tables: Optional[List[str]] = None,
+        chunk_rows: int = 1000,
+        overlap_seconds: float = 2.0,
+        append_overlap_seconds: float = 60.0,
+    ):
+        """
+        Args:
+            db_paths: Databases to tail; ones that don't exist yet are skipped until they do.
+            watermark_path: JSON file the watermarks are kept in.
+            tables: Tables to tail (default: the ADK session tables).
+            chunk_rows: Rows read per statement.
+            overlap_seconds: How far back update_time-tracked tables are re-read.
+            append_overlap_seconds: How far back timestamp-tracked tables are
+                re-read; longer than any delay between creating and writing an event.
+        """
+        self.db_paths = db_paths
+        self.watermark_path = watermark_path
+        self.tables = list(tables or ADK_SESSION_TABLES)
+        self.chunk_rows = chunk_rows
+        self.overlap_seconds = overlap_seconds
+        self.append_overlap_seconds = append_overlap_seconds
+        self.watermarks: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        if os.path.exists(watermark_path):
+            with open(watermark_path, encoding="utf-8") as f:
+                self.watermarks = json.load(f)
+
+    # ------------------------------------------------------------ watermarks
+
+    def _save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.watermark_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".cdc-", suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.watermarks, f)
+        os.replace(tmp, self.watermark_path)
+
+    def reset(self, db_path: Optional[str] = None) -> None:
+        """Forget the watermarks of one database (or all), so it is emitted again from the start."""
+        if db_path is None:
+            self.watermarks = {}
+        else:
+            self.watermarks.pop(os.path.abspath(db_path), None)
+        self._save()
+
+    # --------------------------------------------------------------- polling
+
+    def poll(self, emit: Callable[[List[Change]], None]) -> int:
+        """One pass over every database; `emit` gets each chunk of changes. Returns the number emitted."""
+        emitted = 0
+        for db_path in self.db_paths:
+            if not os.path.exists(db_path):
+                continue
+            conn = connect(db_path, readonly=True)
+            try:
+                present = set(table_names(conn))
+                for table in self.tables:
+                    if table in present:
+                        emitted += self._poll_table(conn, db_path, table, emit)
+            finally:
+                conn.close()
+        return emitted
+
+    def follow(self, emit: Callable[[List[Change]], None], interval: float = 2.0,
+               stop: Optional[threading.Event] = None) -> None:
+        """Poll every `interval` seconds until `stop` is set."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.poll(emit)
+            stop.wait(interval)
+
+    def _poll_table(self, conn, db_path: str, table: str, emit: Callable[[List[Change]], None]) -> int:
+        marks = self.watermarks.setdefault(os.path.abspath(db_path), {})
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+        if UPDATE_TIME_COLUMN in columns:
+            return self._poll_by_time(conn, db_path, table, marks, emit, UPDATE_TIME_COLUMN, "upsert", self.overlap_seconds)
+        if TIMESTAMP_COLUMN in columns:
+            return self._poll_by_time(conn, db_path, table, marks, emit, TIMESTAMP_COLUMN, "insert", self.append_overlap_seconds)
+        return self._poll_appended(conn, db_path, table, marks, emit)
+
+    def _changes(self, cursor, db_path: str, table: str, op: str) -> List[Change]:
+        names = [d[0] for d in cursor.description][1:]
+        return [
+            {
+                "db": db_path,
+                "table": table,
+                "op": op,
+                "rowid": row[0],
+                "row": {name: _json_value(value) for name, value in zip(names, row[1:])},
+            }
+            for row in cursor.fetchall()
+        ]
+
+    def _poll_appended(self, conn, db_path, table, marks, emit) -> int:
+        # digest: content of the row at the watermark, to notice it was deleted or its rowid reused
+        mark = marks.setdefault(table, {"rowid": 0, "digest": None})
+        if mark["rowid"]:
+            cursor = conn.execute(f'SELECT rowid, * FROM "{table}" WHERE rowid = ?', (mark["rowid"],))
+            current = self._changes(cursor, db_path, table, "insert")
+            if not current or _digest(current[0]["row"]) != mark.get("digest"):
+                logger.warning(
+                    "%s %s: the row at watermark rowid %d was deleted or replaced; reading it again from the start",
+                    db_path, table, mark["rowid"],
+                )
+                mark.update(rowid=0, digest=None)
+        emitted = 0
+        while True:
+            cursor = conn.execute(
+                f'SELECT rowid, * FROM "{table}" WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                (mark["rowid"], self.chunk_rows),
+            )
+            changes = self._changes(cursor, db_path, table, "insert")
+            if not changes:
+                return emitted
+            emit(changes)
+            mark.update(rowid=changes[-1]["rowid"], digest=_digest(changes[-1]["row"]))
+            self._save()
+            emitted += len(changes)
+
+    def _poll_by_time(self, conn, db_path, table, marks, emit, column: str, op: str, overlap: float) -> int:
+        # since: largest `column` value read; seen: rowid -> [value, digest] of
+        # rows emitted within the overlap window (a reused rowid has a new digest)
+        mark = marks.get(table)
+        if mark is None or mark.get("column") != column:
+            if mark is not None:
+                logger.warning("%s %s: watermark of an older format; reading it again from the start", db_path, table)
+            mark = marks[table] = {"column": column, "since": None, "seen": {}}
+        seen = mark["seen"]
+        position = (_shift(mark["since"], -overlap) if mark["since"] else "", -1)
+        emitted = 0
+        while True:
+            cursor = conn.execute(
+                f'SELECT rowid, * FROM "{table}" WHERE ({column}, rowid) > (?, ?)'
+                f" ORDER BY {column}, rowid LIMIT ?",
+                (*position, self.chunk_rows),
+            )
+            rows = self._changes(cursor, db_path, table, op)
+            if not rows:
+                break
+            position = (rows[-1]["row"][column], rows[-1]["rowid"])
+            changes = []
+            for change in rows:
+                digest = _digest(change["row"])
+                key = str(change["rowid"])
+                if seen.get(key, [None, None])[1] != digest:
+                    seen[key] = [change["row"][column], digest]
+                    changes.append(change)
+            mark["since"] = max(mark["since"] or "", position[0])
+            if changes:
+                emit(changes)
+                emitted += len(changes)
+            self._save()
+        if mark["since"]:
+            horizon = _shift(mark["since"], -overlap)
+            mark["seen"] = {key: value for key, value in seen.items() if value[0] >= horizon}
+            self._save()
+        return emitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream new and updated session DB rows as JSON lines.")
+    parser.add_argument("databases", nargs="*", help="Databases to tail (default: all known session DBs)")
+    parser.add_argument("-o", "--output", help="Append JSONL here (default: stdout)")
+    parser.add_argument("--follow", action="store_true", help="Keep polling for new changes")
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between polls with --follow")
+    parser.add_argument("--watermarks", default="./db/cdc_watermarks.json", help="Watermark file")
+    parser.add_argument("--tables", nargs="+", help="Tables to tail (default: the ADK session tables)")
+    parser.add_argument("--chunk-rows", type=int, default=1000)
+    parser.add_argument("--reset", action="store_true", help="Forget the watermarks first")
+    args = parser.parse_args()
+
+    db_paths = args.databases or existing_databases()
+    tailer = SessionTailer(db_paths, args.watermarks, args.tables, args.chunk_rows)
+    if args.reset:
+        for db_path in db_paths:
+            tailer.reset(db_path)
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+
+    def emit(changes: List[Change]) -> None:
+        out.write("".join(json.dumps(change, default=str) + "\n" for change in changes))
+        out.flush()
+
+    try:
+        if args.follow:
+            tailer.follow(emit, args.interval)
+        else:
+            count = tailer.poll(emit)
+            print(f"{count} changes", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Where our session databases live, and how maintenance tools open them.
+
+The agents and UI each keep their own SQLite file. Tools that operate on
+"every session DB" (maintenance, export, inspection) use SESSION_DATABASES
+as their default list and `connect` to open a file without getting in the
+way of the live agents writing to it.
+"""
+import os
+import sqlite3
+from typing import List, Optional
+
+SESSION_DATABASES = [
+    "./db/area_agent_sessions.db",
+    "./db/perimeter_agent_sessions.db",
+    "./db/geometry_host_sessions.db",
+    "./db/ui_sessions.db",
+    "./code_pipeline.db",
+    "./multi-agent copy/code_pipeline.db",
+]
+
+# Tables created by ADK's DatabaseSessionService
+ADK_SESSION_TABLES = ("sessions", "events", "app_states", "user_states")
+
+
+def existing_databases(paths: Optional[List[str]] = None) -> List[str]:
+    """Return the given (or default) database paths that exist on disk."""
+    return [path for path in (paths or SESSION_DATABASES) if os.path.exists(path)]
+
+
+def connect(db_path: str, readonly: bool = False, busy_timeout_ms: int = 5000) -> sqlite3.Connection:
+    """
+    Open a session database for a maintenance tool.
+
+    Connections run in autocommit mode (transactions are explicit) and wait
+    up to `busy_timeout_ms` for the agents' write lock instead of failing.
+    Read-only connections can't take the write lock at all.
+    """
+    if readonly:
+        uri = f"file:{os.path.abspath(db_path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, isolation_level=None, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+    return conn
+
+
+def table_names(conn: sqlite3.Connection) -> List[str]:
+    """Names of the user tables in the database."""
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )
+    return [row[0] for row in rows]
+
+
+def is_adk_session_db(conn: sqlite3.Connection) -> bool:
+    """Whether the database holds DatabaseSessionService tables."""
+    return set(ADK_SESSION_TABLES).issubset(table_names(conn))
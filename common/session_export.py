@@ -0,0 +1,273 @@
+"""
+Streaming, parallel export of the session databases to CSV, Parquet or Arrow.
+
+Every table is read through a cursor in `chunk_rows`-row chunks and written
+chunk by chunk, so memory stays flat however large the events table grows.
+Tables (of one or several databases) are exported concurrently, each on its
+own read-only connection, which never takes the write lock the agents need.
+Every table is a consistent snapshot of itself.
+
+Parquet and Arrow (IPC file) output needs pyarrow. The schema comes from
+`PRAGMA table_info`, with each declared type mapped by SQLite's affinity
+rules:
+
+    INT...                    -> int64
+    CHAR / CLOB / TEXT        -> string
+    BLOB (or no type)         -> binary
+    REAL / FLOA / DOUB        -> float64
+    BOOL...                   -> bool
+    anything else (DATETIME)  -> string, as SQLite stores it
+
+In CSV output, BLOB values are base64-encoded.
+
+Output goes to OUTPUT_DIR/<database>/<table>.<csv|parquet|arrow>. Each file
+is written under a temporary name and renamed when complete.
+
+Usage:
+    python -m common.session_export [DB ...] [-o db_exports]
+        [--format csv|parquet|arrow] [--tables events sessions]
+        [--chunk-rows 50000] [--workers 4]
+"""
+import argparse
+import base64
+import csv
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.session_dbs import connect, existing_databases, table_names
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; only needed for Parquet/Arrow output
+    pa = None
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+
+class ExportError(RuntimeError):
+    """A table can't be exported in the requested format."""
+
+
+class Column(BaseModel):
+    name: str
+    declared_type: str
+    not_null: bool
+
+
+class TableExport(BaseModel):
+    """Outcome of exporting one table."""
+
+    db_path: str
+    table: str
+    path: str
+    rows: int
+    seconds: float
+
+
+def table_columns(conn, table: str) -> List[Column]:
+    """The table's columns as declared, from PRAGMA table_info."""
+    return [
+        Column(name=row[1], declared_type=(row[2] or "").upper(), not_null=bool(row[3]))
+        for row in conn.execute(f'PRAGMA table_info("{table}")')
+    ]
+
+
+def arrow_type(declared_type: str):
+    """Arrow type for a declared SQLite column type, by SQLite's affinity rules."""
+    if "INT" in declared_type:
+        return pa.int64()
+    if any(name in declared_type for name in ("CHAR", "CLOB", "TEXT")):
+        return pa.string()
+    if "BLOB" in declared_type or not declared_type:
+        return pa.binary()
+    if any(name in declared_type for name in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    if "BOOL" in declared_type:
+        return pa.bool_()
+    # NUMERIC affinity (DATETIME, DECIMAL, ...): SQLite stores what it was given
+    return pa.string()
+
+
+def arrow_schema(columns: List[Column]):
+    return pa.schema([
+        pa.field(column.name, arrow_type(column.declared_type), nullable=not column.not_null)
+        for column in columns
+    ])
+
+
+def _to_arrow_value(arrow_field) -> Optional[Callable[[Any], Any]]:
+    """Per-value conversion where SQLite's storage differs from the Arrow type."""
+    if pa.types.is_boolean(arrow_field.type):
+        return lambda value: None if value is None else bool(value)
+    if pa.types.is_string(arrow_field.type):
+        return lambda value: value if value is None or isinstance(value, str) else str(value)
+    return None
+
+
+class _CsvSink:
+    def __init__(self, path: str, columns: List[Column]):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([column.name for column in columns])
+        self._blob_columns = [
+            index for index, column in enumerate(columns)
+            if "BLOB" in column.declared_type or not column.declared_type
+        ]
+
+    def write(self, rows: List[Tuple]) -> None:
+        if self._blob_columns:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for index in self._blob_columns:
+                    if isinstance(row[index], bytes):
+                        row[index] = base64.b64encode(row[index]).decode("ascii")
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ArrowSink:
+    def __init__(self, path: str, columns: List[Column], fmt: str):
+        self.schema = arrow_schema(columns)
+        self._converters = [_to_arrow_value(field) for field in self.schema]
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self._writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, rows: List[Tuple]) -> None:
+        arrays = []
+        for values, field, convert in zip(zip(*rows), self.schema, self._converters):
+            if convert is not None:
+                values = [convert(value) for value in values]
+            try:
+                arrays.append(pa.array(values, type=field.type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError) as e:
+                raise ExportError(f"Column {field.name!r} holds values that aren't {field.type}: {e}") from e
+        self._writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def export_table(db_path: str, table: str, path: str, fmt: str = "csv", chunk_rows: int = 50_000) -> TableExport:
+    """Stream one table to `path`, `chunk_rows` rows at a time."""
+    began = time.perf_counter()
+    conn = connect(db_path, readonly=True)
+    partial = path + ".partial"
+    sink = None
+    rows = 0
+    try:
+        columns = table_columns(conn, table)
+        sink = _CsvSink(partial, columns) if fmt == "csv" else _ArrowSink(partial, columns, fmt)
+        cursor = conn.execute(f'SELECT * FROM "{table}"')
+        while True:
+            chunk = cursor.fetchmany(chunk_rows)
+            if not chunk:
+                break
+            sink.write(chunk)
+            rows += len(chunk)
+        sink.close()
+        sink = None
+        os.replace(partial, path)
+    finally:
+        if sink is not None:
+            sink.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+        conn.close()
+    return TableExport(db_path=db_path, table=table, path=path, rows=rows, seconds=time.perf_counter() - began)
+
+
+def _export_dirs(db_paths: List[str], output_dir: str) -> List[str]:
+    """One output directory per database: its file name, or its whole path where names collide."""
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in db_paths]
+    return [
+        os.path.join(output_dir, stem if stems.count(stem) == 1 else _path_name(path))
+        for stem, path in zip(stems, db_paths)
+    ]
+
+
+def _path_name(db_path: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", os.path.splitext(os.path.normpath(db_path))[0]).strip("_")
+
+
+def export_databases(
+    db_paths: List[str],
+    output_dir: str = "db_exports",
+    fmt: str = "csv",
+    tables: Optional[List[str]] = None,
+    chunk_rows: int = 50_000,
+    workers: int = 4,
+    on_done: Optional[Callable[[TableExport], None]] = None,
+) -> List[TableExport]:
+    """
+    Export the tables of every database concurrently.
+
+    Args:
+        tables: Only these tables (where they exist); default all.
+        workers: Tables exported at once.
+        on_done: Called with each table's result as it finishes.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    if fmt != "csv" and pa is None:
+        raise ExportError(f"{fmt} output needs pyarrow (pip install pyarrow)")
+    jobs = []
+    for db_path, export_dir in zip(db_paths, _export_dirs(db_paths, output_dir)):
+        conn = connect(db_path, readonly=True)
+        try:
+            names = [name for name in table_names(conn) if tables is None or name in tables]
+        finally:
+            conn.close()
+        if names:
+            os.makedirs(export_dir, exist_ok=True)
+        jobs += [(db_path, name, os.path.join(export_dir, name + FORMATS[fmt])) for name in names]
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(export_table, db_path, name, path, fmt, chunk_rows) for db_path, name, path in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_done is not None:
+                on_done(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export session databases to CSV, Parquet or Arrow.")
+    parser.add_argument("databases", nargs="*", help="Databases to export (default: all known session DBs)")
+    parser.add_argument("-o", "--output-dir", default="db_exports")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--tables", nargs="+", help="Only these tables")
+    parser.add_argument("--chunk-rows", type=int, default=50_000, help="Rows read and written at a time")
+    parser.add_argument("--workers", type=int, default=4, help="Tables exported at once")
+    args = parser.parse_args()
+
+    if args.format != "csv" and pa is None:
+        parser.error(f"{args.format} output needs pyarrow (pip install pyarrow)")
+    db_paths = args.databases or existing_databases()
+    missing = [path for path in db_paths if not os.path.exists(path)]
+    if missing:
+        parser.error(f"No such database: {', '.join(missing)}")
+    began = time.perf_counter()
+    results = export_databases(
+        db_paths, args.output_dir, args.format, args.tables, args.chunk_rows, args.workers,
+        on_done=lambda r: print(f"{r.path}: {r.rows} rows in {r.seconds:.1f}s", flush=True),
+    )
+    print(f"Exported {len(results)} tables, {sum(r.rows for r in results)} rows in {time.perf_counter() - began:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Inspect the session databases a page at a time.
+
+Rows are filtered in SQL, read through a cursor and printed as they arrive,
+so looking at one user's sessions costs the same with 100 users or 100k.
+Only the projected columns are selected, and JSON is decoded only for the
+columns that are shown. In text output a JSON list or object is summarised
+("[12 items]") unless the column is listed in --expand.
+
+Filters map to whichever of these columns the table has:
+
+    --user     user_id
+    --app      app_name
+    --session  session_id, or id in the sessions table
+    --since / --until   timestamp, update_time or create_time
+
+Pages are keyset-paginated on rowid. The last line names the --after
+value of the next page, which stays fast however deep you go, unlike
+OFFSET. --count only counts the matching rows, and --explain shows the
+query plan, so you can see whether an index is used.
+
+Usage:
+    python -m common.session_inspector                      # tables and columns of every session DB
+    python -m common.session_inspector db/ui_sessions.db --table chat_messages --user u1
+    python -m common.session_inspector code_pipeline.db --table events --session s1 \\
+        --columns author timestamp content --limit 20 --after 1200
+    python -m common.session_inspector --table sessions --app area_app --count
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.session_dbs import connect, existing_databases, table_names
+
+TIME_COLUMNS = ("timestamp", "update_time", "create_time")
+
+
+class InspectError(ValueError):
+    """The requested table, column or filter doesn't exist."""
+
+
+def _columns(conn, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _normalize_time(value: str) -> str:
+    """A --since/--until value in the sortable format SQLite stores DATETIME in."""
+    return datetime.fromisoformat(value).isoformat(sep=" ")
+
+
+def build_query(
+    conn,
+    table: str,
+    columns: Optional[List[str]] = None,
+    user: Optional[str] = None,
+    app: Optional[str] = None,
+    session: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    after: Optional[int] = None,
+    newest_first: bool = False,
+) -> Tuple[str, List[str], List[Any]]:
+    """(WHERE clause, selected columns, parameters) for a filtered, keyset-paginated read."""
+    if table not in table_names(conn):
+        raise InspectError(f"No table {table!r}")
+    available = _columns(conn, table)
+    selected = columns or available
+    unknown = [column for column in selected if column not in available]
+    if unknown:
+        raise InspectError(f"{table} has no column(s) {', '.join(unknown)}; it has {', '.join(available)}")
+
+    def column_for(option: str, candidates) -> str:
+        for candidate in candidates:
+            if candidate in available:
+                return candidate
+        raise InspectError(f"{table} can't be filtered by {option}")
+
+    conditions, params = [], []
+    filters = [
+        ("--user", ("user_id",), "=", user),
+        ("--app", ("app_name",), "=", app),
+        ("--session", ("id",) if table == "sessions" else ("session_id",), "=", session),
+        ("--since", TIME_COLUMNS, ">=", since and _normalize_time(since)),
+        ("--until", TIME_COLUMNS, "<", until and _normalize_time(until)),
+    ]
+    for option, candidates, operator, value in filters:
+        if value is not None:
+            conditions.append(f'"{column_for(option, candidates)}" {operator} ?')
+            params.append(value)
+    if after is not None:
+        conditions.append("rowid < ?" if newest_first else "rowid > ?")
+        params.append(after)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, selected, params
+
+
+def iter_rows(
+    conn, table: str, where: str, selected: List[str], params: List[Any],
+    limit: int, newest_first: bool = False, chunk_rows: int = 500,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (rowid, {column: raw value}) for up to `limit` matching rows, as they are read."""
+    projection = ", ".join(f'"{column}"' for column in selected)
+    cursor = conn.execute(
+        f'SELECT rowid, {projection} FROM "{table}"{where}'
+        f" ORDER BY rowid {'DESC' if newest_first else 'ASC'} LIMIT ?",
+        (*params, limit),
+    )
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return
+        for row in rows:
+            yield row[0], dict(zip(selected, row[1:]))
+
+
+def count_rows(conn, table: str, where: str, params: List[Any]) -> int:
+    return conn.execute(f'SELECT COUNT(*) FROM "{table}"{where}', params).fetchone()[0]
+
+
+def query_plan(conn, sql: str, params: List[Any]) -> List[str]:
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def _decoded(value: Any) -> Any:
+    if isinstance(value, str) and value[:1] in ("{", "["):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            pass
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    return value
+
+
+def format_text(rowid: int, row: Dict[str, Any], expand: List[str], width: int) -> str:
+    parts = [f"#{rowid}"]
+    for column, value in row.items():
+        value = _decoded(value)
+        if isinstance(value, list) and column not in expand:
+            shown = f"[{len(value)} items]"
+        elif isinstance(value, dict) and column not in expand:
+            shown = f"{{{len(value)} keys: {', '.join(list(value)[:5])}{', …' if len(value) > 5 else ''}}}"
+        elif isinstance(value, (list, dict)):
+            shown = json.dumps(value, indent=2, default=str)
+        else:
+            shown = str(value)
+        if column not in expand and len(shown) > width:
+            shown = shown[:width] + "…"
+        parts.append(f"{column}={shown}")
+    return "  ".join(parts)
+
+
+def overview(db_path: str) -> None:
+    conn = connect(db_path, readonly=True)
+    try:
+        print(db_path)
+        for table in table_names(conn):
+            print(f"  {table}: {', '.join(_columns(conn, table))}")
+    finally:
+        conn.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect session databases page by page.")
+    parser.add_argument("databases", nargs="*", help="Databases (default: all known session DBs)")
+    parser.add_argument("--table", help="Table to read (without it: list tables and columns)")
+    parser.add_argument("--user", help="Filter on user_id")
+    parser.add_argument("--app", help="Filter on app_name")
+    parser.add_argument("--session", help="Filter on session id")
+    parser.add_argument("--since", help="Rows at or after this time (ISO format)")
+    parser.add_argument("--until", help="Rows before this time (ISO format)")
+    parser.add_argument("--columns", nargs="+", help="Columns to show (default: all)")
+    parser.add_argument("--limit", type=int, default=50, help="Rows per page")
+    parser.add_argument("--after", type=int, help="Continue after this rowid (from the previous page)")
+    parser.add_argument("--newest", action="store_true", help="Newest rows first")
+    parser.add_argument("--count", action="store_true", help="Only count the matching rows")
+    parser.add_argument("--explain", action="store_true", help="Show the query plan")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text")
+    parser.add_argument("--expand", nargs="+", default=[], help="Show these columns in full (text format)")
+    parser.add_argument("--width", type=int, default=80, help="Truncate other values to this many characters")
+    args = parser.parse_args(argv)
+
+    db_paths = args.databases or existing_databases()
+    missing = [path for path in db_paths if not os.path.exists(path)]
+    if missing:
+        parser.error(f"No such database: {', '.join(missing)}")
+    if args.table is None:
+        for db_path in db_paths:
+            overview(db_path)
+        return
+    if args.after is not None and len(db_paths) > 1:
+        parser.error("--after continues a page of one database; name that database")
+
+    for db_path in db_paths:
+        conn = connect(db_path, readonly=True)
+        try:
+            if args.table not in table_names(conn):
+                if len(db_paths) == 1:
+                    parser.error(f"{db_path} has no table {args.table!r}")
+                continue
+            try:
+                where, selected, params = build_query(
+                    conn, args.table, args.columns, args.user, args.app, args.session,
+                    args.since, args.until, args.after, args.newest,
+                )
+            except (InspectError, ValueError) as e:
+                parser.error(f"{db_path}: {e}")
+            if args.explain:
+                sql = f'SELECT {"COUNT(*)" if args.count else "*"} FROM "{args.table}"{where}'
+                for step in query_plan(conn, sql, params):
+                    print(f"-- plan: {step}", file=sys.stderr)
+            if args.count:
+                print(f"{db_path} {args.table}: {count_rows(conn, args.table, where, params)}")
+                continue
+
+            shown, last_rowid = 0, None
+            for rowid, row in iter_rows(conn, args.table, where, selected, params, args.limit, args.newest):
+                if args.format == "jsonl":
+                    record = {"db": db_path, "table": args.table, "rowid": rowid}
+                    record.update({column: _decoded(value) for column, value in row.items()})
+                    print(json.dumps(record, default=str), flush=True)
+                else:
+                    if shown == 0:
+                        print(f"== {db_path} {args.table}")
+                    print(format_text(rowid, row, args.expand, args.width), flush=True)
+                shown, last_rowid = shown + 1, rowid
+            if shown == args.limit:
+                print(f"-- {shown} rows; next page: {db_path} --after {last_rowid}", file=sys.stderr)
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
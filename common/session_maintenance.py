@@ -0,0 +1,449 @@
+"""
+Retention, TTL and compaction for the session databases.
+
+The session DBs only ever grow, and reads get slower as they do. This module
+applies per-app retention policies to the ADK session tables: it deletes
+events older than `max_event_age_days`, keeps only the newest
+`max_events_per_session` events of each session, and drops sessions idle for
+more than `max_idle_days`. The "ui_chat" policy applies the same three rules
+to the UI's chat tables (db/ui_sessions.db), per user instead of per session.
+
+The tables keep time in three formats, and each rule compares a column with
+a cutoff in that column's own format, so the indexes still serve it: ADK
+event timestamps are naive local time with microseconds, session
+update_time is SQLite's CURRENT_TIMESTAMP (UTC, whole seconds), and the chat
+tables store epoch seconds.
+
+Deletes run in small batches, each its own short transaction, with a pause in
+between so live agents can take the write lock. After pruning, free pages
+are returned to the filesystem with `incremental_vacuum` (the first run
+converts the file to auto_vacuum=INCREMENTAL with a one-time VACUUM), and a
+size / row-count report is printed.
+
+With --sweep-blobs, blob-store files (common.blob_store) that no remaining
+session state or event references are deleted afterwards. References are
+collected from the databases being maintained, so every database whose
+sessions use that blob directory (batch-run DBs included) must be listed.
+
+Usage:
+    python -m common.session_maintenance [DB ...] [--policies policies.json]
+        [--no-vacuum] [--report-only] [--every SECONDS]
+        [--sweep-blobs [ROOT]] [--blob-min-age SECONDS]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from pydantic import BaseModel, Field
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.blob_store import BlobStore, blob_digests
+from common.session_dbs import connect, existing_databases, is_adk_session_db, table_names
+
+
+class RetentionPolicy(BaseModel):
+    """Retention rules for one app's sessions. None disables a rule."""
+    max_event_age_days: Optional[float] = Field(None, description="Delete events older than this")
+    max_events_per_session: Optional[int] = Field(None, description="Keep only this many newest events per session")
+    max_idle_days: Optional[float] = Field(None, description="Drop sessions not updated for this long")
+
+
+# Keyed by ADK app_name; "*" applies to apps without their own entry. The UI's
+# chat tables have no app_name and use CHAT_POLICY_KEY only.
+CHAT_POLICY_KEY = "ui_chat"
+DEFAULT_POLICIES: Dict[str, RetentionPolicy] = {
+    "area_app": RetentionPolicy(max_event_age_days=7, max_events_per_session=200),
+    "perimeter_app": RetentionPolicy(max_event_age_days=7, max_events_per_session=200),
+    "geometry_host_app": RetentionPolicy(max_event_age_days=7, max_events_per_session=200),
+    "code_pipeline_app": RetentionPolicy(max_event_age_days=30, max_events_per_session=500, max_idle_days=90),
+    "*": RetentionPolicy(max_event_age_days=30, max_idle_days=180),
+    CHAT_POLICY_KEY: RetentionPolicy(max_event_age_days=90, max_events_per_session=1000, max_idle_days=180),
+}
+
+
+def load_policies(path: Optional[str]) -> Dict[str, RetentionPolicy]:
+    """Read policies from a JSON file of {app_name: {rule: value}}, or use the defaults."""
+    if not path:
+        return dict(DEFAULT_POLICIES)
+    with open(path) as f:
+        return {app: RetentionPolicy(**rules) for app, rules in json.load(f).items()}
+
+
+def _event_cutoff(days: float) -> str:
+    # ADK stores event timestamps as naive local time
+    return (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _session_cutoff(days: float) -> str:
+    # ...but session update_time comes from SQLite's CURRENT_TIMESTAMP, in UTC
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    return cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _chat_cutoff(days: float) -> float:
+    # ChatStore's created_at is time.time()
+    return time.time() - days * 86400
+
+
+def _delete_in_batches(conn, sql: str, params: tuple, batch_size: int, pause: float) -> int:
+    """Run a `... LIMIT ?` delete repeatedly until it removes nothing."""
+    total = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = conn.execute(sql, params + (batch_size,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        total += deleted
+        if deleted < batch_size:
+            return total
+        # Give the agents a chance at the write lock between batches
+        time.sleep(pause)
+
+
+def _delete_excess_events(conn, app_name: str, keep: int, batch_size: int, pause: float) -> int:
+    """
+    Delete all but the newest `keep` events of each of the app's sessions.
+
+    The rows to delete are found with reads only (the sessions over the
+    limit, then each one's surplus rowids through the (app_name, user_id,
+    session_id, timestamp) index); the write transactions just delete
+    known rowids, `batch_size` at a time.
+    """
+    sessions = conn.execute(
+        "SELECT user_id, session_id FROM events WHERE app_name = ?"
+        " GROUP BY user_id, session_id HAVING COUNT(*) > ?",
+        (app_name, keep),
+    ).fetchall()
+    total = 0
+    for user_id, session_id in sessions:
+        rows = conn.execute(
+            "SELECT rowid, timestamp FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+            " ORDER BY timestamp DESC LIMIT -1 OFFSET ?",
+            (app_name, user_id, session_id, keep),
+        ).fetchall()
+        # The rows' newest timestamp bounds the delete, so a rowid reused
+        # by an event written since the read is never hit
+        newest = max(timestamp for _, timestamp in rows)
+        for start in range(0, len(rows), batch_size):
+            rowids = [rowid for rowid, _ in rows[start:start + batch_size]]
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total += conn.execute(
+                    f"DELETE FROM events WHERE rowid IN ({','.join('?' * len(rowids))})"
+                    " AND app_name = ? AND user_id = ? AND session_id = ? AND timestamp <= ?",
+                    (*rowids, app_name, user_id, session_id, newest),
+                ).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            time.sleep(pause)
+    return total
+
+
+def apply_policy(
+    conn: sqlite3.Connection,
+    app_name: str,
+    policy: RetentionPolicy,
+    batch_size: int = 500,
+    pause: float = 0.05,
+) -> Dict[str, int]:
+    """Apply one app's retention policy; return how many rows each rule removed."""
+    removed = {"old_events": 0, "excess_events": 0, "idle_sessions": 0}
+
+    if policy.max_idle_days is not None:
+        cutoff = _session_cutoff(policy.max_idle_days)
+        # Events first: foreign keys (and so ON DELETE CASCADE) may be off
+        _delete_in_batches(
+            conn,
+            "DELETE FROM events WHERE rowid IN ("
+            " SELECT e.rowid FROM events e JOIN sessions s"
+            " ON s.app_name = e.app_name AND s.user_id = e.user_id AND s.id = e.session_id"
+            " WHERE s.app_name = ? AND s.update_time < ? LIMIT ?)",
+            (app_name, cutoff), batch_size, pause,
+        )
+        removed["idle_sessions"] = _delete_in_batches(
+            conn,
+            "DELETE FROM sessions WHERE rowid IN ("
+            " SELECT rowid FROM sessions WHERE app_name = ? AND update_time < ? LIMIT ?)",
+            (app_name, cutoff), batch_size, pause,
+        )
+
+    if policy.max_event_age_days is not None:
+        removed["old_events"] = _delete_in_batches(
+            conn,
+            "DELETE FROM events WHERE rowid IN ("
+            " SELECT rowid FROM events WHERE app_name = ? AND timestamp < ? LIMIT ?)",
+            (app_name, _event_cutoff(policy.max_event_age_days)), batch_size, pause,
+        )
+
+    if policy.max_events_per_session is not None:
+        removed["excess_events"] = _delete_excess_events(
+            conn, app_name, policy.max_events_per_session, batch_size, pause
+        )
+
+    return removed
+
+
+def _delete_chat_rows(conn, rows: List[tuple], batch_size: int, pause: float) -> int:
+    """Delete (rowid, user_id, seq) chat messages found by a read, `batch_size` at a time."""
+    total = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # (user_id, seq) is the key, so a reused rowid never matches
+            total += sum(
+                conn.execute(
+                    "DELETE FROM chat_messages WHERE rowid = ? AND user_id = ? AND seq = ?", row
+                ).rowcount
+                for row in batch
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        time.sleep(pause)
+    return total
+
+
+def apply_chat_policy(
+    conn: sqlite3.Connection,
+    policy: RetentionPolicy,
+    batch_size: int = 500,
+    pause: float = 0.05,
+) -> Dict[str, int]:
+    """
+    Apply a retention policy to the UI's chat tables, per user: old messages,
+    messages beyond the newest `max_events_per_session`, and users idle for
+    `max_idle_days`. Rows are found with reads; the writes only delete them.
+    """
+    removed = {"old_messages": 0, "excess_messages": 0, "idle_users": 0}
+
+    if policy.max_idle_days is not None:
+        cutoff = _chat_cutoff(policy.max_idle_days)
+        # A user's last activity is their newest message, or when they started
+        idle = [row[0] for row in conn.execute(
+            "SELECT user_id FROM chat_users u WHERE COALESCE("
+            " (SELECT MAX(created_at) FROM chat_messages m WHERE m.user_id = u.user_id), u.created_at) < ?",
+            (cutoff,),
+        )]
+        for start in range(0, len(idle), batch_size):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for user_id in idle[start:start + batch_size]:
+                    # Only what is still old: the user may have come back since the read
+                    conn.execute("DELETE FROM chat_messages WHERE user_id = ? AND created_at < ?", (user_id, cutoff))
+                    removed["idle_users"] += conn.execute(
+                        "DELETE FROM chat_users WHERE user_id = ? AND created_at < ?"
+                        " AND NOT EXISTS (SELECT 1 FROM chat_messages WHERE user_id = ?)",
+                        (user_id, cutoff, user_id),
+                    ).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            time.sleep(pause)
+
+    if policy.max_event_age_days is not None:
+        rows = conn.execute(
+            "SELECT rowid, user_id, seq FROM chat_messages WHERE created_at < ?",
+            (_chat_cutoff(policy.max_event_age_days),),
+        ).fetchall()
+        removed["old_messages"] = _delete_chat_rows(conn, rows, batch_size, pause)
+
+    if policy.max_events_per_session is not None:
+        keep = policy.max_events_per_session
+        users = [row[0] for row in conn.execute(
+            "SELECT user_id FROM chat_messages GROUP BY user_id HAVING COUNT(*) > ?", (keep,)
+        )]
+        rows = []
+        for user_id in users:
+            rows += conn.execute(
+                "SELECT rowid, user_id, seq FROM chat_messages WHERE user_id = ?"
+                " ORDER BY seq DESC LIMIT -1 OFFSET ?",
+                (user_id, keep),
+            ).fetchall()
+        removed["excess_messages"] = _delete_chat_rows(conn, rows, batch_size, pause)
+
+    return removed
+
+
+def enforce_retention(
+    conn: sqlite3.Connection,
+    policies: Dict[str, RetentionPolicy],
+    batch_size: int = 500,
+    pause: float = 0.05,
+) -> Dict[str, Dict[str, int]]:
+    """Apply the matching policy to every app found in an ADK session database, or to the UI's chat tables."""
+    if "chat_messages" in table_names(conn) and CHAT_POLICY_KEY in policies:
+        return {CHAT_POLICY_KEY: apply_chat_policy(conn, policies[CHAT_POLICY_KEY], batch_size, pause)}
+    if not is_adk_session_db(conn):
+        return {}
+    apps = [row[0] for row in conn.execute("SELECT DISTINCT app_name FROM sessions")]
+    results = {}
+    for app_name in apps:
+        policy = policies.get(app_name, policies.get("*"))
+        if policy is not None:
+            results[app_name] = apply_policy(conn, app_name, policy, batch_size, pause)
+    return results
+
+
+def compact(conn: sqlite3.Connection, max_pages: int = 2000) -> str:
+    """
+    Return free pages to the filesystem.
+
+    Files not yet in auto_vacuum=INCREMENTAL mode get a one-time full VACUUM
+    to switch them over (this one does block writers); afterwards each run
+    frees at most `max_pages` pages with incremental_vacuum.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        action = "converted to incremental auto_vacuum"
+    else:
+        # Each result row is one freed page; the pragma only runs as far as it is stepped
+        conn.execute(f"PRAGMA incremental_vacuum({max_pages})").fetchall()
+        action = f"incremental_vacuum({max_pages})"
+    # Fold the WAL back into the main file so its size is reclaimed too
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return action
+
+
+def database_report(db_path: str, conn: sqlite3.Connection) -> Dict[str, Any]:
+    """File size, free pages and row counts of one database."""
+    size = os.path.getsize(db_path)
+    wal_path = db_path + "-wal"
+    wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    report = {
+        "path": db_path,
+        "size_bytes": size,
+        "wal_bytes": wal_size,
+        "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+        "rows": {
+            table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            for table in table_names(conn)
+        },
+    }
+    if is_adk_session_db(conn):
+        report["apps"] = {
+            app: {"sessions": sessions, "events": events}
+            for app, sessions, events in conn.execute(
+                "SELECT s.app_name, COUNT(DISTINCT s.id), "
+                " (SELECT COUNT(*) FROM events e WHERE e.app_name = s.app_name)"
+                " FROM sessions s GROUP BY s.app_name"
+            )
+        }
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    mb = 1024 * 1024
+    print(
+        f"{report['path']}: {report['size_bytes'] / mb:.2f} MB "
+        f"(+{report['wal_bytes'] / mb:.2f} MB WAL, {report['free_bytes'] / mb:.2f} MB free)"
+    )
+    for table, count in report["rows"].items():
+        print(f"  {table:<14} {count:>10} rows")
+    for app, counts in report.get("apps", {}).items():
+        print(f"  app {app}: {counts['sessions']} sessions, {counts['events']} events")
+
+
+def blob_references(conn: sqlite3.Connection) -> Set[str]:
+    """Digests of the blobs referenced by an ADK session database's state and events."""
+    if not is_adk_session_db(conn):
+        return set()
+    digests = set()
+    for table in ("sessions", "app_states", "user_states"):
+        digests |= blob_digests(
+            row[0] for row in conn.execute(f"SELECT state FROM {table} WHERE instr(state, 'blob:sha256:') > 0")
+        )
+    # Event actions are pickled; the references in their state_delta are plain bytes
+    digests |= blob_digests(
+        row[0] for row in conn.execute(
+            "SELECT actions FROM events WHERE instr(actions, CAST('blob:sha256:' AS BLOB)) > 0"
+        )
+    )
+    # Offloaded event texts
+    digests |= blob_digests(
+        row[0] for row in conn.execute("SELECT content FROM events WHERE instr(content, 'blob:sha256:') > 0")
+    )
+    return digests
+
+
+def sweep_blobs(db_paths: List[str], root: str, min_age: float = 3600.0) -> str:
+    """Delete the blobs under `root` that none of `db_paths` references."""
+    referenced = set()
+    for db_path in db_paths:
+        conn = connect(db_path, readonly=True)
+        try:
+            referenced |= blob_references(conn)
+        finally:
+            conn.close()
+    files, size = BlobStore(root).sweep(referenced, min_age)
+    return f"{len(referenced)} referenced blobs kept, {files} unreferenced removed ({size / 2**20:.1f} MB)"
+
+
+def run_maintenance(
+    db_paths: List[str],
+    policies: Dict[str, RetentionPolicy],
+    vacuum: bool = True,
+    report_only: bool = False,
+    batch_size: int = 500,
+    blob_root: Optional[str] = None,
+    blob_min_age: float = 3600.0,
+) -> None:
+    """One maintenance pass over each database: retention, compaction, report; then the blob sweep."""
+    for db_path in db_paths:
+        conn = connect(db_path)
+        try:
+            if not report_only:
+                for app_name, removed in enforce_retention(conn, policies, batch_size).items():
+                    print(f"{db_path} [{app_name}] removed: {removed}")
+                if vacuum:
+                    print(f"{db_path}: {compact(conn)}")
+            print_report(database_report(db_path, conn))
+        finally:
+            conn.close()
+    if blob_root and not report_only:
+        print(f"{blob_root}: {sweep_blobs(db_paths, blob_root, blob_min_age)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retention and compaction for session databases.")
+    parser.add_argument("databases", nargs="*", help="database files (default: all known session DBs)")
+    parser.add_argument("--policies", help="JSON file of {app_name: {rule: value}}")
+    parser.add_argument("--no-vacuum", dest="vacuum", action="store_false")
+    parser.add_argument("--report-only", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--every", type=float, help="repeat every N seconds instead of running once")
+    parser.add_argument("--sweep-blobs", nargs="?", const="./db/blobs", metavar="ROOT",
+                        help="delete blob-store files the databases no longer reference (default ROOT: ./db/blobs)")
+    parser.add_argument("--blob-min-age", type=float, default=3600.0,
+                        help="seconds a blob is kept even when unreferenced")
+    args = parser.parse_args()
+
+    db_paths = existing_databases(args.databases)
+    policies = load_policies(args.policies)
+    while True:
+        run_maintenance(
+            db_paths, policies, args.vacuum, args.report_only, args.batch_size,
+            args.sweep_blobs, args.blob_min_age,
+        )
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Tuned SQLite storage for ADK's DatabaseSessionService.
+
+Every agent keeps its sessions in a plain `sqlite:///./db/*.db` file. With the
+defaults SQLite uses rollback journaling and a full fsync per commit, and the
+events table has no index for the "all events of this session, in order"
+query, so concurrent requests serialize on the database lock. This module
+applies the storage settings in one place: WAL journaling with
+synchronous=NORMAL, a sized connection pool, composite indexes for the
+(app_name, user_id, session_id, timestamp) access pattern, and statement
+caching. Writes begin IMMEDIATE; reads (get_session, list_sessions) begin
+deferred, so they never take the write lock.
+"""
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from google.adk.sessions import DatabaseSessionService
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+
+# Applied to every new DB-API connection. journal_mode=WAL is persistent in
+# the file, the others are per connection.
+SQLITE_PRAGMAS: Dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+    "cache_size": -16000,  # negative = KiB, i.e. 16 MB page cache
+}
+
+# DatabaseSessionService.get_session filters events by session_id only, so
+# the (session_id, timestamp) index is what serves it; the full
+# (app_name, user_id, session_id, timestamp) index serves scoped lookups.
+SESSION_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_events_app_user_session_ts "
+    "ON events (app_name, user_id, session_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_events_session_ts "
+    "ON events (session_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_sessions_app_user_update "
+    "ON sessions (app_name, user_id, update_time)",
+]
+
+# Set while a read-only service call runs; its transactions begin deferred
+_reading = contextvars.ContextVar("session_store_reading", default=False)
+
+
+@contextmanager
+def deferred_reads() -> Iterator[None]:
+    """Begin the transactions opened in this block (on this thread or task) deferred."""
+    token = _reading.set(True)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+def create_tuned_engine(
+    db_url: str,
+    *,
+    pool_size: int = 8,
+    max_overflow: int = 16,
+    pool_timeout: float = 30.0,
+    statement_cache_size: int = 256,
+    immediate_transactions: bool = True,
+    pragmas: Optional[Dict[str, Any]] = None,
+) -> Engine:
+    """
+    Create a pooled SQLAlchemy engine for a SQLite session database.
+
+    Args:
+        db_url: A `sqlite:///...` URL.
+        pool_size: Connections kept open in the pool.
+        max_overflow: Extra connections allowed under burst load.
+        pool_timeout: Seconds to wait for a free connection.
+        statement_cache_size: Size of both the compiled-query cache and the
+            driver's prepared-statement cache, per connection.
+        immediate_transactions: Start transactions with BEGIN IMMEDIATE,
+            except inside `deferred_reads()`. ADK's append_event reads the
+            session row and then writes, and a deferred transaction that
+            upgrades to a write under contention fails with "database is
+            locked" instead of waiting. Reads begin deferred so they keep
+            WAL's "readers don't block the writer" and don't queue for the
+            write lock themselves.
+        pragmas: Overrides merged on top of SQLITE_PRAGMAS.
+    """
+    settings = {**SQLITE_PRAGMAS, **(pragmas or {})}
+    engine = create_engine(
+        db_url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        query_cache_size=statement_cache_size,
+        connect_args={
+            "check_same_thread": False,
+            "cached_statements": statement_cache_size,
+            "timeout": settings["busy_timeout"] / 1000,
+        },
+    )
+
+    @event.listens_for(engine, "connect")
+    def _configure_connection(dbapi_connection, connection_record):
+        if immediate_transactions:
+            # Let SQLAlchemy, not the driver, decide when a transaction begins
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in settings.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    if immediate_transactions:
+        @event.listens_for(engine, "begin")
+        def _begin(connection):
+            connection.exec_driver_sql("BEGIN" if _reading.get() else "BEGIN IMMEDIATE")
+
+    return engine
+
+
+def ensure_session_indexes(engine: Engine) -> None:
+    """Create the composite indexes on the ADK session tables if missing."""
+    with engine.begin() as connection:
+        for statement in SESSION_INDEXES:
+            connection.execute(text(statement))
+
+
+class TunedDatabaseSessionService(DatabaseSessionService):
+    """DatabaseSessionService backed by a WAL-mode, pooled, indexed SQLite engine."""
+
+    def __init__(self, db_url: str, **engine_options: Any):
+        # The parent creates the tables with its default engine; swap in the
+        # tuned one afterwards so the schema stays owned by ADK.
+        super().__init__(db_url)
+        self.db_engine.dispose()
+        self.db_engine = create_tuned_engine(db_url, **engine_options)
+        self.DatabaseSessionFactory = sessionmaker(bind=self.db_engine)
+        ensure_session_indexes(self.db_engine)
+
+    # Read-only calls: their transactions begin deferred (see create_tuned_engine)
+
+    def get_session(self, **kwargs: Any):
+        with deferred_reads():
+            return super().get_session(**kwargs)
+
+    def list_sessions(self, **kwargs: Any):
+        with deferred_reads():
+            return super().list_sessions(**kwargs)
+
+
+def create_session_service(db_url: str, **engine_options: Any) -> DatabaseSessionService:
+    """
+    Build the session service for `db_url`.
+
+    SQLite URLs get the tuned engine; anything else falls back to the stock
+    DatabaseSessionService.
+    """
+    if db_url.startswith("sqlite"):
+        return TunedDatabaseSessionService(db_url, **engine_options)
+    return DatabaseSessionService(db_url=db_url)
@@ -0,0 +1,265 @@
+"""
+Session storage sharded across several SQLite files.
+
+SQLite allows one writer per file, so a single file per app serializes the
+writes of every user of that app. `ShardedSessionService` routes each
+(app_name, user_id, session_id) to one of N database files by a stable hash,
+so writes to different shards proceed in parallel. Operations that span
+sessions (list_sessions) fan out to all shards concurrently.
+
+ADK's app:- and user:-prefixed state lives in per-file tables, so with
+sharding it is per shard as well; none of our agents use those prefixes.
+
+When the shard count changes, move sessions with the reshard command (run it
+while the agents are stopped; if it is interrupted, run it again):
+
+    python -m common.sharded_session_service \\
+        --from "./db/ui_sessions.{shard}.db" --from-shards 4 \\
+        --to "./db/ui_sessions.{shard}.db" --to-shards 8
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListEventsResponse,
+    ListSessionsResponse,
+)
+
+from common.session_store import create_session_service
+
+def shard_index(app_name: str, user_id: str, session_id: str, num_shards: int) -> int:
+    """Stable shard number for a session (the same across processes and runs)."""
+    key = "\x1f".join((app_name, user_id, session_id)).encode("utf-8")
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(digest, "big") % num_shards
+
+
+def shard_paths(path_template: str, num_shards: int) -> List[str]:
+    """Expand a template such as "./db/ui_sessions.{shard}.db" for every shard."""
+    return [path_template.format(shard=index) for index in range(num_shards)]
+
+
+class ShardedSessionService(BaseSessionService):
+    """Routes sessions to one of several session services by stable hash."""
+
+    def __init__(self, path_template: str, num_shards: int, **engine_options: Any):
+        """
+        Args:
+            path_template: Database path with a "{shard}" placeholder.
+            num_shards: Number of database files.
+            engine_options: Passed to create_session_service for each shard.
+        """
+        self.num_shards = num_shards
+        self.paths = shard_paths(path_template, num_shards)
+        self.shards = [
+            create_session_service(f"sqlite:///{path}", **engine_options) for path in self.paths
+        ]
+        self._fan_out = ThreadPoolExecutor(max_workers=num_shards, thread_name_prefix="shard")
+
+    def shard_for(self, app_name: str, user_id: str, session_id: str) -> BaseSessionService:
+        return self.shards[shard_index(app_name, user_id, session_id, self.num_shards)]
+
+    def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        # The id decides the shard, so it has to exist before the insert
+        session_id = session_id or str(uuid.uuid4())
+        return self.shard_for(app_name, user_id, session_id).create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+
+    def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        return self.shard_for(app_name, user_id, session_id).get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        responses = self._fan_out.map(
+            lambda shard: shard.list_sessions(app_name=app_name, user_id=user_id), self.shards
+        )
+        sessions = [session for response in responses for session in response.sessions]
+        return ListSessionsResponse(sessions=sessions)
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self.shard_for(app_name, user_id, session_id).delete_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        return self.shard_for(app_name, user_id, session_id).list_events(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+
+    def close_session(self, *, session: Session):
+        self.shard_for(session.app_name, session.user_id, session.id).close_session(session=session)
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        return self.shard_for(session.app_name, session.user_id, session.id).append_event(
+            session=session, event=event
+        )
+
+
+def reshard(
+    from_template: str,
+    from_shards: int,
+    to_template: str,
+    to_shards: int,
+    batch_size: int = 200,
+) -> Dict[str, int]:
+    """
+    Move every session (with its events) to the shard it belongs to under the
+    new layout. Sessions already in the right file are left alone, so growing
+    a layout in place only moves the sessions whose shard changed.
+
+    A transaction can't span WAL files atomically, so each batch is copied,
+    checked in the target and only then deleted from the source. A crash
+    leaves the current batch in both files, never in neither; the copy skips
+    rows already there, so running reshard again finishes the move.
+
+    Returns counts of moved, unchanged and unverified sessions (the last are
+    left in their source file).
+    """
+    target_paths = shard_paths(to_template, to_shards)
+    # Creates the tables and indexes in any new shard files
+    for path in target_paths:
+        create_session_service(f"sqlite:///{path}").db_engine.dispose()
+
+    # List every source up front, so sessions moved into a file that is
+    # itself a source aren't visited twice
+    plan = []
+    for source_path in shard_paths(from_template, from_shards):
+        if os.path.exists(source_path):
+            conn = sqlite3.connect(source_path)
+            plan.append((source_path, conn.execute("SELECT app_name, user_id, id FROM sessions").fetchall()))
+            conn.close()
+
+    counts = {"moved": 0, "unchanged": 0, "unverified": 0}
+    for source_path, keys in plan:
+        moving: Dict[str, List[Tuple[str, str, str]]] = {}
+        for key in keys:
+            target_path = target_paths[shard_index(*key, to_shards)]
+            if os.path.abspath(target_path) == os.path.abspath(source_path):
+                counts["unchanged"] += 1
+            else:
+                moving.setdefault(target_path, []).append(key)
+        conn = sqlite3.connect(source_path, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=5000")
+        try:
+            for target_path, target_keys in moving.items():
+                conn.execute("ATTACH DATABASE ? AS target", (target_path,))
+                for start in range(0, len(target_keys), batch_size):
+                    batch = target_keys[start:start + batch_size]
+                    _for_each_in_transaction(conn, _copy_session, batch)
+                    copied = [key for key in batch if _is_copied(conn, *key)]
+                    _for_each_in_transaction(conn, _delete_session, copied)
+                    counts["moved"] += len(copied)
+                    counts["unverified"] += len(batch) - len(copied)
+                conn.execute("DETACH DATABASE target")
+        finally:
+            conn.close()
+    return counts
+
+
+def _for_each_in_transaction(conn, operation: Callable[..., None], keys: List[Tuple[str, str, str]]) -> None:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for key in keys:
+            operation(conn, *key)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _copy_session(conn, app_name: str, user_id: str, session_id: str) -> None:
+    """Copy one session, its events and its app/user state rows to the attached target.
+
+    Rows the target already has are kept: after a crash they may have been
+    updated there since the earlier copy.
+    """
+    conn.execute(
+        "INSERT OR IGNORE INTO target.app_states SELECT * FROM app_states WHERE app_name = ?",
+        (app_name,),
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO target.user_states SELECT * FROM user_states"
+        " WHERE app_name = ? AND user_id = ?",
+        (app_name, user_id),
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO target.sessions SELECT * FROM sessions"
+        " WHERE app_name = ? AND user_id = ? AND id = ?",
+        (app_name, user_id, session_id),
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO target.events SELECT * FROM events"
+        " WHERE app_name = ? AND user_id = ? AND session_id = ?",
+        (app_name, user_id, session_id),
+    )
+
+
+def _is_copied(conn, app_name: str, user_id: str, session_id: str) -> bool:
+    """Whether the target has the session and every one of its events."""
+    key = (app_name, user_id, session_id)
+    has_session, missing_events = conn.execute(
+        "SELECT"
+        " EXISTS (SELECT 1 FROM target.sessions WHERE app_name = ? AND user_id = ? AND id = ?),"
+        " (SELECT COUNT(*) FROM ("
+        "  SELECT id FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+        "  EXCEPT SELECT id FROM target.events WHERE app_name = ? AND user_id = ? AND session_id = ?))",
+        key * 3,
+    ).fetchone()
+    return bool(has_session) and missing_events == 0
+
+
+def _delete_session(conn, app_name: str, user_id: str, session_id: str) -> None:
+    conn.execute(
+        "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+        (app_name, user_id, session_id),
+    )
+    conn.execute(
+        "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+        (app_name, user_id, session_id),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move sessions between shard layouts.")
+    parser.add_argument("--from", dest="from_template", required=True, help='e.g. "./db/ui.{shard}.db"')
+    parser.add_argument("--from-shards", type=int, required=True)
+    parser.add_argument("--to", dest="to_template", required=True)
+    parser.add_argument("--to-shards", type=int, required=True)
+    args = parser.parse_args()
+    result = reshard(args.from_template, args.from_shards, args.to_template, args.to_shards)
+    print(f"Moved {result['moved']} sessions, {result['unchanged']} already in place.")
+    if result["unverified"]:
+        print(f"{result['unverified']} sessions didn't copy completely and were left in place; run again.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Cross-session cache of pipeline stage outputs.
+
+A stage's output depends on what its model sees: the agent's instruction
+template, the state values rendered into it and the model. Two users who
+submit the same spec, or a reviewer re-run on identical `generated_code`,
+would otherwise pay for the same LLM calls again.
+
+`StageCache` keys each model call on a hash of the agent name, instruction
+template, the state values the template reads and the model (plus the
+user's message when the template reads no required state). On a hit,
+`lookup_stage_output` (before-model) returns the stored output as the model
+response; `store_stage_output` (after-model) stores the responses of calls
+that missed. Entries live in SQLite, shared across processes, with a small
+in-memory LRU in front, a TTL and a `max_entries` bound. Each process logs
+its hit rates when it exits.
+
+    python -m common.stage_cache            # hit counts per agent
+    python -m common.stage_cache --clear
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.models import LlmResponse
+from google.genai import types
+
+from common.session_dbs import connect
+from common.structured_logging import fields
+
+logger = logging.getLogger(__name__)
+
+# Same placeholder syntax as ADK's instruction templating
+TEMPLATE_VAR_PATTERN = re.compile(r"{+([^{}]*)}+")
+STATE_NAME_PATTERN = re.compile(r"(?:[A-Za-z_]\w*:)?[A-Za-z_]\w*")
+
+
+def template_keys(instruction: str) -> Dict[str, bool]:
+    """State keys an instruction template reads, mapped to whether they are optional ({key?})."""
+    keys: Dict[str, bool] = {}
+    for match in TEMPLATE_VAR_PATTERN.finditer(instruction):
+        name = match.group(1).strip()
+        optional = name.endswith("?")
+        name = name.removesuffix("?")
+        if STATE_NAME_PATTERN.fullmatch(name):
+            keys[name] = keys.get(name, True) and optional
+    return keys
+
+
+def _model_name(model: Any) -> str:
+    return model if isinstance(model, str) else getattr(model, "model", type(model).__name__)
+
+
+def _response_text(llm_response: LlmResponse) -> Optional[str]:
+    """Text of a complete, text-only response; None for anything we shouldn't replay."""
+    content = llm_response.content
+    if llm_response.partial or llm_response.error_code or not content or not content.parts:
+        return None
+    if any(part.text is None for part in content.parts):
+        return None  # function calls, inline data, ...
+    return "".join(part.text for part in content.parts)
+
+
+CallId = Tuple[str, Optional[str], str]
+
+
+def _call_id(callback_context) -> CallId:
+    ctx = callback_context._invocation_context
+    return ctx.invocation_id, ctx.branch, callback_context.agent_name
+
+
+class StageCache:
+    """SQLite-backed LRU/TTL store of stage outputs, keyed on stage inputs."""
+
+    def __init__(
+        self,
+        path: str = "./db/stage_cache.db",
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 10_000,
+        memory_entries: int = 256,
+        pending_ttl_seconds: float = 600.0,
+    ):
+        """
+        Args:
+            path: SQLite file shared by every process using the cache.
+            ttl_seconds: Age after which an entry is no longer served.
+            max_entries: Entries kept on disk; least recently used go first.
+            memory_entries: Entries also kept in this process's memory.
+            pending_ttl_seconds: How long a missed call waits for its
+                response to be stored; a call whose model request raised
+                never gets one.
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.pending_ttl_seconds = pending_ttl_seconds
+        self._memory_entries = memory_entries
+        self._memory: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+        # (key, noted at) of model calls that missed, oldest first, until their
+        # response arrives; the branch tells apart concurrent calls of one
+        # agent (e.g. chunk reviews)
+        self._misses_pending: OrderedDict[CallId, Tuple[str, float]] = OrderedDict()
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stage_outputs ("
+                " key TEXT PRIMARY KEY, agent_name TEXT NOT NULL, output TEXT NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_stage_outputs_last_used ON stage_outputs (last_used)"
+            )
+        return self._conn
+
+    # ------------------------------------------------------------------ keys
+
+    def stage_key(self, agent: Any, state: Any, user_content: Optional[types.Content]) -> str:
+        """Hash of everything that determines the stage's model output."""
+        instruction = agent.instruction
+        if not isinstance(instruction, str):
+            # An InstructionProvider; its code is the template
+            instruction = f"{instruction.__module__}.{instruction.__qualname__}"
+        keys = template_keys(instruction)
+        # An optional key that is unset or empty renders the same either way
+        inputs: Dict[str, Any] = {
+            key: (state.get(key) or None) if optional else state.get(key)
+            for key, optional in keys.items()
+        }
+        if all(keys.values()) and user_content is not None:
+            inputs["user_content"] = [part.text for part in user_content.parts or []]
+        payload = json.dumps(
+            [agent.name, instruction, inputs, _model_name(agent.model)],
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # --------------------------------------------------------------- storage
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._db().execute(
+                    "SELECT output, created FROM stage_outputs WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                entry = (row[0], row[1])
+            output, created = entry
+            if now - created > self.ttl_seconds:
+                self._memory.pop(key, None)
+                self._db().execute("DELETE FROM stage_outputs WHERE key = ?", (key,))
+                return None
+            self._remember(key, entry)
+            self._db().execute(
+                "UPDATE stage_outputs SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            return output
+
+    def put(self, key: str, agent_name: str, output: str) -> None:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO stage_outputs (key, agent_name, output, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, agent_name, output, now, now),
+            )
+            self._remember(key, (output, now))
+            excess = db.execute("SELECT COUNT(*) FROM stage_outputs").fetchone()[0] - self.max_entries
+            if excess > 0:
+                db.execute(
+                    "DELETE FROM stage_outputs WHERE key IN"
+                    " (SELECT key FROM stage_outputs ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+
+    def _remember(self, key: str, entry: Tuple[str, float]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_entries:
+            self._memory.popitem(last=False)
+
+    def purge_expired(self) -> int:
+        """Delete expired entries; returns how many were removed."""
+        with self._lock:
+            self._memory.clear()
+            cursor = self._db().execute(
+                "DELETE FROM stage_outputs WHERE created < ?", (time.time() - self.ttl_seconds,)
+            )
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._db().execute("DELETE FROM stage_outputs")
+
+    # ----------------------------------------------------------------- stats
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hits, misses and hit rate per agent since this process started."""
+        report = {}
+        for agent_name in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits[agent_name], self.misses[agent_name]
+            report[agent_name] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+        return report
+
+    def log_stats(self) -> None:
+        """Log stats() at INFO, one record per agent."""
+        for agent_name, counts in self.stats().items():
+            logger.info(
+                "Stage cache for %s: %d hits, %d misses (%.0f%% hit rate)",
+                agent_name, counts["hits"], counts["misses"], counts["hit_rate"] * 100,
+                extra=fields(event="stage_cache_stats", agent=agent_name, **counts),
+            )
+
+    def stored_stats(self) -> List[Tuple[str, int, int]]:
+        """(agent name, entries, hits) from the shared store, across all processes."""
+        with self._lock:
+            return self._db().execute(
+                "SELECT agent_name, COUNT(*), SUM(hits) FROM stage_outputs"
+                " GROUP BY agent_name ORDER BY agent_name"
+            ).fetchall()
+
+    # ------------------------------------------------------------- callbacks
+
+    def _note_miss(self, call_id: CallId, key: str) -> None:
+        now = time.monotonic()
+        self._misses_pending[call_id] = (key, now)
+        self._misses_pending.move_to_end(call_id)
+        # Calls whose model request raised never reach after_model
+        while self._misses_pending:
+            oldest, (_, noted) = next(iter(self._misses_pending.items()))
+            if now - noted <= self.pending_ttl_seconds:
+                break
+            del self._misses_pending[oldest]
+
+    async def before_model(self, callback_context, llm_request) -> Optional[LlmResponse]:
+        """BEFORE-MODEL callback: answer from the cache, or note the miss."""
+        agent = callback_context._invocation_context.agent
+        key = self.stage_key(agent, callback_context.state, callback_context.user_content)
+        output = await asyncio.to_thread(self.get, key)
+        if output is None:
+            self.misses[agent.name] += 1
+            self._note_miss(_call_id(callback_context), key)
+            return None
+        self.hits[agent.name] += 1
+        return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=output)]))
+
+    async def after_model(self, callback_context, llm_response) -> None:
+        """AFTER-MODEL callback: store the response of a call that missed."""
+        if llm_response.partial:
+            return None
+        pending = self._misses_pending.pop(_call_id(callback_context), None)
+        text = _response_text(llm_response)
+        if pending is not None and text:
+            await asyncio.to_thread(self.put, pending[0], callback_context.agent_name, text)
+        return None
+
+
+stage_cache = StageCache(
+    path=os.environ.get("STAGE_CACHE_DB", "./db/stage_cache.db"),
+    ttl_seconds=float(os.environ.get("STAGE_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+    max_entries=int(os.environ.get("STAGE_CACHE_MAX_ENTRIES", 10_000)),
+)
+lookup_stage_output = stage_cache.before_model
+store_stage_output = stage_cache.after_model
+atexit.register(stage_cache.log_stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the stage output cache.")
+    parser.add_argument("--clear", action="store_true", help="Delete every entry")
+    parser.add_argument("--purge-expired", action="store_true", help="Delete entries older than the TTL")
+    args = parser.parse_args()
+    if args.clear:
+        stage_cache.clear()
+        print("Cleared the stage cache.")
+    elif args.purge_expired:
+        print(f"Removed {stage_cache.purge_expired()} expired entries.")
+    print(f"{'agent':<32} {'entries':>8} {'hits':>8}")
+    for agent_name, entries, hits in stage_cache.stored_stats():
+        print(f"{agent_name:<32} {entries:>8} {hits or 0:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Structured, leveled and sampled logging for the agents.
+
+Built on the standard `logging` module, so modules keep using
+`logging.getLogger(__name__)`. Structured fields go in `extra=fields(...)`:
+
+    logger.info("tool called", extra=fields(event="tool_call", length=3, width=4))
+
+`configure_logging()` sets it up once per process from the LOG_* variables:
+the level (LOG_LEVEL, with per-module overrides such as
+LOG_LEVELS="common.stage_cache=DEBUG"), per-event sampling
+(LOG_SAMPLE="tool_call=0.1"; WARNING and above always pass), text or JSON
+lines (LOG_FORMAT), and masking of secret-looking fields and long values.
+The last LOG_RING_SIZE records are kept in a ring buffer and written out
+when an ERROR is logged, so the lead-up to a failure is visible too.
+"""
+from __future__ import annotations
+
+import collections
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Deque, Dict, Optional, TextIO
+
+FIELDS_ATTR = "fields"
+# Set on a record by the first SamplingFilter that sees it
+SAMPLED_ATTR = "_sampled"
+SECRET_FIELD = re.compile(r"(?:^|_)(?:api_?key|key|token|secret|password|authorization|cookie)$", re.IGNORECASE)
+REDACTED = "[redacted]"
+
+_configured = False
+_ring: Optional["RingBufferHandler"] = None
+_lock = threading.Lock()
+
+
+def fields(**values: Any) -> Dict[str, Dict[str, Any]]:
+    """`extra=` argument carrying structured fields; `event=` names the record for sampling."""
+    return {FIELDS_ATTR: values}
+
+
+def redact(values: Dict[str, Any], max_chars: int) -> Dict[str, Any]:
+    """Mask secret-looking fields and cut long values to `max_chars`."""
+    safe = {}
+    for name, value in values.items():
+        if SECRET_FIELD.search(name):
+            safe[name] = REDACTED
+            continue
+        if not isinstance(value, (int, float, bool, type(None))):
+            value = value if isinstance(value, str) else repr(value)
+            if len(value) > max_chars:
+                value = f"{value[:max_chars]}…(+{len(value) - max_chars} chars)"
+        safe[name] = value
+    return safe
+
+
+class StructuredFormatter(logging.Formatter):
+    """Text or JSON lines with the record's structured fields, redacted and size-capped."""
+
+    def __init__(self, json_lines: bool = False, max_field_chars: int = 200):
+        super().__init__()
+        self.json_lines = json_lines
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        values = redact(getattr(record, FIELDS_ATTR, None) or {}, self.max_field_chars)
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+        timestamp += f".{int(record.msecs):03d}"
+        if self.json_lines:
+            entry = {
+                "ts": timestamp,
+                "level": record.levelname,
+                "logger": record.name,
+                "msg": record.getMessage(),
+                **values,
+            }
+            if record.exc_info:
+                entry["exc"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str, ensure_ascii=False)
+        line = f"{timestamp} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if values:
+            line += " " + " ".join(f"{name}={value}" for name, value in values.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps every Nth record of a sampled event; WARNING and above always pass.
+
+    The decision is made once per record and stored on it, so every handler
+    the filter is attached to keeps or drops the same records.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.every = {event: max(1, round(1 / rate)) for event, rate in rates.items() if rate > 0}
+        self.dropped = {event for event, rate in rates.items() if rate <= 0}
+        self._seen: collections.Counter = collections.Counter()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        keep = getattr(record, SAMPLED_ATTR, None)
+        if keep is None:
+            keep = self._sample(record)
+            setattr(record, SAMPLED_ATTR, keep)
+        return keep
+
+    def _sample(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        event = (getattr(record, FIELDS_ATTR, None) or {}).get("event")
+        if event is None:
+            return True
+        if event in self.dropped:
+            return False
+        every = self.every.get(event)
+        if every is None:
+            return True
+        with self._lock:
+            self._seen[event] += 1
+            seen = self._seen[event]
+        return seen % every == 1 or every == 1
+
+
+class LevelFilter(logging.Filter):
+    """Per-module output levels: the most specific configured logger-name prefix wins."""
+
+    def __init__(self, default: int, module_levels: Dict[str, int]):
+        super().__init__()
+        self.default = default
+        self.module_levels = module_levels
+        self._thresholds: Dict[str, int] = {}
+
+    def _threshold(self, name: str) -> int:
+        threshold = self._thresholds.get(name)
+        if threshold is None:
+            prefixes = [m for m in self.module_levels if name == m or name.startswith(m + ".")]
+            threshold = self.module_levels[max(prefixes, key=len)] if prefixes else self.default
+            self._thresholds[name] = threshold
+        return threshold
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self._threshold(record.name)
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the last `capacity` records; writes them to `target` when an ERROR is logged."""
+
+    def __init__(self, capacity: int, target: logging.Handler, level: int = logging.DEBUG):
+        super().__init__(level)
+        self.records: Deque[logging.LogRecord] = collections.deque(maxlen=capacity)
+        self.target = target
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.levelno >= logging.ERROR:
+            # The error itself is written by the output handler; this is its lead-up
+            self.dump(self.target.stream if hasattr(self.target, "stream") else sys.stderr)
+        self.records.append(record)
+
+    def dump(self, stream: TextIO) -> None:
+        with self.lock:
+            records, self.records = list(self.records), collections.deque(maxlen=self.records.maxlen)
+        if not records:
+            return
+        formatter = self.target.formatter or StructuredFormatter()
+        stream.write(f"----- {len(records)} recent log records -----\n")
+        for record in records:
+            stream.write(formatter.format(record) + "\n")
+        stream.write("----- end of log records -----\n")
+        stream.flush()
+
+
+def _parse_pairs(spec: str) -> Dict[str, str]:
+    pairs = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        pairs[name.strip()] = value.strip()
+    return pairs
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    module_levels: Optional[str] = None,
+    sample: Optional[str] = None,
+    json_lines: Optional[bool] = None,
+    ring_size: Optional[int] = None,
+    stream: TextIO = sys.stderr,
+) -> None:
+    """Install the handlers on the root logger; later calls do nothing. Arguments override the LOG_* variables."""
+    global _configured, _ring
+    with _lock:
+        if _configured:
+            return
+        _configured = True
+        level = logging.getLevelName((level or os.environ.get("LOG_LEVEL", "INFO")).upper())
+        if module_levels is None:
+            module_levels = os.environ.get("LOG_LEVELS", "")
+        levels = {name: logging.getLevelName(value.upper()) for name, value in _parse_pairs(module_levels).items()}
+        sample = sample if sample is not None else os.environ.get("LOG_SAMPLE", "")
+        if json_lines is None:
+            json_lines = os.environ.get("LOG_FORMAT", "text").lower() == "json"
+        ring_size = ring_size if ring_size is not None else int(os.environ.get("LOG_RING_SIZE", "500"))
+        ring_level = logging.getLevelName(os.environ.get("LOG_RING_LEVEL", "INFO").upper())
+
+        output = logging.StreamHandler(stream)
+        output.addFilter(LevelFilter(level, levels))
+        output.setFormatter(StructuredFormatter(
+            json_lines=json_lines, max_field_chars=int(os.environ.get("LOG_MAX_FIELD_CHARS", "200"))
+        ))
+        sampling = SamplingFilter({event: float(rate) for event, rate in _parse_pairs(sample).items()})
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(output)
+        # Loggers only create the records some handler will keep
+        floor = ring_level if ring_size > 0 else logging.CRITICAL
+        if ring_size > 0:
+            _ring = RingBufferHandler(ring_size, output, ring_level)
+            root.addHandler(_ring)
+        root.setLevel(min(level, floor))
+        for name, module_level in levels.items():
+            logging.getLogger(name).setLevel(min(module_level, floor))
+        for handler in root.handlers:
+            handler.addFilter(sampling)
+
+
+def dump_recent(stream: TextIO = sys.stderr) -> None:
+    """Write the ring buffer's records, oldest first, and empty it."""
+    if _ring is not None:
+        _ring.dump(stream)
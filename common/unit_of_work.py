@@ -0,0 +1,110 @@
+"""
+Unit-of-work handle over one session for the duration of a turn.
+
+Loading a session reads every one of its events, so code that calls
+`get_session` before each step pays for the whole history again and again.
+`SessionUnitOfWork` loads the session once, serves reads from it, tracks
+which state keys were changed, and `commit()` writes all of those changes as
+a single event (one append_event, one storage transaction).
+
+Inside an agent's `_run_async_impl` the Runner has already loaded the session
+(`ctx.session`) and appends whatever the agent yields, so there the unit of
+work wraps `ctx.session` and `event()` hands back the commit event to yield
+instead of appending it.
+"""
+from typing import Any, Dict, Optional
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions import BaseSessionService, Session
+
+_MISSING = object()
+
+
+class SessionUnitOfWork:
+    """A session loaded once per turn, with dirty-key tracking."""
+
+    def __init__(self, session_service: BaseSessionService, session: Session, author: str = "system"):
+        self.session_service = session_service
+        self.session = session
+        self.author = author
+        self._dirty: Dict[str, Any] = {}
+
+    @classmethod
+    def load(
+        cls,
+        session_service: BaseSessionService,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        author: str = "system",
+    ) -> Optional["SessionUnitOfWork"]:
+        """Load the session once; None if it doesn't exist."""
+        session = session_service.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+        return cls(session_service, session, author) if session is not None else None
+
+    # ----------------------------------------------------------------- reads
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._dirty.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.session.state.get(key, default)
+        return value
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._dirty or key in self.session.state
+
+    def items(self):
+        """Current state, pending changes included."""
+        return {**self.session.state, **self._dirty}.items()
+
+    # ---------------------------------------------------------------- writes
+
+    def set(self, key: str, value: Any) -> None:
+        """Stage a state change; unchanged values aren't marked dirty."""
+        if key not in self._dirty and self.session.state.get(key, _MISSING) == value:
+            return
+        self._dirty[key] = value
+
+    def update(self, values: Dict[str, Any]) -> None:
+        for key, value in values.items():
+            self.set(key, value)
+
+    @property
+    def dirty_keys(self):
+        return set(self._dirty)
+
+    def event(self, **event_fields: Any) -> Optional[Event]:
+        """
+        The event carrying all staged changes, or None if nothing changed.
+
+        The changes count as committed once the event is appended: an agent
+        yields it to the Runner. `event_fields` (invocation_id, branch, ...)
+        are passed to the Event.
+        """
+        if not self._dirty:
+            return None
+        event_fields.setdefault("invocation_id", Event.new_id())
+        event_fields.setdefault("author", self.author)
+        event = Event(actions=EventActions(state_delta=dict(self._dirty)), **event_fields)
+        self._dirty.clear()
+        return event
+
+    def commit(self) -> Optional[Event]:
+        """Write all staged changes as one event; returns it, or None if nothing changed."""
+        event = self.event()
+        if event is not None:
+            # append_event also applies the delta to self.session.state
+            self.session_service.append_event(self.session, event)
+        return event
+
+    def rollback(self) -> None:
+        """Drop staged changes that haven't been committed."""
+        self._dirty.clear()
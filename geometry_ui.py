@@ -1,14 +1,150 @@
 import streamlit as st
 import requests
 import re
-import sqlite3
-import json
 import uuid
 import os
+import time
+import logging
+import textwrap
+from contextlib import contextmanager
+
+from requests.adapters import HTTPAdapter
+
+from common.chat_store import ChatStore
+from common.structured_logging import configure_logging, fields
+
+logger = logging.getLogger("geometry_ui")
+
+rerun_started = time.perf_counter()
 
 # Ensure the db directory exists
 os.makedirs("./db", exist_ok=True)
 
+# Messages loaded when a conversation is opened or "Load older" needs more;
+# older ones stay in the database
+HISTORY_PAGE_SIZE = 50
+# Messages rendered on a rerun, and how many more each "Load older" shows
+RENDER_WINDOW = 30
+
+HOST_AGENT_URL = os.environ.get("GEOMETRY_HOST_URL", "http://localhost:8006/run")
+# The host runs each turn as a job (common.async_jobs); the UI submits it and
+# then polls, so no script run waits on the whole agent chain
+HOST_JOBS_URL = os.environ.get("GEOMETRY_HOST_JOBS_URL", HOST_AGENT_URL.rsplit("/", 1)[0] + "/jobs")
+# Seconds the host holds each status poll (one poll per rerun while a turn is pending)
+JOB_POLL_WAIT = float(os.environ.get("UI_JOB_POLL_WAIT", "2"))
+# (connect, read) seconds: a dead host fails fast; submitting and polling never take long
+UI_CONNECT_TIMEOUT = float(os.environ.get("UI_CONNECT_TIMEOUT", "3.05"))
+SUBMIT_TIMEOUT = (UI_CONNECT_TIMEOUT, 10)
+POLL_TIMEOUT = (UI_CONNECT_TIMEOUT, JOB_POLL_WAIT + 10)
+# A turn still unfinished after this many seconds is given up on
+TURN_TIMEOUT = float(os.environ.get("UI_READ_TIMEOUT", "120"))
+# Per-turn timings kept in the browser session
+TIMINGS_KEPT = 50
+
+# Streamlit reruns this script on every interaction; these resources are
+# created once per process and shared by every browser session.
+@st.cache_resource
+def get_http_session():
+    """Keep-alive connection pool to the host agent."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_chat_store():
+    """One WAL-mode connection to the chat database (ChatStore serializes its use across threads)."""
+    return ChatStore("./db/ui_sessions.db")
+
+def load_older(store, user_id):
+    """Show RENDER_WINDOW more messages, fetching the page before the oldest loaded one if needed."""
+    messages = st.session_state.messages
+    hidden_loaded = len(messages) - st.session_state.visible_messages
+    first_seq = messages[0].get("seq") if messages else None
+    if hidden_loaded < RENDER_WINDOW and first_seq is not None and first_seq > 1:
+        older = store.recent(user_id, HISTORY_PAGE_SIZE, before_seq=first_seq)
+        st.session_state.messages = list(reversed(older)) + messages
+    st.session_state.visible_messages += RENDER_WINDOW
+
+def format_response(result, length, width):
+    """The assistant's reply for a host agent result, as the markdown that is stored and shown."""
+    # Format the initial response with placeholders; dedented here, once, so
+    # the stored reply renders as it is on every rerun
+    assistant_response = textwrap.dedent(f"""
+    **Rectangle Calculations:**
+
+    For a rectangle with length {length} and width {width}:
+    """).strip()
+
+    # Extract values from the agent response
+    if isinstance(result, dict):
+        # Check if we have a summary field (from the host agent)
+        if "summary" in result:
+            assistant_response = result.get("summary", "")
+        else:
+            # Check for area and perimeter in the result
+            if "area" in result:
+                area_value = result.get("area")
+                if area_value and area_value != "No area calculation returned.":
+                    assistant_response += f"\nArea: {area_value}"
+
+            if "perimeter" in result:
+                perimeter_value = result.get("perimeter")
+                if perimeter_value and perimeter_value != "No perimeter calculation returned.":
+                    assistant_response += f"\nPerimeter: {perimeter_value}"
+
+            # If we have a result field (from individual agents)
+            if "result" in result and not ("area" in result or "perimeter" in result):
+                result_text = result.get("result", "")
+                assistant_response = result_text
+    return assistant_response
+
+def render_rectangle(length, width):
+    """Display a visual representation of the rectangle."""
+    scale = 30
+    rect_height = min(width * scale, 200)
+    rect_width = min(length * scale, 400)
+    rect_html = f"""
+    <div style="
+        width: {rect_width}px;
+        height: {rect_height}px;
+        background-color: rgba(76, 175, 80, 0.5);
+        border: 3px solid #FF5722;
+        display: flex;
+        align-items: center;
+        justify-content: center;
+        color: black;
+        font-weight: bold;
+        margin: 10px 0;
+    ">
+        {length} × {width}
+    </div>
+    """
+    st.markdown(rect_html, unsafe_allow_html=True)
+
+def poll_job(job_id):
+    """
+    The job's status from the host, held up to JOB_POLL_WAIT seconds for it to finish.
+    Raises on an unknown or expired job (404) as on any other HTTP error.
+    """
+    response = get_http_session().get(
+        f"{HOST_JOBS_URL}/{job_id}", params={"wait": JOB_POLL_WAIT}, timeout=POLL_TIMEOUT
+    )
+    if response.status_code == 404:
+        raise RuntimeError("the host no longer has this request (it expired or the host restarted)")
+    response.raise_for_status()
+    return response.json()
+
+@contextmanager
+def timed(timings, step):
+    """Record how long the block took, in milliseconds, under `step`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[step] = round((time.perf_counter() - started) * 1000, 1)
+
 # Function to get or create a user ID
 def get_user_id():
     if "user_id" not in st.session_state:
@@ -16,75 +152,28 @@ def get_user_id():
         st.session_state.user_id = str(uuid.uuid4())
     return st.session_state.user_id
 
-# Function to load chat history from SQLite
-def load_chat_history(user_id):
-    conn = sqlite3.connect("./db/ui_sessions.db")
-    cursor = conn.cursor()
-    
-    # Create table if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS chat_history (
-        user_id TEXT PRIMARY KEY,
-        messages TEXT,
-        length REAL,
-        width REAL
-    )
-    ''')
-    
-    # Try to load existing history
-    cursor.execute("SELECT messages, length, width FROM chat_history WHERE user_id = ?", (user_id,))
-    result = cursor.fetchone()
-    
-    if result:
-        messages = json.loads(result[0])
-        length = result[1]
-        width = result[2]
-    else:
-        # Default values for new users
-        messages = [
-            {"role": "assistant", "content": "Hello! I'm your geometry assistant. I can help you calculate the area and perimeter of rectangles. Just tell me the dimensions (e.g., 'Calculate the area of a rectangle with length 5 and width 3')."}
-        ]
-        length = 5.0
-        width = 3.0
-        
-        # Insert default values
-        cursor.execute(
-            "INSERT INTO chat_history (user_id, messages, length, width) VALUES (?, ?, ?, ?)",
-            (user_id, json.dumps(messages), length, width)
-        )
-        conn.commit()
-    
-    conn.close()
-    return messages, length, width
-
-# Function to save chat history to SQLite
-def save_chat_history(user_id, messages, length, width):
-    conn = sqlite3.connect("./db/ui_sessions.db")
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "UPDATE chat_history SET messages = ?, length = ?, width = ? WHERE user_id = ?",
-        (json.dumps(messages), length, width, user_id)
-    )
-    
-    conn.commit()
-    conn.close()
-
 # Set up the Streamlit page
 st.set_page_config(page_title="ADK-Powered Geometry Calculator", page_icon="📐")
 st.title("📐 ADK-Powered Geometry Calculator")
 
-# Get user ID and load session data
+configure_logging()
+
+# Get user ID and the chat store (converts an old chat_history table on first use)
 user_id = get_user_id()
-messages, length, width = load_chat_history(user_id)
+store = get_chat_store()
 
-# Initialize session state with loaded values
+# Load the newest page of the conversation once per browser session, not on every rerun
 if "messages" not in st.session_state:
-    st.session_state.messages = messages
-if "length" not in st.session_state:
+    load_timings = {}
+    with timed(load_timings, "history_load_ms"):
+        length, width = store.open_conversation(user_id)
+        st.session_state.messages = list(reversed(store.recent(user_id, HISTORY_PAGE_SIZE)))
     st.session_state.length = length
-if "width" not in st.session_state:
     st.session_state.width = width
+    st.session_state.turn_timings = []
+    st.session_state.visible_messages = RENDER_WINDOW
+    logger.info("conversation opened", extra=fields(event="ui_load", user_id=user_id,
+                                                    messages=len(st.session_state.messages), **load_timings))
 
 # Function to extract dimensions from message
 def extract_dimensions(message):
@@ -115,8 +204,14 @@ def extract_dimensions(message):
     
     return length, width
 
-# Display chat messages
-for message in st.session_state.messages:
+# Display the most recent window of chat messages
+visible = st.session_state.messages[-st.session_state.visible_messages:]
+first_seq = st.session_state.messages[0].get("seq") if st.session_state.messages else None
+# Seqs run 1..n per user, so the stored messages before the loaded ones number first_seq - 1
+hidden = len(st.session_state.messages) - len(visible) + (first_seq - 1 if first_seq else 0)
+if hidden:
+    st.button(f"Load older messages ({hidden} more)", on_click=load_older, args=(store, user_id))
+for message in visible:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
@@ -134,9 +229,17 @@ with st.sidebar:
     # Display user ID (for debugging)
     st.subheader("Session Information")
     st.write(f"User ID: {user_id}")
+    # Filled in at the end of the run, so it covers the whole rerun and any turn made in it
+    timings_display = st.empty()
+
+# A turn submitted as a job on the host and not answered yet
+pending = st.session_state.get("pending_turn")
+
+# Chat input (disabled until the pending turn is answered)
+if prompt := st.chat_input("Ask me about rectangle calculations...", disabled=pending is not None):
+    turn_started = time.perf_counter()
+    timings = {}
 
-# Chat input
-if prompt := st.chat_input("Ask me about rectangle calculations..."):
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": prompt})
     
@@ -152,89 +255,84 @@ if prompt := st.chat_input("Ask me about rectangle calculations..."):
         st.session_state.length = new_length
     if new_width is not None:
         st.session_state.width = new_width
-    
-    # Generate response based on user query
+
+    # Store the prompt (and the dimensions, if they changed) before the answer exists
+    with timed(timings, "prompt_save_ms"):
+        seqs = store.append_turn(user_id, [("user", prompt)], st.session_state.length, st.session_state.width)
+    st.session_state.messages[-1]["seq"] = seqs[0]
+
+    # Submit the turn to the host agent as a job; the answer is polled for below
+    payload = {
+        "request": prompt,
+        "parameters": {
+            "length": st.session_state.length,
+            "width": st.session_state.width
+        }
+    }
+    try:
+        with timed(timings, "submit_ms"):
+            response = get_http_session().post(HOST_JOBS_URL, json=payload, timeout=SUBMIT_TIMEOUT)
+            response.raise_for_status()
+        pending = {"job_id": response.json()["job_id"], "started": turn_started, "timings": timings}
+    except Exception as e:
+        logger.warning("host agent call failed", extra=fields(event="ui_agent_error", user_id=user_id, error=str(e)))
+        pending = {"error": f"Sorry, I encountered an error: {str(e)}", "started": turn_started, "timings": timings}
+    st.session_state.pending_turn = pending
+
+# Wait a little for the pending turn's answer; if it isn't there yet, rerun and ask again
+poll_again = False
+if pending is not None:
+    timings = pending["timings"]
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            # Call the host agent
-            payload = {
-                "request": prompt,
-                "parameters": {
-                    "length": st.session_state.length,
-                    "width": st.session_state.width
-                }
-            }
-            
+        assistant_response = pending.get("error")
+        job = None
+        if assistant_response is None:
             try:
-                response = requests.post("http://localhost:8006/run", json=payload)
-                response.raise_for_status()
-                result = response.json()
-                
-                # Create a visual representation of the rectangle
-                scale = 30
-                rect_height = min(st.session_state.width * scale, 200)
-                rect_width = min(st.session_state.length * scale, 400)
-                
-                # Format the initial response with placeholders
-                assistant_response = f"""
-                **Rectangle Calculations:**
-                
-                For a rectangle with length {st.session_state.length} and width {st.session_state.width}:
-                """
-                
-                # Extract values from the agent response
-                if isinstance(result, dict):
-                    # Check if we have a summary field (from the host agent)
-                    if "summary" in result:
-                        assistant_response = result.get("summary", "")
-                    else:
-                        # Check for area and perimeter in the result
-                        if "area" in result:
-                            area_value = result.get("area")
-                            if area_value and area_value != "No area calculation returned.":
-                                assistant_response += f"\nArea: {area_value}"
-                            
-                        if "perimeter" in result:
-                            perimeter_value = result.get("perimeter")
-                            if perimeter_value and perimeter_value != "No perimeter calculation returned.":
-                                assistant_response += f"\nPerimeter: {perimeter_value}"
-                        
-                        # If we have a result field (from individual agents)
-                        if "result" in result and not ("area" in result or "perimeter" in result):
-                            result_text = result.get("result", "")
-                            assistant_response = result_text
-                
-                st.markdown(assistant_response)
-                
-                # Display rectangle visualization
-                rect_html = f"""
-                <div style="
-                    width: {rect_width}px;
-                    height: {rect_height}px;
-                    background-color: rgba(76, 175, 80, 0.5);
-                    border: 3px solid #FF5722;
-                    display: flex;
-                    align-items: center;
-                    justify-content: center;
-                    color: black;
-                    font-weight: bold;
-                    margin: 10px 0;
-                ">
-                    {st.session_state.length} × {st.session_state.width}
-                </div>
-                """
-                st.markdown(rect_html, unsafe_allow_html=True)
+                with st.spinner("Thinking..."):
+                    job = poll_job(pending["job_id"])
+                if job["status"] == "failed":
+                    raise RuntimeError(job.get("error") or "the request failed")
+                if job["status"] != "done" and time.perf_counter() - pending["started"] > TURN_TIMEOUT:
+                    raise TimeoutError(f"no answer after {TURN_TIMEOUT:.0f} seconds")
             except Exception as e:
+                logger.warning("host agent call failed", extra=fields(event="ui_agent_error", user_id=user_id, error=str(e)))
                 assistant_response = f"Sorry, I encountered an error: {str(e)}"
-                st.error(assistant_response)
-    
-    # Add assistant response to chat history
-    st.session_state.messages.append({"role": "assistant", "content": assistant_response})
-    
-    # Save the updated state to the database
-    save_chat_history(
-        user_id, 
-        st.session_state.messages, 
-        st.session_state.length, 
-        st.session_state.width
-    )
\ No newline at end of file
+
+        if assistant_response is not None:
+            st.error(assistant_response)
+        elif job["status"] == "done":
+            timings["agent_call_ms"] = round((time.perf_counter() - pending["started"]) * 1000, 1)
+            assistant_response = format_response(job["result"], st.session_state.length, st.session_state.width)
+            st.markdown(assistant_response)
+            render_rectangle(st.session_state.length, st.session_state.width)
+        else:
+            st.markdown("_Thinking..._")
+            poll_again = True
+
+    if assistant_response is not None:
+        # Add assistant response to chat history, and store just that message
+        with timed(timings, "save_ms"):
+            seqs = store.append_turn(user_id, [("assistant", assistant_response)])
+        st.session_state.messages.append({"role": "assistant", "content": assistant_response, "seq": seqs[0]})
+        st.session_state.pending_turn = None
+
+        # Record the turn's timings
+        timings["turn_ms"] = round((time.perf_counter() - pending["started"]) * 1000, 1)
+        st.session_state.turn_timings = (st.session_state.turn_timings + [timings])[-TIMINGS_KEPT:]
+        logger.info("turn timings", extra=fields(event="ui_turn", user_id=user_id, **timings))
+
+# Show the latest turn's timings and this rerun's time in the sidebar
+debug_lines = [
+    f"Rerun: {(time.perf_counter() - rerun_started) * 1000:.0f} ms, "
+    f"{len(visible)} of {len(st.session_state.messages)} loaded messages rendered"
+]
+if st.session_state.turn_timings:
+    last = st.session_state.turn_timings[-1]
+    debug_lines.append(
+        "Last turn: " + ", ".join(f"{step.removesuffix('_ms').replace('_', ' ')} {ms:.0f} ms" for step, ms in last.items())
+        + f" ({len(st.session_state.turn_timings)} turns timed)"
+    )
+timings_display.caption("  \n".join(debug_lines))
+
+if poll_again:
+    st.rerun()
@@ -10,7 +10,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from google.adk.agents.llm_agent import LlmAgent
 from google.adk.agents.sequential_agent import SequentialAgent
-from google.adk.sessions import Session, DatabaseSessionService
+from google.adk.sessions import Session
+from common.session_store import create_session_service
+from common.async_session_service import ThreadedSessionService
 from subagents.codewriter.agent import code_writer_agent
 from subagents.codereview.agent import code_reviewer_agent
 from subagents.coderefactor.agent import code_refactorer_agent
@@ -56,7 +58,7 @@ async def main():
   
   # Create a database session service with the SQLite DB file in the current directory
   db_url = "sqlite:///./code_pipeline.db"  # one tiny file next to this script
-  session_service = DatabaseSessionService(db_url=db_url)
+  session_service = ThreadedSessionService(create_session_service(db_url))
   
   runner = Runner(
         agent=root_agent,
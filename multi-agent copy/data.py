@@ -1,61 +1,33 @@
-import sqlite3
-import csv
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.session_export import export_databases
+
 
 def export_db_to_csv(db_path, output_dir="db_exports"):
     """
     Export all tables from a SQLite database to CSV files.
-    
+
+    Rows are streamed in chunks and tables exported concurrently; see
+    common/session_export.py (python -m common.session_export) for Parquet
+    and Arrow output and for exporting several databases at once.
+
     Args:
         db_path: Path to the SQLite database file
         output_dir: Directory to store the CSV files
     """
-    # Create output directory if it doesn't exist
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    # Connect to the database
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Get a list of all tables in the database
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
-    
-    print(f"Found {len(tables)} tables in the database.")
-    
-    # Export each table to a CSV file
-    for table in tables:
-        table_name = table[0]
-        print(f"Exporting table: {table_name}")
-        
-        # Get all data from the table
-        cursor.execute(f"SELECT * FROM {table_name}")
-        rows = cursor.fetchall()
-        
-        # Get column names
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        # Write to CSV
-        output_file = os.path.join(output_dir, f"{table_name}.csv")
-        with open(output_file, 'w', newline='') as csvfile:
-            csv_writer = csv.writer(csvfile)
-            
-            # Write header
-            csv_writer.writerow(columns)
-            
-            # Write data
-            csv_writer.writerows(rows)
-        
-        print(f"Exported {len(rows)} rows to {output_file}")
-    
-    # Close the connection
-    conn.close()
+    results = export_databases([db_path], output_dir, fmt="csv")
+    for result in results:
+        print(f"Exported {result.rows} rows to {result.path}")
     print("Export completed successfully!")
+    return results
+
 
-# Path to your database file
-db_path = "/Users/dmondal/Documents/new-adk/my-project/multi-agent copy/code_pipeline.db"
+if __name__ == "__main__":
+    # Path to your database file (default: the pipeline DB next to this script)
+    db_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_pipeline.db")
 
-# Export the database to CSV
-export_db_to_csv(db_path)
\ No newline at end of file
+    # Export the database to CSV
+    export_db_to_csv(db_path)
@@ -2,6 +2,7 @@ from google.adk.agents.llm_agent import LlmAgent
 from typing import Any, Dict, List, Optional, Sequence
 from google.adk.models.lite_llm import LiteLlm
 from ...callbacks import skip_completed_agent
+from common.stage_cache import lookup_stage_output, store_stage_output
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -30,4 +31,7 @@ Output only the review comments.
     # under the key 'review_comments'.
     output_key="review_comments",
     before_agent_callback=skip_completed_agent,
+    # Outputs for inputs already seen in any session come from the stage cache
+    before_model_callback=lookup_stage_output,
+    after_model_callback=store_stage_output,
 )
\ No newline at end of file
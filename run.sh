@@ -8,6 +8,9 @@ uvicorn agents.area_agent.__main__:app --port 8004 &
 uvicorn agents.perimeter_agent.__main__:app --port 8005 &
 uvicorn agents.geometry_host_agent.__main__:app --port 8006 &
 
+echo "Starting code pipeline job service..."
+uvicorn agents.code_pipeline_agent.__main__:app --port 8007 &
+
 echo "Starting Streamlit UI..."
 streamlit run geometry_ui.py &
 
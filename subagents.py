@@ -1,30 +1,73 @@
 from google.adk.agents.llm_agent import LlmAgent
 from typing import Any, Dict, List, Optional, Sequence
 from google.adk.models.lite_llm import LiteLlm
+from common.blob_store import resolve_blob_refs
+from common.stage_cache import lookup_stage_output, store_stage_output
+from common.diff_refactor import DiffRefactorAgent
+from common.chunked_review import ChunkedReviewAgent
+from common.code_checks import CodeChecker, StaticCheckAgent, skip_if_clean
 import os
 from dotenv import load_dotenv
 load_dotenv()
 os.environ['OPENAI_API_KEY'] = os.environ.get('OPENAI_API_KEY')
 MODEL_GPT_4O = "openai/gpt-4o"
+
+
+def _cached_model_callbacks() -> Dict[str, Any]:
+    """
+    Model callbacks of every LLM stage: a call whose inputs were seen before is
+    answered from the cross-session stage cache; otherwise blob references in
+    state are expanded into the prompt, and the response is cached.
+    """
+    return {
+        "before_model_callback": [lookup_stage_output, resolve_blob_refs],
+        "after_model_callback": store_stage_output,
+    }
+
+
 # Code Writer Agent
-code_writer_agent = LlmAgent(
-    name="code_writer_agent",
-    model = LiteLlm(model=MODEL_GPT_4O, api_key=os.environ.get('OPENAI_API_KEY')),
-    instruction="""You are a Code Writer AI.
+def _code_writer(name: str) -> LlmAgent:
+    return LlmAgent(
+        name=name,
+        model = LiteLlm(model=MODEL_GPT_4O, api_key=os.environ.get('OPENAI_API_KEY')),
+        instruction="""You are a Code Writer AI.
     Based on the user's request, write the initial Python code.
+    The request: {last_query?}
+    {writer_feedback?}
     Output *only* the raw code block.
     """,
-    description="Writes initial code based on a specification.",
-    # Stores its output (the generated code) into the session state
-    # under the key 'generated_code'.
-    output_key="generated_code",
+        description="Writes initial code based on a specification.",
+        # Stores its output (the generated code) into the session state
+        # under the key 'generated_code'.
+        output_key="generated_code",
+        **_cached_model_callbacks(),
+    )
+
+code_writer_agent = _code_writer("code_writer_agent")
+
+# Code Writer with local checks
+# Syntax/lint (and optionally test) checks run on the writer's code before any
+# review; code that fails them goes back to the writer with the findings.
+# Code with at most STATIC_CHECK_CLEAN_MAX_FINDINGS lint findings (default 0,
+# "off" for never) skips the LLM review and refactor stages.
+_clean_max_findings = os.environ.get("STATIC_CHECK_CLEAN_MAX_FINDINGS", "0")
+checked_code_writer_agent = StaticCheckAgent(
+    name="checked_code_writer_agent",
+    writer=_code_writer("code_writer_agent"),
+    checker=CodeChecker(
+        run_tests=os.environ.get("STATIC_CHECK_RUN_TESTS", "0") == "1",
+        clean_max_findings=None if _clean_max_findings == "off" else int(_clean_max_findings),
+    ),
+    max_rewrites=int(os.environ.get("STATIC_CHECK_MAX_REWRITES", "1")),
+    description="Writes code and checks it locally before review.",
 )
 
 # Code Reviewer Agent
-code_reviewer_agent = LlmAgent(
-    name="code_reviewer_agent",
-    model = LiteLlm(model=MODEL_GPT_4O),
-    instruction="""You are a Code Reviewer AI.
+def _code_reviewer(name: str) -> LlmAgent:
+    return LlmAgent(
+        name=name,
+        model = LiteLlm(model=MODEL_GPT_4O),
+        instruction="""You are a Code Reviewer AI.
 
 Review the below Python code.
 
@@ -32,21 +75,111 @@ Review the below Python code.
 {generated_code}
 ```
 
+Local static analysis of this code reported:
+
+{static_findings?}
+
 Provide constructive feedback on potential errors, style issues, or improvements.
 Focus on clarity and correctness.
 Output only the review comments.
 
     """,
-    description="Reviews code and provides feedback.",
-    # Stores its output (the review comments) into the session state
-    # under the key 'review_comments'.
-    output_key="review_comments",
+        description="Reviews code and provides feedback.",
+        # Stores its output (the review comments) into the session state
+        # under the key 'review_comments'.
+        output_key="review_comments",
+        # Skipped when the local checks found nothing to review
+        before_agent_callback=skip_if_clean,
+        **_cached_model_callbacks(),
+    )
+
+code_reviewer_agent = _code_reviewer("code_reviewer_agent")
+
+# Reviews one chunk of a large file. Runs in a private session that holds
+# only the chunk, so its output_key is never written to the pipeline state.
+code_chunk_reviewer_agent = LlmAgent(
+    name="code_chunk_reviewer_agent",
+    model = LiteLlm(model=MODEL_GPT_4O),
+    instruction="""You are a Code Reviewer AI.
+
+Below is one part of a larger Python file: {review_chunk_name}.
+
+```
+{review_chunk}
+```
+
+The rest of the file defines:
+
+```
+{review_outline}
+```
+
+Local static analysis reported for this part:
+
+{review_chunk_findings?}
+
+Review only this part. Provide constructive feedback on potential errors,
+style issues, or improvements. Focus on clarity and correctness.
+Output one comment per line, each starting with "- " and naming the function
+or line it is about, or "No issues." if there are none.
+    """,
+    description="Reviews one chunk of a large file.",
+    output_key="chunk_review",
+    # Served from the stage cache when the chunk was seen before, so an edit
+    # to one function re-reviews only that function's chunk
+    **_cached_model_callbacks(),
+)
+
+# Reviewer for the job service: large files are reviewed chunk by chunk in
+# parallel, small ones in one call.
+code_chunked_reviewer_agent = ChunkedReviewAgent(
+    name="code_chunked_reviewer_agent",
+    chunk_reviewer=code_chunk_reviewer_agent,
+    whole_reviewer=_code_reviewer("code_whole_reviewer_agent"),
+    min_chunked_lines=int(os.environ.get("REVIEW_CHUNKED_MIN_LINES", "200")),
+    max_parallel=int(os.environ.get("REVIEW_MAX_PARALLEL", "8")),
+    description="Reviews code, chunk by chunk in parallel for large files.",
+    before_agent_callback=skip_if_clean,
 )
 
 # Code Refactorer Agent
 # Takes the original code and the review comments (read from state) and refactors the code.
-code_refactorer_agent = LlmAgent(
-    name="code_refactorer_agent",
+def _full_refactorer(name: str) -> LlmAgent:
+    return LlmAgent(
+        name=name,
+        model = LiteLlm(model=MODEL_GPT_4O),
+        instruction="""You are a Code Refactorer AI.
+
+Below is the original Python code:
+
+```
+{generated_code}
+```
+
+Below are the review comments:
+
+{review_comments}
+
+Refactor the code based on the provided feedback.
+
+Output *only* the final, refactored code block.
+    """,
+        description="Refactors code based on review comments.",
+        # Stores its output (the refactored code) into the session state
+        # under the key 'refactored_code'.
+        output_key="refactored_code",
+        # Skipped, passing the code through, when the local checks found nothing
+        before_agent_callback=skip_if_clean,
+        **_cached_model_callbacks(),
+    )
+
+code_refactorer_agent = _full_refactorer("code_refactorer_agent")
+
+# Diff-based Code Refactorer
+# For large files the model writes only the edits the review asks for; they
+# are applied locally, with a full rewrite as the fallback.
+code_edit_agent = LlmAgent(
+    name="code_edit_agent",
     model = LiteLlm(model=MODEL_GPT_4O),
     instruction="""You are a Code Refactorer AI.
 
@@ -60,12 +193,107 @@ Below are the review comments:
 
 {review_comments}
 
+Apply the feedback as a list of edits to the original code. Do not rewrite
+the whole file. Write each edit as:
+
+<<<<<<< SEARCH
+exact lines copied from the original code
+=======
+the lines that replace them
+>>>>>>> REPLACE
+
+Each SEARCH block must match the original code exactly, including
+indentation, and occur only once in it; include neighbouring lines if needed
+to make it unique. To insert code, search for the line it follows and repeat
+that line in the replacement. Edits are applied in order.
+
+If no changes are needed, output only NO CHANGES.
+Output *only* the edit blocks.
+    """,
+    description="Writes the edits that address the review comments.",
+    output_key="refactor_edits",
+    **_cached_model_callbacks(),
+)
+
+code_diff_refactorer_agent = DiffRefactorAgent(
+    name="code_diff_refactorer_agent",
+    edit_agent=code_edit_agent,
+    rewrite_agent=_full_refactorer("code_rewrite_refactorer_agent"),
+    description="Refactors code based on review comments, as edits for large files.",
+    # Shorter files are rewritten in full
+    min_diff_chars=int(os.environ.get("REFACTOR_DIFF_MIN_CHARS", "2000")),
+    # Skipped, passing the code through, when the local checks found nothing
+    before_agent_callback=skip_if_clean,
+)
+
+# Specialised reviewers. They only read 'generated_code', so the DAG pipeline
+# in agent.py runs all three at the same time.
+def _focused_reviewer(name: str, focus: str, output_key: str) -> LlmAgent:
+    return LlmAgent(
+        name=name,
+        model = LiteLlm(model=MODEL_GPT_4O),
+        instruction=f"""You are a Code Reviewer AI focused on {focus}.
+
+Review the below Python code.
+
+```
+{{generated_code}}
+```
+
+Local static analysis of this code reported:
+
+{{static_findings?}}
+
+Only comment on {focus}; other reviewers cover everything else.
+Output only the review comments, or "No issues." if there are none.
+    """,
+        description=f"Reviews code for {focus}.",
+        output_key=output_key,
+        # Skipped when the local checks found nothing to review
+        before_agent_callback=skip_if_clean,
+        **_cached_model_callbacks(),
+    )
+
+style_reviewer_agent = _focused_reviewer(
+    "style_reviewer_agent", "style, naming and readability", "style_review"
+)
+security_reviewer_agent = _focused_reviewer(
+    "security_reviewer_agent", "security issues such as injection and unsafe input handling", "security_review"
+)
+performance_reviewer_agent = _focused_reviewer(
+    "performance_reviewer_agent", "performance: algorithmic complexity, needless work and memory use", "performance_review"
+)
+
+# Refactorer that merges the three focused reviews
+code_panel_refactorer_agent = LlmAgent(
+    name="code_panel_refactorer_agent",
+    model = LiteLlm(model=MODEL_GPT_4O),
+    instruction="""You are a Code Refactorer AI.
+
+Below is the original Python code:
+
+```
+{generated_code}
+```
+
+Below are the review comments.
+
+Style:
+{style_review}
+
+Security:
+{security_review}
+
+Performance:
+{performance_review}
+
 Refactor the code based on the provided feedback.
 
 Output *only* the final, refactored code block.
     """,
-    description="Refactors code based on review comments.",
-    # Stores its output (the refactored code) into the session state
-    # under the key 'refactored_code'.
+    description="Refactors code based on the style, security and performance reviews.",
     output_key="refactored_code",
+    # Skipped, passing the code through, when the local checks found nothing
+    before_agent_callback=skip_if_clean,
+    **_cached_model_callbacks(),
 )
@@ -3,7 +3,6 @@ import os
 import asyncio
 from google.adk.agents import Agent
 from google.adk.models.lite_llm import LiteLlm # For multi-model support
-from google.adk.sessions import DatabaseSessionService
 from google.adk.runners import Runner
 from google.genai import types # For creating message Content/Parts
 
@@ -67,12 +66,12 @@ print(f"Agent '{weather_agent.name}' created using model.")
 
 # --- Session Management ---
 # Key Concept: SessionService stores conversation history & state.
-# Using DatabaseSessionService with SQLite for persistent storage
-from google.adk.sessions import DatabaseSessionService
+# Using DatabaseSessionService with tuned SQLite (WAL, pooled, indexed) for persistent storage
+from common.session_store import create_session_service
 
 # Create a SQLite database file in the current directory
 db_url = "sqlite:///./weather_agent.db"
-session_service = DatabaseSessionService(db_url=db_url)
+session_service = create_session_service(db_url)
 
 # Define constants for identifying the interaction context
 APP_NAME = "weather_tutorial_app"
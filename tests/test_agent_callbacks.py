@@ -0,0 +1,66 @@
+"""The compiled callback chain: request stamping in skip_completed and the debug_state level check."""
+import logging
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.genai import types
+
+from common.agent_callbacks import (
+    REQUEST_KEY_SUFFIX, CallbackChain, CallbackMetrics, debug_state, logger, request_digest, skip_completed,
+)
+
+WRITER = SimpleNamespace(name="writer", output_key="generated_code")
+ROUTER = SimpleNamespace(name="router", output_key=None)
+
+
+def context(agent, state, request):
+    return SimpleNamespace(
+        _invocation_context=SimpleNamespace(agent=agent), state=state,
+        user_content=types.Content(role="user", parts=[types.Part(text=request)]),
+    )
+
+
+def test_an_output_is_reused_only_for_the_request_it_answers():
+    metrics = CallbackMetrics()
+    chain = CallbackChain(skip_completed, metrics=metrics)
+    state = {}
+    request_key = "generated_code" + REQUEST_KEY_SUFFIX
+
+    # First run of a request: stamped, not skipped
+    assert chain(context(WRITER, state, "area")) is None
+    assert state == {request_key: request_digest(types.Content(parts=[types.Part(text="area")]))}
+    state["generated_code"] = "def area(): ..."
+
+    # The same request again resumes with the saved output
+    skipped = chain(context(WRITER, state, "area"))
+    assert skipped.role == "model" and skipped.parts[0].text == "def area(): ..."
+
+    # A new request clears the old output and runs the agent
+    assert chain(context(WRITER, state, "perimeter")) is None
+    assert state["generated_code"] is None and state[request_key] == request_digest(
+        types.Content(parts=[types.Part(text="perimeter")])
+    )
+    # ...and if that run failed before writing its output, resending it still runs the agent
+    assert chain(context(WRITER, state, "perimeter")) is None
+
+    # Agents without an output_key have nothing to skip
+    assert chain.compile(ROUTER) == ()
+    assert chain(context(ROUTER, {}, "area")) is None
+    assert metrics.report()["writer"]["calls"] == 4 and metrics.report()["writer"]["skips"] == 1
+
+
+def test_debug_state_follows_the_current_log_level(caplog, monkeypatch):
+    monkeypatch.delenv("ADK_DEBUG_CTX", raising=False)
+    chain = CallbackChain(debug_state)
+    state = {"generated_code": "x = 1"}
+    with caplog.at_level(logging.DEBUG, logger=logger.name):
+        logger.setLevel(logging.INFO)
+        chain(context(WRITER, state, "area"))
+        assert caplog.messages == []
+        # Compiled while DEBUG was off; turning it on later takes effect
+        logger.setLevel(logging.DEBUG)
+        chain(context(WRITER, state, "area"))
+    assert caplog.messages == ["[writer] state: {'generated_code': 5}"]
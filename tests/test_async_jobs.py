@@ -0,0 +1,107 @@
+"""The /jobs API of create_app, driven through httpx's ASGI transport with a stub agent."""
+import asyncio
+import os
+import sys
+
+import httpx
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.a2a_server import create_app
+
+
+class StubAgent:
+    """Echoes its payload; payloads with "hold" wait for `release`, "fail" raises."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def execute(self, payload):
+        if payload.get("hold"):
+            await self.release.wait()
+        if payload.get("fail"):
+            raise ValueError(payload["fail"])
+        return {"echo": payload}
+
+
+def run_with_client(test, **job_options):
+    agent = StubAgent()
+    app = create_app(agent, async_jobs=True, **job_options)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://jobs") as client:
+            await test(client, agent)
+
+    asyncio.run(run())
+
+
+def test_a_job_is_accepted_and_its_result_long_polled():
+    async def test(client, agent):
+        response = await client.post("/jobs", json={"hold": True, "n": 1})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.headers["location"] == f"/jobs/{job_id}"
+
+        # Not finished: the result isn't there yet
+        response = await client.get(f"/jobs/{job_id}/result")
+        assert response.status_code == 202 and response.json()["status"] in ("queued", "running")
+
+        asyncio.get_running_loop().call_later(0.05, agent.release.set)
+        status = (await client.get(f"/jobs/{job_id}", params={"wait": 5})).json()
+        assert status["status"] == "done" and status["result"] == {"echo": {"hold": True, "n": 1}}
+        response = await client.get(f"/jobs/{job_id}/result")
+        assert response.status_code == 200 and response.json() == {"echo": {"hold": True, "n": 1}}
+
+    run_with_client(test)
+
+
+def test_a_failed_job_reports_its_error():
+    async def test(client, agent):
+        job_id = (await client.post("/jobs", json={"fail": "no rectangle"})).json()["job_id"]
+        response = await client.get(f"/jobs/{job_id}/result", params={"wait": 5})
+        assert response.status_code == 500
+        assert response.json() == {"error": "no rectangle", "job_id": job_id}
+        assert (await client.get(f"/jobs/{job_id}")).json()["error"] == "no rectangle"
+
+    run_with_client(test)
+
+
+def test_a_full_store_evicts_finished_jobs_and_refuses_when_all_are_active():
+    async def test(client, agent):
+        finished = (await client.post("/jobs", json={})).json()["job_id"]
+        assert (await client.get(f"/jobs/{finished}", params={"wait": 5})).json()["status"] == "done"
+        held = (await client.post("/jobs", json={"hold": True})).json()["job_id"]
+
+        # The finished job makes room for a new one
+        assert (await client.post("/jobs", json={"hold": True})).status_code == 202
+        assert (await client.get(f"/jobs/{finished}")).status_code == 404
+
+        response = await client.post("/jobs", json={})
+        assert response.status_code == 503 and response.headers["retry-after"] == "5"
+
+        agent.release.set()
+        assert (await client.get(f"/jobs/{held}", params={"wait": 5})).json()["status"] == "done"
+
+    run_with_client(test, max_jobs=2)
+
+
+def test_finished_jobs_expire():
+    async def test(client, agent):
+        job_id = (await client.post("/jobs", json={})).json()["job_id"]
+        assert (await client.get(f"/jobs/{job_id}", params={"wait": 5})).status_code == 200
+        await asyncio.sleep(0.1)
+        assert (await client.get(f"/jobs/{job_id}")).status_code == 404
+        assert (await client.get("/jobs/no-such-job/result")).status_code == 404
+
+    run_with_client(test, result_ttl=0.05)
+
+
+def test_shutdown_cancels_active_jobs():
+    app = create_app(StubAgent(), async_jobs=True)
+    with TestClient(app) as client:
+        job_id = client.post("/jobs", json={"hold": True}).json()["job_id"]
+        job = app.state.job_store.get(job_id)
+        assert job.status in ("queued", "running")
+    assert job.status == "failed" and job.error == "cancelled"
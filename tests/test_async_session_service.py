@@ -0,0 +1,112 @@
+"""ThreadedSessionService over a real SQLite session store: concurrent turns on one session."""
+import asyncio
+import os
+import sys
+from typing import AsyncGenerator
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event, EventActions
+from google.adk.runners import Runner
+from google.genai import types
+
+from common.async_session_service import SessionWriteError, ThreadedSessionService
+from common.session_store import create_session_service
+
+APP, USER, SESSION = "app", "user", "shared"
+
+
+class CountingAgent(BaseAgent):
+    """Reads `count` from state, waits a little, and writes count + 1."""
+
+    async def _run_async_impl(self, ctx) -> AsyncGenerator[Event, None]:
+        count = ctx.session.state.get("count", 0)
+        await asyncio.sleep(0.005)
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            content=types.Content(role="model", parts=[types.Part(text=str(count + 1))]),
+            actions=EventActions(state_delta={"count": count + 1}),
+        )
+
+
+def make_service(tmp_path):
+    return ThreadedSessionService(create_session_service(f"sqlite:///{tmp_path / 'sessions.db'}"))
+
+
+async def one_turn(service, runner, text):
+    async with service.turn(app_name=APP, user_id=USER, session_id=SESSION):
+        async for _ in runner.run_async(
+            user_id=USER, session_id=SESSION,
+            new_message=types.Content(role="user", parts=[types.Part(text=text)]),
+        ):
+            pass
+
+
+def test_concurrent_turns_on_one_session_all_persist(tmp_path):
+    service = make_service(tmp_path)
+    runner = Runner(agent=CountingAgent(name="counter"), app_name=APP, session_service=service)
+
+    def blocking_call(*args, **kwargs):
+        raise AssertionError("the Runner's get_session blocked on the writer thread")
+
+    async def run():
+        service._call = blocking_call
+        await asyncio.gather(*(one_turn(service, runner, f"turn {i}") for i in range(20)))
+        await service.flush()
+
+    asyncio.run(run())
+    stored = service.backend.get_session(app_name=APP, user_id=USER, session_id=SESSION)
+    service.close()
+    # Every turn saw the previous one's state, and none of the appends was rejected as stale
+    assert stored.state["count"] == 20
+    assert len(stored.events) == 40
+    assert not service._pinned and not service._turns
+
+
+def test_appends_to_a_stale_copy_are_reported(tmp_path):
+    service = make_service(tmp_path)
+
+    async def run():
+        await service.ensure_session(app_name=APP, user_id=USER, session_id=SESSION, pin=False)
+        first = await service.get_session_async(pin=False, app_name=APP, user_id=USER, session_id=SESSION)
+        second = await service.get_session_async(pin=False, app_name=APP, user_id=USER, session_id=SESSION)
+        service.append_event(first, Event(author="a", actions=EventActions(state_delta={"x": 1})))
+        await asyncio.sleep(1.1)  # ADK stores update_time with one-second resolution
+        service.append_event(first, Event(author="a", actions=EventActions(state_delta={"x": 2})))
+        service.append_event(second, Event(author="b", actions=EventActions(state_delta={"x": 3})))
+        with pytest.raises(SessionWriteError) as raised:
+            await service.flush()
+        return raised.value
+
+    error = asyncio.run(run())
+    service.close()
+    assert [event.author for _, event, _ in error.failed] == ["b"]
+
+
+def test_turn_retries_writes_that_failed_in_an_earlier_turn(tmp_path):
+    service = make_service(tmp_path)
+    runner = Runner(agent=CountingAgent(name="counter"), app_name=APP, session_service=service)
+    backend_append = service.backend.append_event
+    failures = iter([True])
+
+    def flaky_append(session, event):
+        if event.author == "counter" and next(failures, False):
+            raise RuntimeError("disk I/O error")
+        return backend_append(session=session, event=event)
+
+    service.backend.append_event = flaky_append
+
+    async def run():
+        await one_turn(service, runner, "first")
+        await one_turn(service, runner, "second")
+        await service.flush()
+
+    asyncio.run(run())
+    stored = service.backend.get_session(app_name=APP, user_id=USER, session_id=SESSION)
+    service.close()
+    assert stored.state["count"] == 2
+    assert [event.author for event in stored.events] == ["user", "counter", "user", "counter"]
@@ -0,0 +1,65 @@
+"""run_batch end to end over a SQLite session store, with stub stages instead of LLM agents."""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.code_pipeline_agent.batch import run_batch
+from test_job_queue import ReadingStage
+
+
+def stages():
+    return [
+        ReadingStage(name="writer", output_key="generated_code"),
+        ReadingStage(name="reviewer", output_key="review_comments", reads=["generated_code"]),
+        ReadingStage(name="refactorer", output_key="refactored_code", reads=["generated_code", "review_comments"]),
+    ]
+
+
+def write_specs(path, items):
+    path.write_text("".join(json.dumps(item) + "\n" for item in items), encoding="utf-8")
+
+
+def read_results(path):
+    return {record["id"]: record for record in map(json.loads, path.read_text(encoding="utf-8").splitlines())}
+
+
+def test_each_item_runs_its_stages_on_the_earlier_outputs(tmp_path):
+    specs, output = tmp_path / "specs.jsonl", tmp_path / "results.jsonl"
+    write_specs(specs, [{"id": f"item{i}", "spec": f"spec {i}", "user_id": f"user{i % 3}"} for i in range(12)])
+
+    progress = asyncio.run(run_batch(
+        str(specs), str(output), str(tmp_path / "batch.db"), concurrency=3, stages=stages(),
+    ))
+
+    assert (progress.done, progress.failed) == (12, 0)
+    results = read_results(output)
+    assert len(results) == 12
+    for i in range(12):
+        result = results[f"item{i}"]
+        assert result["status"] == "done"
+        outputs = result["outputs"]
+        writer, reviewer, refactorer = outputs["generated_code"], outputs["review_comments"], outputs["refactored_code"]
+        assert writer["spec"] == f"spec {i}"
+        assert reviewer["seen"] == {"generated_code": writer}
+        assert refactorer["seen"] == {"generated_code": writer, "review_comments": reviewer}
+
+    # A re-run skips every item already in the output file
+    progress = asyncio.run(run_batch(
+        str(specs), str(output), str(tmp_path / "batch.db"), concurrency=3, stages=stages(),
+    ))
+    assert progress.total == 0 and len(read_results(output)) == 12
+
+
+def test_duplicate_ids_are_rejected_before_anything_runs(tmp_path):
+    specs, output = tmp_path / "specs.jsonl", tmp_path / "results.jsonl"
+    write_specs(specs, [{"id": "a", "spec": "one"}, {"id": "b", "spec": "two"}, {"id": "a", "spec": "three"}])
+
+    with pytest.raises(ValueError, match="Duplicate item ids .*: a"):
+        asyncio.run(run_batch(str(specs), str(output), str(tmp_path / "batch.db"), stages=stages()))
+    assert not output.exists()
+    assert not (tmp_path / "batch.db").exists()
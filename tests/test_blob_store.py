@@ -0,0 +1,104 @@
+"""BlobStore and BlobOffloadingSessionService over a temporary blob root and SQLite session store."""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event, EventActions
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from common import blob_store as blob_store_module
+from common.blob_store import (
+    BlobOffloadingSessionService,
+    BlobStore,
+    MissingBlobError,
+    is_blob_ref,
+    resolve_blob_refs,
+)
+from common.session_dbs import connect
+from common.session_maintenance import blob_references
+from common.session_store import create_session_service
+
+BIG = "def f():\n    return 1\n" * 100
+
+
+def blob_files(root):
+    return sorted(name for _, _, names in os.walk(root) for name in names)
+
+
+def test_equal_values_are_stored_once(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    ref = store.put(BIG)
+    assert is_blob_ref(ref) and store.put(BIG) == ref
+    assert len(blob_files(store.root)) == 1
+    # A fresh store reads it from disk rather than from the cache
+    assert BlobStore(store.root).get(ref) == BIG
+
+
+def test_offload_keeps_small_values_and_references_inline(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"), min_size=10)
+    ref = store.offload("x" * 10)
+    assert is_blob_ref(ref)
+    assert store.offload(ref) == ref
+    assert store.offload("short") == "short" and store.offload(42) == 42
+    assert store.resolve(ref) == "x" * 10 and store.resolve("short") == "short"
+    assert store.resolve_text(f"before {ref} after") == f"before {'x' * 10} after"
+
+
+def test_sweep_removes_unreferenced_blobs_and_get_reports_them(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    kept, swept = store.put(BIG), store.put(BIG + "# changed\n")
+    assert store.sweep({kept.split(":")[-1]}, min_age=3600) == (0, 0)  # too young
+    files, size = store.sweep({kept.split(":")[-1]}, min_age=0)
+    assert files == 1 and size > 0
+    assert store.get(kept) == BIG
+    with pytest.raises(MissingBlobError, match="swept"):
+        store.get(swept)
+    with pytest.raises(ValueError):
+        store.get("not a reference")
+
+
+def test_service_offloads_state_and_event_text_but_yields_the_full_event(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    store = BlobStore(str(tmp_path / "blobs"))
+    service = BlobOffloadingSessionService(create_session_service(f"sqlite:///{db_path}"), store)
+    session = service.create_session(app_name="app", user_id="u", session_id="s")
+    event = Event(
+        author="writer",
+        content=types.Content(role="model", parts=[types.Part(text=BIG)]),
+        actions=EventActions(state_delta={"generated_code": BIG, "note": "short"}),
+    )
+    returned = service.append_event(session, event)
+
+    assert returned is event and event.content.parts[0].text == BIG
+    stored = service.get_session(app_name="app", user_id="u", session_id="s")
+    ref = stored.state["generated_code"]
+    assert is_blob_ref(ref) and stored.state["note"] == "short"
+    # The event text and the state value are the same blob
+    assert stored.events[-1].content.parts[0].text == ref
+    assert len(blob_files(store.root)) == 1
+
+    conn = connect(db_path, readonly=True)
+    try:
+        assert blob_references(conn) == {ref.split(":")[-1]}
+    finally:
+        conn.close()
+    with sqlite3.connect(db_path) as raw:
+        assert all(BIG not in (row[0] or "") for row in raw.execute("SELECT content FROM events"))
+
+
+def test_model_callback_expands_references_in_instruction_and_history(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(blob_store_module, "default_blob_store", store)
+    ref = store.put(BIG)
+    request = LlmRequest(
+        contents=[types.Content(role="model", parts=[types.Part(text=ref)])],
+        config=types.GenerateContentConfig(system_instruction=f"Review this:\n{ref}"),
+    )
+    assert resolve_blob_refs(None, request) is None
+    assert request.config.system_instruction == f"Review this:\n{BIG}"
+    assert request.contents[0].parts[0].text == BIG
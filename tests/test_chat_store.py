@@ -0,0 +1,81 @@
+"""ChatStore and the chat_history migration on temporary UI databases."""
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.chat_store import DEFAULT_DIMENSIONS, GREETING, SCHEMA, ChatStore, migrate_chat_history
+from session import check_ui_sessions_db
+
+
+def legacy_db(path, rows):
+    """A UI database in the old format: one JSON array of messages per user."""
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE chat_history (user_id TEXT PRIMARY KEY, messages TEXT, length REAL, width REAL)")
+        conn.executemany("INSERT INTO chat_history VALUES (?, ?, ?, ?)", rows)
+    return str(path)
+
+
+def messages(conn, user_id):
+    return conn.execute(
+        "SELECT seq, role, content FROM chat_messages WHERE user_id = ? ORDER BY seq", (user_id,)
+    ).fetchall()
+
+
+def test_migration_converts_every_user_and_drops_the_old_table(tmp_path):
+    history = [{"role": "assistant", "content": "hi"}, "not a message", {"role": "user", "content": "area 2x3"}]
+    db_path = legacy_db(tmp_path / "ui.db", [
+        ("alice", json.dumps(history), 2.0, 3.0),
+        ("bob", "{broken json", None, None),
+        ("carol", json.dumps([{"role": "user", "content": "old"}]), 1.0, 1.0),
+    ])
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    # carol already has rows in the new tables: those win
+    conn.execute("INSERT INTO chat_users VALUES ('carol', 9.0, 9.0, 0)")
+    conn.execute("INSERT INTO chat_messages VALUES ('carol', 1, 'user', 'new', 0)")
+
+    assert migrate_chat_history(conn) == 2
+    assert messages(conn, "alice") == [(1, "assistant", "hi"), (2, "user", "area 2x3")]
+    assert messages(conn, "bob") == []  # unreadable history, but the user is kept
+    assert messages(conn, "carol") == [(1, "user", "new")]
+    users = dict((row[0], row[1:]) for row in conn.execute("SELECT user_id, length, width FROM chat_users"))
+    assert users == {"alice": (2.0, 3.0), "bob": DEFAULT_DIMENSIONS, "carol": (9.0, 9.0)}
+    assert "chat_history" not in {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+
+    # A second run finds nothing to do
+    assert migrate_chat_history(conn) == 0
+    assert len(messages(conn, "alice")) == 2
+    conn.close()
+
+
+def test_turns_are_appended_and_read_back_a_page_at_a_time(tmp_path):
+    store = ChatStore(str(tmp_path / "ui.db"))
+    assert store.open_conversation("alice") == DEFAULT_DIMENSIONS
+    assert store.append_turn("alice", [("user", "q1"), ("assistant", "a1")], length=4.0, width=2.0) == [2, 3]
+    store.append_turn("alice", [("user", "q2"), ("assistant", "a2")])
+    store.append_turn("bob", [("user", "other user")])
+    assert store.open_conversation("alice") == (4.0, 2.0)
+
+    first = store.recent("alice", limit=2)
+    assert [m["content"] for m in first] == ["a2", "q2"]
+    second = store.recent("alice", limit=2, before_seq=first[-1]["seq"])
+    assert [m["content"] for m in second] == ["a1", "q1"]
+    last = store.recent("alice", limit=2, before_seq=second[-1]["seq"])
+    assert [m["content"] for m in last] == [GREETING]
+    assert store.recent("alice", limit=2, before_seq=last[-1]["seq"]) == []
+    store.close()
+
+
+def test_check_ui_sessions_db_migrates_an_old_database_first(tmp_path, capsys):
+    db_path = legacy_db(tmp_path / "ui.db", [("alice", json.dumps([{"role": "user", "content": "hello"}]), 1.0, 1.0)])
+    check_ui_sessions_db(db_path)
+    out = capsys.readouterr().out
+    assert "user_id=alice" in out and "content=hello" in out
+
+    check_ui_sessions_db(str(tmp_path / "missing.db"))
+    assert "No UI chat database" in capsys.readouterr().out
+    assert not (tmp_path / "missing.db").exists()
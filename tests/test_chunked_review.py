@@ -0,0 +1,118 @@
+"""Chunking, comment merging and a ChunkedReviewAgent run with stub reviewers."""
+import asyncio
+import os
+import sys
+from typing import AsyncGenerator
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from common.chunked_review import ChunkReview, ChunkedReviewAgent, fence_offset, merge_reviews, split_code
+
+SOURCE = '''import os
+
+
+def first():
+    return 1
+
+
+def second():
+    return 2
+# trailing comment
+'''
+
+
+def big_class(methods=4, body_lines=3):
+    lines = ["class Big:", '    """Docstring."""', ""]
+    for index in range(methods):
+        lines.append(f"    def method{index}(self):")
+        lines += [f"        x = {n}" for n in range(body_lines)]
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def test_definitions_are_grouped_and_trailing_lines_kept():
+    chunks = split_code(SOURCE, target_lines=4)
+    assert [(c.name, c.start, c.end) for c in chunks] == [
+        ("module code", 1, 1), ("first", 2, 5), ("second", 6, 10),
+    ]
+    assert chunks[-1].text.endswith("# trailing comment")
+    # Grouped into one chunk when they fit
+    assert [(c.name, c.start, c.end) for c in split_code(SOURCE, target_lines=100)] == [
+        ("module code, first, second", 1, 10),
+    ]
+
+
+def test_large_classes_are_split_per_method():
+    code = big_class()
+    chunks = split_code(code, target_lines=1, max_lines=10)
+    assert [c.name for c in chunks] == ["class Big", "Big.method0", "Big.method1", "Big.method2", "Big.method3"]
+    assert chunks[0].text.startswith("class Big:")
+    assert all(later.start == earlier.end + 1 for earlier, later in zip(chunks, chunks[1:]))
+    assert chunks[-1].end == len(code.splitlines())
+
+
+def test_code_that_does_not_parse_is_one_chunk():
+    (chunk,) = split_code("def broken(:\n    pass\n", first_line=2)
+    assert (chunk.name, chunk.start, chunk.end) == ("whole file", 2, 3)
+
+
+def test_fence_offset_matches_strip_code_fences():
+    assert fence_offset(SOURCE) == 0
+    assert fence_offset(f"```python\n{SOURCE}```") == 1
+    assert fence_offset(f"\n\n```\n{SOURCE}```") == 3
+
+
+def test_a_comment_repeated_across_chunks_is_listed_once():
+    merged = merge_reviews([
+        ChunkReview(chunk="first", start=2, end=5, comments=["Add type hints (line 4)", "Return a constant"]),
+        ChunkReview(chunk="second", start=6, end=10, comments=["Add type hints, line 7"]),
+    ])
+    assert merged.count("Add type hints") == 1
+    assert "## Applies to several parts of the file\n- Add type hints (line 4) (lines 2-5, 6-10)" in merged
+    assert "## first (lines 2-5)\n- Return a constant" in merged
+    assert "## second" not in merged
+    assert merge_reviews([ChunkReview(chunk="x", start=1, end=2)]) == "No issues found."
+
+
+class EchoReviewer(BaseAgent):
+    """Comments on the chunk it was given, quoting its static findings."""
+
+    async def _run_async_impl(self, ctx) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        text = f"- Check {state['review_chunk_name']}: {state['review_chunk_findings'] or 'no findings'}"
+        yield Event(author=self.name, invocation_id=ctx.invocation_id,
+                    content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def test_review_line_ranges_refer_to_the_fenced_code():
+    fenced = f"```python\n{SOURCE}```"
+    agent = ChunkedReviewAgent(
+        name="reviewer", chunk_reviewer=EchoReviewer(name="chunk"), whole_reviewer=EchoReviewer(name="whole"),
+        min_chunked_lines=1, target_chunk_lines=4,
+    )
+    service = InMemorySessionService()
+    service.create_session(app_name="app", user_id="u", session_id="s", state={
+        "generated_code": fenced,
+        # CodeChecker numbers the lines of the unfenced code: "return 2" is line 9
+        "static_findings": "line 9: something about second()",
+    })
+
+    async def run():
+        async for _ in Runner(agent=agent, app_name="app", session_service=service).run_async(
+            user_id="u", session_id="s", new_message=types.Content(role="user", parts=[types.Part(text="review")]),
+        ):
+            pass
+
+    asyncio.run(run())
+    review = service.get_session(app_name="app", user_id="u", session_id="s").state["review_comments"]
+    fenced_lines = fenced.splitlines()
+    assert fenced_lines[9] == "    return 2"  # line 10 of what the refactorer reads
+    assert "## second (lines 7-11)" in review
+    assert "Check second (lines 7-11): line 10: something about second()" in review
+    assert "## first (lines 3-6)" in review and "Check first (lines 3-6): no findings" in review
@@ -0,0 +1,123 @@
+"""CodeChecker verdicts and lint, and StaticCheckAgent's rewrite loop with a stub writer."""
+import ast
+import asyncio
+import os
+import sys
+from typing import AsyncGenerator, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event, EventActions
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from common.code_checks import (
+    FINDINGS_KEY, VERDICT_KEY, WRITER_FEEDBACK_KEY, CodeChecker, StaticCheckAgent, _LintVisitor,
+)
+
+CLEAN = '''def area(length, width):
+    """Area of a rectangle."""
+    if length < 0 or width < 0:
+        raise ValueError("negative side")
+    return length * width
+'''
+
+# Two findings: a bare except and a comparison to None
+SLOPPY = '''def area(length, width):
+    try:
+        if length == None:
+            return 0
+        return length * width
+    except:
+        return 0
+'''
+
+
+def check(code, **options):
+    return asyncio.run(CodeChecker(**options).check(code))
+
+
+def test_verdict_follows_the_clean_threshold():
+    assert check(f"```python\n{CLEAN}```").verdict == "clean"
+    assert check("def area(:\n    pass\n").verdict == "broken"
+    sloppy = check(SLOPPY)
+    assert len(sloppy.lint) == 2 and sloppy.verdict == "review"
+    assert check(SLOPPY, clean_max_findings=2).verdict == "clean"
+    # Trivially short code is clean too, unless the threshold is None
+    assert check("x = None == None\n").verdict == "clean"
+    assert check("x = None == None\n", clean_max_findings=None).verdict == "review"
+    assert check(CLEAN, clean_max_findings=None).verdict == "review"
+
+
+def test_custom_lint_findings():
+    code = '''import os
+import sys as system
+from typing import List, Dict
+
+def f(items=[], *, options={}):
+    try:
+        return items != None
+    except:
+        return List
+'''
+    visitor = _LintVisitor(check_imports=True)
+    visitor.visit(ast.parse(code))
+    assert sorted(visitor.report()) == sorted([
+        "line 5: mutable default argument in f()",
+        "line 5: mutable default argument in f()",
+        "line 7: comparison to None should use 'is' / 'is not'",
+        "line 8: bare 'except:' also catches KeyboardInterrupt and SystemExit",
+        "line 1: 'os' imported but unused",
+        "line 2: 'system' imported but unused",
+        "line 3: 'Dict' imported but unused",
+    ])
+
+
+WRITES: List[str] = []
+
+
+class StubWriter(BaseAgent):
+    """Writes broken code until it is given feedback, then CLEAN; notes each attempt in WRITES."""
+
+    async def _run_async_impl(self, ctx) -> AsyncGenerator[Event, None]:
+        feedback = ctx.session.state.get(WRITER_FEEDBACK_KEY)
+        WRITES.append(feedback or "")
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            actions=EventActions(state_delta={"generated_code": CLEAN if feedback else "def area(:\n"}),
+        )
+
+
+def run_checked(max_rewrites):
+    WRITES.clear()
+    agent = StaticCheckAgent(name="checked", writer=StubWriter(name="writer"), max_rewrites=max_rewrites)
+    service = InMemorySessionService()
+    service.create_session(app_name="app", user_id="u", session_id="s")
+
+    async def run():
+        async for _ in Runner(agent=agent, app_name="app", session_service=service).run_async(
+            user_id="u", session_id="s", new_message=types.Content(role="user", parts=[types.Part(text="area")]),
+        ):
+            pass
+
+    asyncio.run(run())
+    return service.get_session(app_name="app", user_id="u", session_id="s").state
+
+
+def test_broken_code_goes_back_to_the_writer():
+    state = run_checked(max_rewrites=1)
+    assert len(WRITES) == 2
+    assert WRITES[1].startswith("Your previous code failed these checks") and "does not parse" in WRITES[1]
+    assert state["generated_code"] == CLEAN
+    assert state[VERDICT_KEY] == "clean"
+    assert state[WRITER_FEEDBACK_KEY] == ""
+
+
+def test_rewrites_stop_at_max_rewrites():
+    state = run_checked(max_rewrites=0)
+    assert WRITES == [""]
+    assert state[VERDICT_KEY] == "broken"
+    assert state[FINDINGS_KEY].startswith("The code does not parse")
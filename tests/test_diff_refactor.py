@@ -0,0 +1,90 @@
+"""Parsing and applying the edit agent's SEARCH/REPLACE blocks and unified diffs."""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.diff_refactor import EditError, apply_edit_text, apply_edits, parse_edits
+
+CODE = """def area(length, width):
+    return length * width
+
+
+def perimeter(length, width):
+    return 2 * (length + width)
+"""
+
+
+def block(search, replace):
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE\n"
+
+
+def test_search_replace_blocks_are_applied_in_order():
+    text = (
+        block("def area(length, width):", "def area(length: float, width: float) -> float:")
+        + "Some prose between blocks.\n"
+        + block("    return 2 * (length + width)", "    return 2 * length + 2 * width")
+    )
+    patched = apply_edit_text(CODE, text)
+    assert "def area(length: float, width: float) -> float:" in patched
+    assert "return 2 * length + 2 * width" in patched
+    assert patched.endswith("\n")
+
+
+def test_blocks_inside_a_fence_and_a_fenced_original_are_handled():
+    fenced_code = f"```python\n{CODE}```"
+    text = "```\n" + block("    return length * width", "    return float(length) * width") + "```"
+    patched = apply_edit_text(fenced_code, text)
+    assert patched.startswith("```python\n") and patched.rstrip().endswith("```")
+    assert "return float(length) * width" in patched
+
+
+def test_no_changes_means_no_edits():
+    assert parse_edits("NO CHANGES") == []
+    assert parse_edits("```\nNO CHANGES\n```") == []
+    assert apply_edit_text(CODE, "NO CHANGES") == CODE
+
+
+def test_a_response_without_edits_is_rejected():
+    with pytest.raises(EditError, match="no edit blocks"):
+        parse_edits("Looks good to me, but consider adding type hints.")
+
+
+def test_ambiguous_missing_and_repeated_search_blocks_are_rejected():
+    stubs = "def area():\n    pass\n\n\ndef perimeter():\n    pass\n"
+    with pytest.raises(EditError, match="matches 2 places"):
+        apply_edits(stubs, parse_edits(block("    pass", "    return 0")))
+    # One more line of context makes it unique
+    patched = apply_edits(stubs, parse_edits(block("def perimeter():\n    pass", "def perimeter():\n    return 0")))
+    assert patched == "def area():\n    pass\n\n\ndef perimeter():\n    return 0\n"
+    with pytest.raises(EditError, match="not found"):
+        apply_edits(CODE, parse_edits(block("def volume(length, width, height):", "x")))
+    # The second copy of a block no longer finds what the first one replaced
+    twice = block("    return length * width", "    return width * length") * 2
+    with pytest.raises(EditError, match="not found"):
+        apply_edits(CODE, parse_edits(twice))
+    with pytest.raises(EditError, match="Empty SEARCH"):
+        apply_edits(CODE, [(["   "], ["x"])])
+
+
+def test_unified_diff_hunks_keep_their_context_lines():
+    diff = """--- a/shapes.py
++++ b/shapes.py
+@@ -4,3 +4,3 @@
+
+ def perimeter(length, width):
+-    return 2 * (length + width)
++    return 2 * length + 2 * width
+"""
+    ((old, new),) = parse_edits(diff)
+    # The blank context line lost its leading space; it still counts as context
+    assert old == ["", "def perimeter(length, width):", "    return 2 * (length + width)"]
+    assert new == ["", "def perimeter(length, width):", "    return 2 * length + 2 * width"]
+    assert apply_edits(CODE, [(old, new)]) == CODE.replace("2 * (length + width)", "2 * length + 2 * width")
+
+
+def test_patched_code_that_no_longer_parses_is_rejected():
+    with pytest.raises(EditError, match="doesn't parse"):
+        apply_edit_text(CODE, block("    return length * width", "    return length *"))
@@ -0,0 +1,39 @@
+"""Reading a tool's result out of a function-response event, and the result sentence."""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event
+from google.genai import types
+
+from common.direct_response import render_result, result_text, tool_response_from_event
+
+TEMPLATE = "The area of a rectangle with length {length} and width {width} is {area} {unit}."
+
+
+def function_response_event(*responses):
+    parts = [types.Part(function_response=types.FunctionResponse(name=name, response=response)) for name, response in responses]
+    return Event(author="area_agent", invocation_id="i", content=types.Content(role="user", parts=parts))
+
+
+def test_tool_response_is_found_by_tool_name():
+    event = function_response_event(("lookup", {"found": True}), ("calculate_area", {"area": 6.0, "unit": "square units"}))
+    assert tool_response_from_event(event, "calculate_area") == {"area": 6.0, "unit": "square units"}
+    assert tool_response_from_event(event, "calculate_perimeter") is None
+    text = Event(author="area_agent", invocation_id="i", content=types.Content(role="model", parts=[types.Part(text="6")]))
+    assert tool_response_from_event(text, "calculate_area") is None
+
+
+def test_an_empty_template_leaves_the_sentence_out():
+    values = {"length": 2, "width": 3, "area": 6.0, "unit": "square units"}
+    assert render_result(TEMPLATE, **values) == "The area of a rectangle with length 2 and width 3 is 6.0 square units."
+    assert render_result("", **values) is None
+
+
+def test_result_text_falls_back_to_the_value_and_unit():
+    missing = "No area calculation returned."
+    assert result_text({"area": 6.0, "unit": "square units", "result": "It is 6."}, "area", missing) == "It is 6."
+    assert result_text({"area": 6.0, "unit": "square units", "result": None}, "area", missing) == "6.0 square units"
+    assert result_text({"area": 0.0}, "area", missing) == "0.0"
+    assert result_text({}, "area", missing) == missing
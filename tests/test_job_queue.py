@@ -0,0 +1,101 @@
+"""PipelineJobQueue over a real SQLite session store, with stub stages instead of LLM agents."""
+import asyncio
+import os
+import sys
+from typing import AsyncGenerator, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from agents.code_pipeline_agent.job_queue import PipelineJobQueue
+from common.async_session_service import ThreadedSessionService
+from common.session_store import create_session_service
+
+
+class ReadingStage(BaseAgent):
+    """Writes `output_key` with the values it found for `reads` in session state."""
+
+    output_key: str
+    reads: List[str] = []
+
+    async def _run_async_impl(self, ctx) -> AsyncGenerator[Event, None]:
+        seen = {key: ctx.session.state.get(key) for key in self.reads}
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            content=types.Content(role="model", parts=[types.Part(text="ok")]),
+            actions=EventActions(state_delta={self.output_key: {"spec": ctx.session.state.get("last_query"), "seen": seen}}),
+        )
+
+
+def make_queue(tmp_path, stages):
+    db_path = str(tmp_path / "jobs.db")
+    service = ThreadedSessionService(create_session_service(f"sqlite:///{db_path}"))
+    return service, PipelineJobQueue(service, stages, app_name="jobs", db_path=db_path, concurrency=2)
+
+
+def test_each_stage_reads_the_previous_stage_output(tmp_path):
+    stages = [
+        ReadingStage(name="writer", output_key="generated_code"),
+        ReadingStage(name="reviewer", output_key="review_comments", reads=["generated_code"]),
+        ReadingStage(name="refactorer", output_key="refactored_code", reads=["generated_code", "review_comments"]),
+    ]
+    service, queue = make_queue(tmp_path, stages)
+
+    async def run():
+        await queue.start()
+        try:
+            job_ids = [await queue.submit(f"user{i}", f"spec {i}") for i in range(3)]
+            for job_id in job_ids:
+                await queue.wait(job_id, timeout=30)
+            return [await queue.result(job_id) for job_id in job_ids]
+        finally:
+            await queue.stop()
+            service.close()
+
+    results = asyncio.run(run())
+    for i, result in enumerate(results):
+        assert result["status"] == "done"
+        outputs = result["outputs"]
+        writer, reviewer, refactorer = (outputs[s.output_key] for s in stages)
+        assert writer["spec"] == f"spec {i}"
+        assert reviewer["seen"] == {"generated_code": writer}
+        assert refactorer["seen"] == {"generated_code": writer, "review_comments": reviewer}
+    # Nothing left behind once every job has finished and been waited on
+    assert not service._pinned
+    assert not queue._done and not queue._owners
+
+
+def test_worker_survives_a_job_that_fails_outside_its_stages(tmp_path):
+    stages = [ReadingStage(name="writer", output_key="generated_code")]
+    service, queue = make_queue(tmp_path, stages)
+    original_load = queue._load
+    broken = set()
+
+    async def load(job_id):
+        if job_id in broken:
+            raise RuntimeError("storage unavailable")
+        return await original_load(job_id)
+
+    queue._load = load
+
+    async def run():
+        queue.concurrency = 1
+        await queue.start()
+        try:
+            bad = await queue.submit("user", "bad spec")
+            broken.add(bad)
+            good = await queue.submit("user", "good spec")
+            await queue.wait(good, timeout=30)
+            broken.clear()
+            return await queue.status(bad), await queue.status(good)
+        finally:
+            await queue.stop()
+            service.close()
+
+    bad_status, good_status = asyncio.run(run())
+    assert good_status["status"] == "done"
+    assert bad_status["status"] == "queued"  # marking it failed needed storage too
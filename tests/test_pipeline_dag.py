@@ -0,0 +1,138 @@
+"""PipelineDAG scheduling and a DagPipelineAgent run with stub stages instead of LLM agents."""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from typing import AsyncGenerator, List
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event, EventActions
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from common.pipeline_dag import COMPLETED_STAGES_KEY, DagPipelineAgent, PipelineDAG, Stage
+
+
+def stage(name, output_key=None, needs=()):
+    return Stage(agent=SimpleNamespace(name=name, output_key=output_key), needs=list(needs))
+
+
+PANEL = [
+    stage("refactorer", "refactored_code", ["generated_code", "style_review", "security_review"]),
+    stage("style", "style_review", ["generated_code"]),
+    stage("writer", "generated_code", ["last_query"]),
+    stage("security", "security_review", ["generated_code"]),
+]
+
+
+def test_stages_are_ordered_by_the_keys_they_read():
+    dag = PipelineDAG(PANEL)
+    assert dag.order == ["writer", "style", "security", "refactorer"]
+    assert dag.dependencies["writer"] == set()  # last_query is an input nobody writes
+    assert dag.dependencies["refactorer"] == {"writer", "style", "security"}
+
+
+def test_cycles_and_conflicting_stages_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        PipelineDAG([stage("a", "x", ["y"]), stage("b", "y", ["x"]), stage("c", "z")])
+    with pytest.raises(ValueError, match="both write"):
+        PipelineDAG([stage("a", "x"), stage("b", "x")])
+    with pytest.raises(ValueError, match="Duplicate"):
+        PipelineDAG([stage("a"), stage("a")])
+
+
+def test_critical_path_is_the_longest_dependent_chain():
+    dag = PipelineDAG(PANEL)
+    durations = {"writer": 2.0, "style": 1.0, "security": 3.0, "refactorer": 1.5}
+    assert dag.critical_path(durations) == (6.5, ["writer", "security", "refactorer"])
+    # Skipped stages count as 0
+    assert dag.critical_path({"style": 1.0, "refactorer": 1.5}) == (2.5, ["writer", "style", "refactorer"])
+
+
+def test_a_failed_stage_cancels_the_rest():
+    dag = PipelineDAG(PANEL)
+    started, cancelled, recorded = [], [], []
+
+    async def run_stage(s):
+        started.append(s.name)
+        if s.name == "style":
+            raise RuntimeError("style failed")
+        if s.name == "security":
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(s.name)
+                raise
+        return s.name
+
+    async def on_complete(s, result):
+        recorded.append(result)
+
+    with pytest.raises(RuntimeError, match="style failed"):
+        asyncio.run(dag.run(run_stage, on_complete=on_complete))
+    assert started == ["writer", "style", "security"]
+    assert cancelled == ["security"]
+    assert recorded == ["writer"]
+
+
+RUNS: List[str] = []
+
+
+class RecordingStage(BaseAgent):
+    """Writes `output_key` with the values it read for `reads`, and notes in RUNS that it ran."""
+
+    output_key: str
+    reads: List[str] = []
+
+    async def _run_async_impl(self, ctx) -> AsyncGenerator[Event, None]:
+        RUNS.append(self.name)
+        seen = {key: ctx.session.state.get(key) for key in self.reads}
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            actions=EventActions(state_delta={self.output_key: seen or ctx.session.state.get("last_query")}),
+        )
+
+
+def run_pipeline(service, agent, text):
+    async def run():
+        async for _ in Runner(agent=agent, app_name="app", session_service=service).run_async(
+            user_id="u", session_id="s", new_message=types.Content(role="user", parts=[types.Part(text=text)]),
+        ):
+            pass
+
+    asyncio.run(run())
+    return service.get_session(app_name="app", user_id="u", session_id="s").state
+
+
+def test_a_resumed_run_skips_completed_stages():
+    RUNS.clear()
+    agent = DagPipelineAgent(name="pipeline", stages=[
+        Stage(agent=RecordingStage(name="writer", output_key="generated_code")),
+        Stage(agent=RecordingStage(name="reviewer", output_key="review", reads=["generated_code"]),
+              needs=["generated_code"]),
+    ])
+    service = InMemorySessionService()
+    service.create_session(app_name="app", user_id="u", session_id="s", state={
+        "last_query": "add two numbers",
+        "generated_code": "def add(a, b): ...",
+        COMPLETED_STAGES_KEY: ["writer"],
+        "workflow_checkpoint": "in_progress",
+    })
+
+    state = run_pipeline(service, agent, "resume workflow")
+    assert RUNS == ["reviewer"]
+    assert state["review"] == {"generated_code": "def add(a, b): ..."}
+    assert state[COMPLETED_STAGES_KEY] == ["writer", "reviewer"]
+    assert state["workflow_checkpoint"] == "complete"
+
+    # Once every stage is done, the next run starts over
+    state = run_pipeline(service, agent, "again")
+    assert RUNS == ["reviewer", "writer", "reviewer"]
+    assert state["generated_code"] == "add two numbers"
@@ -0,0 +1,109 @@
+"""SessionAnalytics refreshes over a synthetic events table: incremental merges and deletions."""
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.session_analytics import SessionAnalytics
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def make_db(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE events (id TEXT, app_name TEXT, user_id TEXT, session_id TEXT,"
+            " invocation_id TEXT, author TEXT, timestamp DATETIME, content TEXT)"
+        )
+    return db_path
+
+
+def insert(db_path, *events):
+    """events: (user_id, author, invocation_id, seconds after START)"""
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO events VALUES (lower(hex(randomblob(8))), 'app', ?, ?, ?, ?, ?, '{}')",
+            [
+                (user, f"s_{user}", invocation, author, str(START + timedelta(seconds=seconds)))
+                for user, author, invocation, seconds in events
+            ],
+        )
+
+
+def messages(analytics):
+    _, rows = analytics.report("messages_per_user")
+    return {user_id: count for _, _, user_id, count in rows}
+
+
+def latency(analytics):
+    _, rows = analytics.report("agent_latency")
+    return {author: (responses, total) for _, _, author, responses, total, *_ in rows}
+
+
+def refresh(analytics, db_path, name):
+    (result,) = analytics.refresh([db_path], [name])
+    return result
+
+
+def test_new_rows_are_merged_into_the_cached_counts(tmp_path):
+    db_path = make_db(tmp_path)
+    analytics = SessionAnalytics(str(tmp_path / "analytics.db"))
+    insert(db_path, *(("alice", "user", f"i{n}", n) for n in range(10)))
+    assert refresh(analytics, db_path, "messages_per_user").mode == "rebuilt"
+    assert refresh(analytics, db_path, "messages_per_user").mode == "unchanged"
+
+    insert(db_path, ("alice", "user", "i10", 10), ("alice", "user", "i11", 11), ("bob", "user", "i12", 12))
+    result = refresh(analytics, db_path, "messages_per_user")
+    assert (result.mode, result.rows_read) == ("incremental", 3)
+    assert messages(analytics) == {"alice": 12, "bob": 1}
+    analytics.close()
+
+
+def test_new_rows_on_reused_rowids_force_a_rebuild(tmp_path):
+    db_path = make_db(tmp_path)
+    analytics = SessionAnalytics(str(tmp_path / "analytics.db"))
+    insert(db_path, *(("alice", "user", f"i{n}", n) for n in range(10)))
+    refresh(analytics, db_path, "messages_per_user")
+
+    # Same row count and max rowid as before: only the row at rowid 10 gives it away
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM events WHERE rowid >= 8")
+    insert(db_path, *(("bob", "user", f"j{n}", 20 + n) for n in range(3)))
+    assert refresh(analytics, db_path, "messages_per_user").mode == "rebuilt"
+    assert messages(analytics) == {"alice": 7, "bob": 3}
+    analytics.close()
+
+
+def test_deleted_older_rows_force_a_rebuild(tmp_path):
+    db_path = make_db(tmp_path)
+    analytics = SessionAnalytics(str(tmp_path / "analytics.db"))
+    insert(db_path, *(("alice", "user", f"i{n}", n) for n in range(10)))
+    refresh(analytics, db_path, "messages_per_user")
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM events WHERE rowid = 2")
+    insert(db_path, ("bob", "user", "j0", 20))
+    assert refresh(analytics, db_path, "messages_per_user").mode == "rebuilt"
+    assert messages(analytics) == {"alice": 9, "bob": 1}
+    analytics.close()
+
+
+def test_agent_latency_measures_new_events_against_older_ones(tmp_path):
+    db_path = make_db(tmp_path)
+    analytics = SessionAnalytics(str(tmp_path / "analytics.db"))
+    insert(db_path, ("alice", "user", "inv", 0), ("alice", "writer", "inv", 2))
+    refresh(analytics, db_path, "agent_latency")
+    assert latency(analytics) == {"writer": (1, 2.0)}
+
+    # The reviewer's gap is to the writer's event, which was aggregated in the last refresh
+    insert(db_path, ("alice", "reviewer", "inv", 5), ("alice", "user", "inv2", 10), ("alice", "writer", "inv2", 11))
+    assert refresh(analytics, db_path, "agent_latency").mode == "incremental"
+    incremental = latency(analytics)
+    assert incremental == {"writer": (2, 3.0), "reviewer": (1, 3.0)}
+
+    analytics.refresh([db_path], ["agent_latency"], rebuild=True)
+    assert latency(analytics) == incremental
+    analytics.close()
@@ -0,0 +1,104 @@
+"""WriteBehindSessionService over a temporary SQLite session store."""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from common.session_cache import WriteBehindSessionService
+from common.session_store import create_session_service
+
+APP, USER = "app", "user"
+
+
+def make_service(tmp_path, **kwargs):
+    db_path = str(tmp_path / "sessions.db")
+    # No background flushes during a test unless it asks for them
+    kwargs.setdefault("flush_interval", 3600)
+    return db_path, WriteBehindSessionService(create_session_service(f"sqlite:///{db_path}"), **kwargs)
+
+
+def stored_events(db_path, session_id=None):
+    with sqlite3.connect(db_path) as conn:
+        if session_id is None:
+            return conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        return conn.execute("SELECT COUNT(*) FROM events WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+
+def message(text, **state_delta):
+    return Event(
+        author="agent",
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        actions=EventActions(state_delta=state_delta),
+    )
+
+
+def test_appends_are_written_in_one_batch(tmp_path):
+    db_path, service = make_service(tmp_path)
+    session = service.create_session(app_name=APP, user_id=USER, session_id="s")
+    batches = []
+    write_batch = service._write_batch
+    service._write_batch = lambda factory, batch: batches.append(len(batch)) or write_batch(factory, batch)
+
+    for i in range(5):
+        service.append_event(session, message(f"m{i}", count=i))
+    assert stored_events(db_path) == 0
+    # Served from memory, with every queued event and its state
+    cached = service.get_session(app_name=APP, user_id=USER, session_id="s")
+    assert len(cached.events) == 5 and cached.state["count"] == 4
+
+    service.flush()
+    assert batches == [5] and stored_events(db_path) == 5
+    service.close()
+    stored = service.backend.get_session(app_name=APP, user_id=USER, session_id="s")
+    assert stored.state["count"] == 4
+
+
+def test_durable_keys_are_written_before_append_returns(tmp_path):
+    db_path, service = make_service(tmp_path)
+    session = service.create_session(app_name=APP, user_id=USER, session_id="s")
+    service.append_event(session, message("plain"))
+    service.append_event(session, message("checkpoint", workflow_checkpoint="reviewer_pending"))
+    # The durable event takes everything queued before it along
+    assert stored_events(db_path) == 2
+    service.close()
+
+
+def test_an_evicted_session_is_flushed_before_it_is_read_back(tmp_path):
+    db_path, service = make_service(tmp_path, max_cached_sessions=1)
+    first = service.create_session(app_name=APP, user_id=USER, session_id="first")
+    service.append_event(first, message("queued", step=1))
+    service.create_session(app_name=APP, user_id=USER, session_id="second")  # evicts "first"
+    assert stored_events(db_path) == 0
+
+    reloaded = service.get_session(app_name=APP, user_id=USER, session_id="first")
+    assert [event.content.parts[0].text for event in reloaded.events] == ["queued"]
+    assert reloaded.state["step"] == 1
+    service.close()
+
+
+def test_a_session_that_keeps_failing_is_dead_lettered(tmp_path):
+    db_path, service = make_service(tmp_path, max_flush_retries=1)
+    bad = service.create_session(app_name=APP, user_id=USER, session_id="bad")
+    good = service.create_session(app_name=APP, user_id=USER, session_id="good")
+    duplicate = message("twice")
+    service.append_event(bad, duplicate)
+    service.append_event(good, message("fine"))
+    service.append_event(bad, duplicate)  # same event id: the insert fails every time
+
+    with pytest.raises(Exception):
+        service.flush()
+    assert len(service._pending) == 3  # kept for the retry
+
+    service.flush()  # out of retries: written session by session
+    assert not service._pending
+    assert stored_events(db_path, "good") == 1 and stored_events(db_path, "bad") == 0
+    assert [(key[2], event.id) for key, event, _ in service.dead_letters] == [("bad", duplicate.id)] * 2
+    # Evicted, so the next read shows what the database really has
+    assert service.get_session(app_name=APP, user_id=USER, session_id="bad").events == []
+    service.close()
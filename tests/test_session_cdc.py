@@ -0,0 +1,99 @@
+"""SessionTailer over a real SQLite session store, including rowids SQLite reuses after deletes."""
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from common.session_cdc import SessionTailer
+from common.session_store import create_session_service
+
+APP, USER, SESSION = "app", "user", "s1"
+
+
+def make_store(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    service = create_session_service(f"sqlite:///{db_path}")
+    service.create_session(app_name=APP, user_id=USER, session_id=SESSION)
+    return db_path, service
+
+
+def append(service, *texts):
+    for text in texts:
+        session = service.get_session(app_name=APP, user_id=USER, session_id=SESSION)
+        service.append_event(session, Event(
+            author="agent", content=types.Content(role="model", parts=[types.Part(text=text)]),
+        ))
+
+
+def collect(tailer, table="events"):
+    changes = []
+    tailer.poll(changes.extend)
+    return [change for change in changes if change["table"] == table]
+
+
+def texts(changes):
+    return [change["row"]["content"].split('"text": "')[1].split('"')[0] for change in changes]
+
+
+def test_events_inserted_after_the_newest_rows_were_deleted_are_emitted(tmp_path):
+    db_path, service = make_store(tmp_path)
+    tailer = SessionTailer([db_path], str(tmp_path / "marks.json"))
+    append(service, *(f"a{i}" for i in range(10)))
+    assert texts(collect(tailer)) == [f"a{i}" for i in range(10)]
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM events WHERE rowid > 7")
+    append(service, *(f"b{i}" for i in range(5)))
+
+    # b0..b2 get rowids 8..10 again; rowid tracking would have emitted only b3 and b4
+    changes = collect(tailer)
+    assert texts(changes) == [f"b{i}" for i in range(5)]
+    assert [change["rowid"] for change in changes] == [8, 9, 10, 11, 12]
+    assert collect(tailer) == []
+
+
+def test_a_restarted_tailer_resumes_from_the_saved_watermarks(tmp_path):
+    db_path, service = make_store(tmp_path)
+    marks = str(tmp_path / "marks.json")
+    append(service, "first")
+    assert texts(collect(SessionTailer([db_path], marks))) == ["first"]
+
+    append(service, "second")
+    tailer = SessionTailer([db_path], marks)
+    assert texts(collect(tailer)) == ["second"]
+    assert collect(tailer, "sessions") == []
+
+
+def test_session_updates_are_emitted_once_per_change(tmp_path):
+    db_path, service = make_store(tmp_path)
+    tailer = SessionTailer([db_path], str(tmp_path / "marks.json"))
+    assert [change["op"] for change in collect(tailer, "sessions")] == ["upsert"]
+    assert collect(tailer, "sessions") == []
+
+    # Same second as the first poll, most likely: caught by the state's digest, not by update_time
+    session = service.get_session(app_name=APP, user_id=USER, session_id=SESSION)
+    service.append_event(session, Event(author="agent", actions=EventActions(state_delta={"count": 1})))
+    assert [change["row"]["id"] for change in collect(tailer, "sessions")] == [SESSION]
+
+
+def test_rowid_tables_are_read_again_when_the_watermark_row_is_replaced(tmp_path):
+    db_path = str(tmp_path / "log.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE log (message TEXT)")
+        conn.executemany("INSERT INTO log VALUES (?)", [("one",), ("two",), ("three",)])
+    tailer = SessionTailer([db_path], str(tmp_path / "marks.json"), tables=["log"])
+    assert [change["row"]["message"] for change in collect(tailer, "log")] == ["one", "two", "three"]
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM log WHERE rowid = 3")
+        conn.executemany("INSERT INTO log VALUES (?)", [("four",), ("five",)])
+    # At-least-once: everything again, rather than silently skipping "four" at rowid 3
+    assert [change["row"]["message"] for change in collect(tailer, "log")] == ["one", "two", "four", "five"]
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO log VALUES ('six')")
+    assert [change["row"]["message"] for change in collect(tailer, "log")] == ["six"]
@@ -0,0 +1,93 @@
+"""session_inspector queries over a synthetic session database."""
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.session_dbs import connect
+from common.session_inspector import InspectError, build_query, iter_rows, main
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE events (id TEXT, app_name TEXT, user_id TEXT, session_id TEXT, timestamp DATETIME)")
+        conn.execute("CREATE TABLE sessions (id TEXT, app_name TEXT, user_id TEXT, update_time DATETIME)")
+        conn.execute("CREATE TABLE notes (body TEXT)")
+        conn.executemany(
+            "INSERT INTO events VALUES (?, 'app', ?, ?, ?)",
+            [
+                (f"e{n}", "u1" if n % 2 == 0 else "u2", f"s{n % 3}", str(START + timedelta(seconds=n, microseconds=500)))
+                for n in range(14)
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO sessions VALUES (?, 'app', 'u1', ?)",
+            [("s0", str(START)), ("s1", str(START + timedelta(hours=1)))],
+        )
+    return path
+
+
+def ids(conn, table, limit, **filters):
+    """Every matching id, read `limit` rows at a time through --after."""
+    newest = filters.pop("newest_first", False)
+    pages, after = [], None
+    while True:
+        where, selected, params = build_query(conn, table, ["id"], after=after, newest_first=newest, **filters)
+        page = list(iter_rows(conn, table, where, selected, params, limit, newest))
+        if not page:
+            return pages
+        pages.append([row["id"] for _, row in page])
+        after = page[-1][0]
+
+
+def test_keyset_pages_cover_every_row_once(db_path):
+    conn = connect(db_path, readonly=True)
+    try:
+        u1 = [f"e{n}" for n in range(0, 14, 2)]
+        assert ids(conn, "events", 3, user="u1") == [u1[0:3], u1[3:6], u1[6:]]
+        assert ids(conn, "events", 3, user="u1", newest_first=True) == [u1[::-1][0:3], u1[::-1][3:6], u1[::-1][6:]]
+        assert ids(conn, "events", 100, user="u2", session="s1") == [["e1", "e7", "e13"]]
+    finally:
+        conn.close()
+
+
+def test_time_filters_use_the_table_time_column(db_path):
+    conn = connect(db_path, readonly=True)
+    try:
+        # ISO input with a "T"; stored values have a space and microseconds
+        assert ids(conn, "events", 100, since="2026-01-01T12:00:10", until="2026-01-01T12:00:12") == [["e10", "e11"]]
+        assert ids(conn, "sessions", 100, since="2026-01-01T12:30:00") == [["s1"]]
+        assert ids(conn, "sessions", 100, session="s0") == [["s0"]]
+        with pytest.raises(ValueError):
+            build_query(conn, "events", since="yesterday")
+    finally:
+        conn.close()
+
+
+def test_unknown_tables_columns_and_filters_are_rejected(db_path):
+    conn = connect(db_path, readonly=True)
+    try:
+        with pytest.raises(InspectError, match="No table"):
+            build_query(conn, "nope")
+        with pytest.raises(InspectError, match="no column"):
+            build_query(conn, "events", ["id", "content"])
+        with pytest.raises(InspectError, match="can't be filtered by --since"):
+            build_query(conn, "notes", since="2026-01-01")
+    finally:
+        conn.close()
+
+
+def test_main_takes_its_arguments_as_a_list(db_path, capsys):
+    main([db_path, "--table", "events", "--user", "u1", "--columns", "id", "--limit", "2", "--format", "jsonl"])
+    captured = capsys.readouterr()
+    assert [json.loads(line)["id"] for line in captured.out.splitlines()] == ["e0", "e2"]
+    assert f"next page: {db_path} --after 3" in captured.err  # e2 is rowid 3
@@ -0,0 +1,115 @@
+"""Retention policies on synthetic ADK session and UI chat databases."""
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event, EventActions
+
+from common.chat_store import ChatStore
+from common.session_dbs import connect
+from common.session_maintenance import CHAT_POLICY_KEY, RetentionPolicy, enforce_retention
+from common.session_store import create_session_service
+
+HOUR = 3600
+
+
+@pytest.fixture
+def local_time_ahead_of_utc(monkeypatch):
+    """Run in UTC+5:30, so a cutoff in the wrong one of the time formats is off by hours."""
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def adk_db(tmp_path, events):
+    """An ADK session DB; `events` maps session id to the age in seconds of each of its events."""
+    db_path = str(tmp_path / "sessions.db")
+    service = create_session_service(f"sqlite:///{db_path}")
+    for session_id, ages in events.items():
+        session = service.create_session(app_name="app", user_id="u", session_id=session_id)
+        for n, age in enumerate(ages):
+            service.append_event(session, Event(
+                author="agent", invocation_id=f"i{n}", timestamp=time.time() - age,
+                actions=EventActions(state_delta={"n": n}),
+            ))
+    service.db_engine.dispose()
+    return db_path
+
+
+def event_counts(conn):
+    return dict(conn.execute("SELECT session_id, COUNT(*) FROM events GROUP BY session_id").fetchall())
+
+
+def test_event_age_and_idle_sessions_use_each_column_time_format(tmp_path, local_time_ahead_of_utc):
+    db_path = adk_db(tmp_path, {"active": [3 * HOUR, 2 * HOUR, 60], "idle": [60]})
+    conn = connect(db_path)
+    # update_time is UTC; the "idle" session was last written three hours ago
+    idle_since = (datetime.now(timezone.utc) - timedelta(hours=3)).strftime("%Y-%m-%d %H:%M:%S")
+    conn.execute("UPDATE sessions SET update_time = ? WHERE id = 'idle'", (idle_since,))
+
+    policy = RetentionPolicy(max_event_age_days=2.5 / 24, max_idle_days=2.5 / 24)
+    removed = enforce_retention(conn, {"*": policy}, pause=0)
+    assert removed == {"app": {"old_events": 1, "excess_events": 0, "idle_sessions": 1}}
+    assert [row[0] for row in conn.execute("SELECT id FROM sessions")] == ["active"]
+    assert event_counts(conn) == {"active": 2}
+    conn.close()
+
+
+def test_only_the_newest_events_of_each_session_are_kept(tmp_path):
+    db_path = adk_db(tmp_path, {"long": [50, 40, 30, 20, 10], "short": [10]})
+    conn = connect(db_path)
+    removed = enforce_retention(conn, {"app": RetentionPolicy(max_events_per_session=2)}, batch_size=2, pause=0)
+    assert removed["app"]["excess_events"] == 3
+    assert event_counts(conn) == {"long": 2, "short": 1}
+    kept = conn.execute("SELECT invocation_id FROM events WHERE session_id = 'long' ORDER BY invocation_id")
+    assert [row[0] for row in kept] == ["i3", "i4"]
+    # An app with neither a policy of its own nor a "*" default is left alone
+    assert enforce_retention(conn, {"other_app": RetentionPolicy(max_events_per_session=0)}) == {}
+    conn.close()
+
+
+def chat_db(tmp_path):
+    db_path = str(tmp_path / "ui_sessions.db")
+    store = ChatStore(db_path)
+    for user_id in ("alice", "bob", "carol"):
+        store.open_conversation(user_id, greeting=None)
+    store.append_turn("alice", [("user", "old question"), ("assistant", "old answer")])
+    store.append_turn("alice", [("user", "new question"), ("assistant", "new answer")])
+    store.append_turn("bob", [("user", "long ago")])
+    store.append_turn("carol", [("user", f"q{n}") for n in range(5)])
+    store.close()
+    conn = connect(db_path)
+    # created_at is epoch seconds; age alice's first turn and all of bob
+    ten_days_ago = time.time() - 10 * 86400
+    conn.execute("UPDATE chat_messages SET created_at = ? WHERE user_id = 'alice' AND seq <= 2", (ten_days_ago,))
+    conn.execute("UPDATE chat_messages SET created_at = ? WHERE user_id = 'bob'", (ten_days_ago,))
+    conn.execute("UPDATE chat_users SET created_at = ?", (ten_days_ago,))
+    return conn
+
+
+def test_chat_retention_removes_old_messages_excess_messages_and_idle_users(tmp_path):
+    conn = chat_db(tmp_path)
+    policy = RetentionPolicy(max_event_age_days=7, max_events_per_session=3, max_idle_days=5)
+    removed = enforce_retention(conn, {CHAT_POLICY_KEY: policy, "*": RetentionPolicy()}, batch_size=2, pause=0)
+    assert removed == {CHAT_POLICY_KEY: {"old_messages": 2, "excess_messages": 2, "idle_users": 1}}
+    messages = conn.execute("SELECT user_id, content FROM chat_messages ORDER BY user_id, seq").fetchall()
+    assert messages == [
+        ("alice", "new question"), ("alice", "new answer"),
+        ("carol", "q2"), ("carol", "q3"), ("carol", "q4"),
+    ]
+    assert [row[0] for row in conn.execute("SELECT user_id FROM chat_users ORDER BY user_id")] == ["alice", "carol"]
+    conn.close()
+
+
+def test_chat_tables_are_left_alone_without_a_chat_policy(tmp_path):
+    conn = chat_db(tmp_path)
+    assert enforce_retention(conn, {"*": RetentionPolicy(max_event_age_days=0)}) == {}
+    assert conn.execute("SELECT COUNT(*) FROM chat_messages").fetchone()[0] == 10
+    conn.close()
@@ -0,0 +1,66 @@
+"""Transaction modes of the tuned session store: reads begin deferred, writes immediate."""
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event, EventActions
+
+from common.session_store import create_session_service
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = create_session_service(f"sqlite:///{tmp_path / 'sessions.db'}", pragmas={"busy_timeout": 300})
+    service.create_session(app_name="app", user_id="u", session_id="s")
+    yield service
+    service.db_engine.dispose()
+
+
+def begins(service, call):
+    """The BEGIN statements `call` issues."""
+    statements = []
+
+    def trace(connection, cursor, statement, *args):
+        if statement.startswith("BEGIN"):
+            statements.append(statement)
+
+    event.listen(service.db_engine, "before_cursor_execute", trace)
+    try:
+        call()
+    finally:
+        event.remove(service.db_engine, "before_cursor_execute", trace)
+    return statements
+
+
+def state_event():
+    return Event(author="agent", invocation_id="i", timestamp=time.time(), actions=EventActions(state_delta={"n": 1}))
+
+
+def test_reads_begin_deferred_and_writes_immediate(service):
+    key = dict(app_name="app", user_id="u", session_id="s")
+    assert begins(service, lambda: service.get_session(**key)) == ["BEGIN"]
+    assert begins(service, lambda: service.list_sessions(app_name="app", user_id="u")) == ["BEGIN"]
+    session = service.get_session(**key)
+    assert "BEGIN IMMEDIATE" in begins(service, lambda: service.append_event(session, state_event()))
+
+
+def test_reads_dont_wait_for_another_writer(service, tmp_path):
+    writer = sqlite3.connect(str(tmp_path / "sessions.db"), isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.monotonic()
+        session = service.get_session(app_name="app", user_id="u", session_id="s")
+        assert session is not None and time.monotonic() - started < 0.25
+        # A write queues for the lock, and gives up after busy_timeout
+        with pytest.raises(OperationalError, match="locked"):
+            service.append_event(session, state_event())
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
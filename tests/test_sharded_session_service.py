@@ -0,0 +1,80 @@
+"""Routing sessions across shard files, and resharding them without losing any."""
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event, EventActions
+
+from common import sharded_session_service
+from common.sharded_session_service import ShardedSessionService, reshard, shard_paths
+
+KEYS = [(user, f"{user}-s{n}") for user in ("alice", "bob") for n in range(8)]
+
+
+def populate(template, num_shards):
+    """Sessions with 1-3 events each; returns {session_id: event count}."""
+    service = ShardedSessionService(template, num_shards)
+    counts = {}
+    for index, (user, session_id) in enumerate(KEYS):
+        session = service.create_session(app_name="app", user_id=user, session_id=session_id)
+        counts[session_id] = index % 3 + 1
+        for n in range(counts[session_id]):
+            service.append_event(session, Event(
+                author="agent", invocation_id=f"i{n}", timestamp=time.time(),
+                actions=EventActions(state_delta={"turns": n + 1}),
+            ))
+    return counts
+
+
+def session_ids_per_file(template, num_shards):
+    result = []
+    for path in shard_paths(template, num_shards):
+        with sqlite3.connect(path) as conn:
+            result.append({row[0] for row in conn.execute("SELECT id FROM sessions")})
+    return result
+
+
+def assert_all_sessions_readable(template, num_shards, counts):
+    per_file = session_ids_per_file(template, num_shards)
+    assert sum(len(ids) for ids in per_file) == len(KEYS)  # each session in exactly one file
+    service = ShardedSessionService(template, num_shards)
+    for user, session_id in KEYS:
+        session = service.get_session(app_name="app", user_id=user, session_id=session_id)
+        assert len(session.events) == counts[session_id]
+        assert session.state["turns"] == counts[session_id]
+
+
+@pytest.mark.parametrize("from_shards,to_shards", [(2, 5), (4, 3)])
+def test_resharding_in_place_keeps_every_session_and_event(tmp_path, from_shards, to_shards):
+    template = str(tmp_path / "sessions.{shard}.db")
+    counts = populate(template, from_shards)
+    result = reshard(template, from_shards, template, to_shards)
+    assert result["moved"] + result["unchanged"] == len(KEYS) and result["unverified"] == 0
+    assert_all_sessions_readable(template, to_shards, counts)
+    if from_shards > to_shards:
+        assert session_ids_per_file(template, from_shards)[to_shards:] == [set()] * (from_shards - to_shards)
+
+
+def test_an_interrupted_reshard_can_be_run_again(tmp_path, monkeypatch):
+    source, target = str(tmp_path / "old.{shard}.db"), str(tmp_path / "new.{shard}.db")
+    counts = populate(source, 2)
+
+    def crash(conn, *key):
+        raise RuntimeError("crashed before deleting")
+
+    monkeypatch.setattr(sharded_session_service, "_delete_session", crash)
+    with pytest.raises(RuntimeError):
+        reshard(source, 2, target, 3, batch_size=4)
+    # The batch that was copied is still in the source too; nothing is lost
+    assert sum(len(ids) for ids in session_ids_per_file(source, 2)) == len(KEYS)
+    assert sum(len(ids) for ids in session_ids_per_file(target, 3)) == 4
+
+    monkeypatch.undo()
+    assert reshard(source, 2, target, 3, batch_size=4) == {"moved": len(KEYS), "unchanged": 0, "unverified": 0}
+    assert session_ids_per_file(source, 2) == [set(), set()]
+    assert_all_sessions_readable(target, 3, counts)
@@ -0,0 +1,102 @@
+"""StageCache keys, expiry and eviction, and its model callbacks with stub contexts."""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.models import LlmResponse
+from google.genai import types
+
+from common.stage_cache import StageCache, template_keys
+
+REVIEWER = SimpleNamespace(
+    name="reviewer", model="openai/gpt-4o",
+    instruction="Review this code:\n{generated_code}\n{static_findings?}",
+)
+WRITER = SimpleNamespace(name="writer", model="openai/gpt-4o", instruction="Write code.\n{writer_feedback?}")
+
+
+def message(text):
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def test_template_keys_marks_optional_keys():
+    assert template_keys(REVIEWER.instruction) == {"generated_code": False, "static_findings": True}
+    assert template_keys("{{not a key}} {app:setting} {a?} {a}") == {"app:setting": False, "a": False}
+
+
+def test_stage_key_depends_on_what_the_model_sees(tmp_path):
+    cache = StageCache(path=str(tmp_path / "cache.db"))
+    key = cache.stage_key(REVIEWER, {"generated_code": "x = 1"}, message("review it"))
+    # The user's message isn't rendered into a template that reads required state
+    assert key == cache.stage_key(REVIEWER, {"generated_code": "x = 1", "other": 2}, message("again"))
+    # An unset optional key renders like an empty one
+    assert key == cache.stage_key(REVIEWER, {"generated_code": "x = 1", "static_findings": ""}, None)
+    assert key != cache.stage_key(REVIEWER, {"generated_code": "x = 2"}, None)
+    other_model = SimpleNamespace(**{**vars(REVIEWER), "model": "openai/gpt-4o-mini"})
+    assert key != cache.stage_key(other_model, {"generated_code": "x = 1"}, None)
+    # ...but it is part of the key when only optional keys are read
+    assert cache.stage_key(WRITER, {}, message("area")) != cache.stage_key(WRITER, {}, message("perimeter"))
+
+
+def test_entries_expire_after_the_ttl(tmp_path):
+    cache = StageCache(path=str(tmp_path / "cache.db"), ttl_seconds=0.05)
+    cache.put("k", "writer", "output")
+    assert cache.get("k") == "output"
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert cache.stored_stats() == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = StageCache(path=str(tmp_path / "cache.db"), max_entries=2, memory_entries=0)
+    cache.put("a", "writer", "A")
+    cache.put("b", "writer", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "writer", "C")
+    assert [cache.get(key) for key in "abc"] == ["A", None, "C"]
+    assert cache.stored_stats() == [("writer", 2, 3)]
+
+
+def callback_context(agent, state, branch=None):
+    invocation = SimpleNamespace(agent=agent, invocation_id="inv", branch=branch)
+    return SimpleNamespace(
+        _invocation_context=invocation, agent_name=agent.name, state=state, user_content=message("spec"),
+    )
+
+
+def response(text):
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def test_a_missed_call_is_stored_and_then_served(tmp_path):
+    cache = StageCache(path=str(tmp_path / "cache.db"))
+    state = {"generated_code": "x = 1"}
+
+    async def run():
+        assert await cache.before_model(callback_context(REVIEWER, state), None) is None
+        await cache.after_model(callback_context(REVIEWER, state), response("- looks fine"))
+        hit = await cache.before_model(callback_context(REVIEWER, state), None)
+        return hit.content.parts[0].text
+
+    assert asyncio.run(run()) == "- looks fine"
+    assert cache.stats() == {"reviewer": {"hits": 1, "misses": 1, "hit_rate": 0.5}}
+
+
+def test_misses_whose_response_never_came_expire(tmp_path):
+    cache = StageCache(path=str(tmp_path / "cache.db"), pending_ttl_seconds=0.05)
+
+    async def run():
+        # Chunk 1's model call raises, so its after_model never runs
+        await cache.before_model(callback_context(REVIEWER, {"generated_code": "a"}, branch="chunk1"), None)
+        await asyncio.sleep(0.1)
+        await cache.before_model(callback_context(REVIEWER, {"generated_code": "b"}, branch="chunk2"), None)
+        assert [call_id[1] for call_id in cache._misses_pending] == ["chunk2"]
+        # A late response for the expired call isn't stored
+        await cache.after_model(callback_context(REVIEWER, {"generated_code": "a"}, branch="chunk1"), response("late"))
+
+    asyncio.run(run())
+    assert cache.stored_stats() == []
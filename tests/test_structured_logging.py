@@ -0,0 +1,87 @@
+"""Sampling, redaction, per-module levels and the ring buffer of structured_logging."""
+import io
+import logging
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.structured_logging import (
+    REDACTED, LevelFilter, RingBufferHandler, SamplingFilter, StructuredFormatter, fields, redact,
+)
+
+
+def record(name="app", level=logging.INFO, msg="message", **values):
+    entry = logging.LogRecord(name, level, __file__, 1, msg, None, None)
+    entry.__dict__.update(fields(**values))
+    return entry
+
+
+def test_sampling_decides_once_per_record_for_every_handler():
+    # As configure_logging sets it up: one filter on the output and the ring buffer
+    sampling = SamplingFilter({"tool_call": 0.1, "payload": 0})
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    ring = RingBufferHandler(capacity=500, target=output)
+    logger = logging.getLogger("tests.sampling")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    for handler in (output, ring):
+        handler.addFilter(sampling)
+        logger.addHandler(handler)
+    try:
+        for n in range(100):
+            logger.info("call %d", n, extra=fields(event="tool_call"))
+    finally:
+        for handler in (output, ring):
+            logger.removeHandler(handler)
+    assert stream.getvalue().splitlines() == [f"call {n}" for n in range(0, 100, 10)]
+    assert [entry.getMessage() for entry in ring.records] == [f"call {n}" for n in range(0, 100, 10)]
+
+    assert not sampling.filter(record(event="payload"))
+    assert sampling.filter(record(level=logging.WARNING, event="payload"))
+    assert sampling.filter(record(event="other"))
+    assert sampling.filter(record())
+
+
+def test_redact_masks_secrets_and_cuts_long_values():
+    values = redact({
+        "api_key": "sk-1", "openai_api_key": "sk-2", "token": "t", "keyboard": "qwerty",
+        "code": "x" * 300, "length": 3.5, "spec": {"a": 1},
+    }, max_chars=200)
+    assert values["api_key"] == values["openai_api_key"] == values["token"] == REDACTED
+    assert values["keyboard"] == "qwerty"
+    assert values["code"] == "x" * 200 + "…(+100 chars)"
+    assert values["length"] == 3.5 and values["spec"] == "{'a': 1}"
+
+    line = StructuredFormatter().format(record(msg="called", event="tool_call", password="hunter2"))
+    assert line.endswith("app: called event=tool_call password=[redacted]")
+
+
+def test_level_filter_uses_the_most_specific_module_prefix():
+    levels = LevelFilter(logging.INFO, {"common": logging.WARNING, "common.stage_cache": logging.DEBUG})
+    assert levels.filter(record("common.stage_cache", logging.DEBUG))
+    assert levels.filter(record("common.stage_cache.sub", logging.DEBUG))
+    assert not levels.filter(record("common.session_cache", logging.INFO))
+    # A prefix matches whole name segments only
+    assert not levels.filter(record("common.stage_cache_extra", logging.DEBUG))
+    assert levels.filter(record("commonplace", logging.INFO))
+    assert not levels.filter(record("agents", logging.DEBUG))
+
+
+def test_ring_buffer_writes_the_lead_up_to_an_error():
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(StructuredFormatter())
+    ring = RingBufferHandler(capacity=2, target=output)
+    for n in range(3):
+        ring.handle(record(msg=f"step {n}"))
+    assert stream.getvalue() == ""
+
+    ring.handle(record(level=logging.ERROR, msg="failed"))
+    lines = stream.getvalue().splitlines()
+    assert lines[0] == "----- 2 recent log records -----"
+    assert [line.split(": ", 1)[1] for line in lines[1:3]] == ["step 1", "step 2"]
+    assert lines[3] == "----- end of log records -----"
+    # The buffer was emptied; the error itself starts the next lead-up
+    assert [entry.getMessage() for entry in ring.records] == ["failed"]
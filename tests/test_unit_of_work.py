@@ -0,0 +1,65 @@
+"""SessionUnitOfWork dirty tracking, commit and rollback against the in-memory session service."""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.sessions import InMemorySessionService
+
+from common.unit_of_work import SessionUnitOfWork
+
+
+def unit_of_work(state=None):
+    service = InMemorySessionService()
+    service.create_session(app_name="app", user_id="u", session_id="s", state=state or {})
+    return service, SessionUnitOfWork.load(service, "app", "u", "s", author="pipeline")
+
+
+def stored_state(service):
+    return service.get_session(app_name="app", user_id="u", session_id="s").state
+
+
+def test_only_changed_keys_are_dirty_and_reads_see_them():
+    service, uow = unit_of_work({"spec": "area", "attempts": 1})
+    uow.set("spec", "area")
+    uow.update({"attempts": 2, "code": "x = 1"})
+    assert uow.dirty_keys == {"attempts", "code"}
+    assert uow["attempts"] == 2 and uow.get("code") == "x = 1" and "code" in uow
+    assert dict(uow.items()) == {"spec": "area", "attempts": 2, "code": "x = 1"}
+    # Setting a key back to its stored value keeps it dirty: the staged change must be undone
+    uow.set("attempts", 1)
+    assert "attempts" in uow.dirty_keys
+    assert uow.get("missing", "default") == "default" and "missing" not in uow
+    assert SessionUnitOfWork.load(service, "app", "u", "no-such-session") is None
+
+
+def test_commit_writes_all_changes_as_one_event():
+    service, uow = unit_of_work({"spec": "area"})
+    uow.update({"code": "x = 1", "review": "ok"})
+    event = uow.commit()
+    assert event.author == "pipeline" and event.actions.state_delta == {"code": "x = 1", "review": "ok"}
+    assert uow.dirty_keys == set() and uow.session.state["code"] == "x = 1"
+    session = service.get_session(app_name="app", user_id="u", session_id="s")
+    assert len(session.events) == 1 and session.state == {"spec": "area", "code": "x = 1", "review": "ok"}
+    # Nothing left to write
+    assert uow.commit() is None
+    assert len(service.get_session(app_name="app", user_id="u", session_id="s").events) == 1
+
+
+def test_event_hands_back_the_changes_without_appending():
+    service, uow = unit_of_work()
+    assert uow.event() is None
+    uow.set("code", "x = 1")
+    event = uow.event(invocation_id="inv", branch="pipeline.writer")
+    assert (event.invocation_id, event.branch, event.author) == ("inv", "pipeline.writer", "pipeline")
+    assert event.actions.state_delta == {"code": "x = 1"}
+    assert uow.dirty_keys == set()
+    assert stored_state(service) == {}
+
+
+def test_rollback_drops_staged_changes():
+    service, uow = unit_of_work({"spec": "area"})
+    uow.set("spec", "perimeter")
+    uow.rollback()
+    assert uow["spec"] == "area" and uow.commit() is None
+    assert stored_state(service) == {"spec": "area"}